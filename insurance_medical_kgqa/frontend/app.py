@@ -1,7 +1,6 @@
 import streamlit as st
 import requests
 import json
-from neo4j import GraphDatabase
 
 # 设置页面配置
 st.set_page_config(
@@ -13,37 +12,25 @@ st.set_page_config(
 
 # API 地址
 API_URL = "http://localhost:8000/chat"
+# 图谱统计由后端 /stats 提供（后端按图谱版本缓存），前端不直接连接 Neo4j
+STATS_URL = "http://localhost:8000/stats"
 
-# Neo4j 配置（用于统计信息，简单直接连接）
-NEO4J_URI = "bolt://localhost:7687"
-NEO4J_USER = "neo4j"
-# 注意：这里为了演示方便直接硬编码或从 config 读取，实际部署建议通过 API 获取统计信息
-# 为简化，假设用户本地环境一致，直接尝试连接
-# 如果连接失败，统计信息将不显示或显示默认值
+# 图谱统计不可用（后端未启动或请求失败）时的占位符
+STATS_UNAVAILABLE = "—"
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_graph_stats():
+    """调用后端 /stats（后端按图谱版本缓存）；请求失败时抛出异常，异常不会被缓存，下次渲染时重试"""
+    resp = requests.get(STATS_URL, timeout=3)
+    resp.raise_for_status()
+    return {label: f"{count:,}" for label, count in resp.json().get("nodes", {}).items()}
 
 def get_graph_stats():
-    """获取 Neo4j 图谱统计信息"""
-    stats = {}
+    """图谱统计数据 {标签: 数量}；后端不可用时返回 None，页面显示占位符而不是写死的数字"""
     try:
-        # 尝试从 config.yaml 读取密码（如果需要更健壮的实现）
-        # 这里简化处理，尝试默认密码或提示用户
-        # 更好的做法是在后端 API 增加一个 /stats 接口
-        # 这里为了演示 Streamlit 的独立性，我们先用硬编码的默认密码尝试，
-        # 实际项目中应调用后端 API
-        
-        # 为了避免前端直接连接数据库的安全风险，建议这部分逻辑移到后端 API
-        # 但根据当前需求描述，我们在前端简单实现展示
-        pass 
+        return _fetch_graph_stats()
     except Exception:
-        pass
-    return {
-        "Disease": "400+",
-        "Drug": "3800+",
-        "Insurance": "70+",
-        "NursingHome": "400+",
-        "Symptom": "2000+",
-        "Department": "50+"
-    }
+        return None
 
 # 初始化 Session State
 if "messages" not in st.session_state:
@@ -56,15 +43,18 @@ with st.sidebar:
     
     st.markdown("### 📊 图谱数据统计")
     stats = get_graph_stats()
+    if stats is None:
+        st.caption("⚠️ 图谱统计暂不可用，请确认后端服务已启动")
+        stats = {}
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("疾病", stats["Disease"])
-        st.metric("药品", stats["Drug"])
-        st.metric("保险", stats["Insurance"])
+        st.metric("疾病", stats.get("Disease", STATS_UNAVAILABLE))
+        st.metric("药品", stats.get("Drug", STATS_UNAVAILABLE))
+        st.metric("保险", stats.get("Insurance", STATS_UNAVAILABLE))
     with col2:
-        st.metric("养老院", stats["NursingHome"])
-        st.metric("症状", stats["Symptom"])
-        st.metric("科室", stats["Department"])
+        st.metric("养老院", stats.get("NursingHome", STATS_UNAVAILABLE))
+        st.metric("症状", stats.get("Symptom", STATS_UNAVAILABLE))
+        st.metric("科室", stats.get("Department", STATS_UNAVAILABLE))
     
     st.divider()
     st.markdown("### 💡 使用指南")
@@ -104,9 +94,11 @@ if prompt := st.chat_input("请输入您的问题..."):
         
         try:
             with st.spinner("正在检索知识图谱并生成回答..."):
-                response = requests.post(API_URL, json={"query": prompt})
+                # 携带服务端会话 ID，后端据此补全多轮对话历史
+                response = requests.post(API_URL, json={"query": prompt, "session_id": st.session_state.get("session_id")})
                 if response.status_code == 200:
                     data = response.json()
+                    st.session_state.session_id = data.get("session_id")
                     full_response = data["answer"]
                     context_info = data["context"]
                     
@@ -116,6 +108,9 @@ if prompt := st.chat_input("请输入您的问题..."):
                     if context_info and context_info != "未在知识图谱中找到相关信息。":
                         with st.expander("🔍 知识图谱溯源 (Reference)"):
                             st.text(context_info)
+                elif response.status_code == 503:
+                    full_response = "当前咨询人数较多，请稍后再试。"
+                    message_placeholder.warning(full_response)
                 else:
                     full_response = f"请求失败 (状态码: {response.status_code})"
                     message_placeholder.error(full_response)
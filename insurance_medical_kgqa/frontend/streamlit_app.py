@@ -98,20 +98,28 @@ st.markdown(f"""
 
 # API 地址
 API_URL = "http://127.0.0.1:8000/chat"
+STATS_URL = "http://127.0.0.1:8000/stats"
 
 # ==========================================
 # 2. 功能函数
 # ==========================================
 
+# 图谱统计不可用（后端未启动或请求失败）时的占位符
+STATS_UNAVAILABLE = "—"
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _fetch_graph_stats():
+    """调用后端 /stats（后端按图谱版本缓存）；请求失败时抛出异常，异常不会被缓存，下次渲染时重试"""
+    resp = requests.get(STATS_URL, timeout=3)
+    resp.raise_for_status()
+    return {label: f"{count:,}" for label, count in resp.json().get("nodes", {}).items()}
+
 def get_graph_stats():
-    """模拟图谱统计数据 (实际项目可调后端 API)"""
-    return {
-        "Disease": "403",
-        "Drug": "3,827",
-        "Insurance": "78",
-        "NursingHome": "469",
-        "Symptom": "2,000+"
-    }
+    """图谱统计数据 {标签: 数量}；后端不可用时返回 None，页面显示占位符而不是写死的数字"""
+    try:
+        return _fetch_graph_stats()
+    except Exception:
+        return None
 
 # ==========================================
 # 修复点 1：消除 HTML 缩进，防止被解析为代码块
@@ -226,13 +234,16 @@ with st.sidebar:
     
     st.markdown("### 📊 知识储备")
     stats = get_graph_stats()
+    if stats is None:
+        st.caption("⚠️ 图谱统计暂不可用，请确认后端服务已启动")
+        stats = {}
     
     # 统计数据使用指标展示
     c1, c2 = st.columns(2)
-    c1.metric("疾病库", stats["Disease"], delta_color="normal")
-    c1.metric("保险产品", stats["Insurance"])
-    c2.metric("药品库", stats["Drug"])
-    c2.metric("合作养老院", stats["NursingHome"])
+    c1.metric("疾病库", stats.get("Disease", STATS_UNAVAILABLE), delta_color="normal")
+    c1.metric("保险产品", stats.get("Insurance", STATS_UNAVAILABLE))
+    c2.metric("药品库", stats.get("Drug", STATS_UNAVAILABLE))
+    c2.metric("合作养老院", stats.get("NursingHome", STATS_UNAVAILABLE))
     
     st.markdown("---")
     st.markdown("### ⚙️ 偏好设置")
@@ -281,16 +292,10 @@ if prompt := st.chat_input("请输入您的问题..."):
         
         with st.spinner("👩‍⚕️ 正在分析您的需求..."):
             try:
-                # 构造请求数据 (带历史记录)
-                # 限制历史记录长度，防止 Token 溢出
-                history_payload = [
-                    {"role": m["role"], "content": m["content"]} 
-                    for m in st.session_state.messages[:-1]
-                ][-6:] # 只取最近6条
-
+                # 构造请求数据：历史记录保存在服务端会话中，只需发送新问题和 session_id
                 payload = {
                     "query": prompt,
-                    "history": history_payload
+                    "session_id": st.session_state.get("session_id")
                 }
                 
                 # 调用后端
@@ -300,6 +305,7 @@ if prompt := st.chat_input("请输入您的问题..."):
                     data = response.json()
                     answer = data.get("answer", "抱歉，由于网络原因未能生成回答。")
                     context = data.get("context", "")
+                    st.session_state.session_id = data.get("session_id")
                     
                     # 核心修改：直接渲染 Markdown
                     # Streamlit 会自动把 **加粗** 渲染得很好看
@@ -316,6 +322,9 @@ if prompt := st.chat_input("请输入您的问题..."):
                         "content": answer,
                         "context": context
                     })
+                elif response.status_code == 503:
+                    # 后端过载，准入控制直接拒绝
+                    placeholder.warning("当前咨询人数较多，请稍后再试。")
                 else:
                     err_msg = f"服务暂时不可用 (状态码: {response.status_code})"
                     placeholder.error(err_msg)
@@ -0,0 +1,114 @@
+# 准入控制：/chat 的有界排队、请求截止时间、队列满时快速拒绝（503），以及过载时的降级模式
+import asyncio
+import threading
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict
+
+from src.utils.config_loader import config
+
+
+class AdmissionRejected(Exception):
+    """请求未被接纳：reason 为 queue_full（队列已满）或 queue_timeout（排队超时）。"""
+
+    def __init__(self, reason: str, retry_after: int = 1):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+@dataclass
+class Ticket:
+    """已接纳请求的执行条件。"""
+    deadline: float  # time.monotonic() 的绝对值，LLM / Neo4j 超时都不超过它
+    degraded: bool  # 过载时为 True：跳过问题重写，只返回预计算或检索结果
+    queued_ms: float
+
+
+class AdmissionController:
+    """
+    最多 max_concurrency 个请求同时执行，最多 max_queue 个请求排队，再多的直接拒绝；
+    排队超过 queue_timeout_seconds 也拒绝。截止时间从请求到达时开始计算（含排队时间）。
+    被接纳时若队列中仍有不少于 degrade_queue_depth 个请求在等待，本请求以降级模式执行，
+    用更短的执行时间尽快消化积压。
+    """
+
+    def __init__(self, max_concurrency: int = 16, max_queue: int = 64, queue_timeout_seconds: float = 10.0,
+                 request_timeout_seconds: float = 30.0, degrade_queue_depth: int = 16):
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self.max_queue = max(int(max_queue), 0)
+        self.queue_timeout_seconds = float(queue_timeout_seconds)
+        self.request_timeout_seconds = float(request_timeout_seconds)
+        # 0 表示不启用降级
+        self.degrade_queue_depth = int(degrade_queue_depth)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self._lock = threading.Lock()
+        self._stats = {"admitted": 0, "degraded": 0, "rejected_queue_full": 0, "rejected_queue_timeout": 0}
+
+    def _incr(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[Ticket]:
+        """
+        在事件循环上排队等待执行名额；被接纳后返回 Ticket，退出时释放名额。
+        Raises:
+            AdmissionRejected: 队列已满或排队超时。
+        """
+        arrived = time.monotonic()
+        if self.in_flight + self.waiting >= self.max_concurrency + self.max_queue:
+            self._incr("rejected_queue_full")
+            raise AdmissionRejected("queue_full")
+
+        self.waiting += 1
+        try:
+            wait_budget = min(self.queue_timeout_seconds, self.request_timeout_seconds)
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=wait_budget)
+        except asyncio.TimeoutError:
+            self._incr("rejected_queue_timeout")
+            raise AdmissionRejected("queue_timeout")
+        finally:
+            self.waiting -= 1
+
+        degraded = 0 < self.degrade_queue_depth <= self.waiting
+        self._incr("admitted")
+        if degraded:
+            self._incr("degraded")
+        self.in_flight += 1
+        try:
+            yield Ticket(
+                deadline=arrived + self.request_timeout_seconds,
+                degraded=degraded,
+                queued_ms=round((time.monotonic() - arrived) * 1000, 1),
+            )
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+        return {
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            **stats,
+        }
+
+
+def create_admission_controller() -> AdmissionController:
+    """按 config.yaml 中 api.max_concurrency 与 api.admission 创建。"""
+    api_conf = config.get("api", {}) or {}
+    conf = api_conf.get("admission", {}) or {}
+    return AdmissionController(
+        max_concurrency=api_conf.get("max_concurrency", 16),
+        max_queue=conf.get("max_queue", 64),
+        queue_timeout_seconds=conf.get("queue_timeout_seconds", 10.0),
+        request_timeout_seconds=conf.get("request_timeout_seconds", 30.0),
+        degrade_queue_depth=conf.get("degrade_queue_depth", 16),
+    )
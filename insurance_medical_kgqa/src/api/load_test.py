@@ -0,0 +1,74 @@
+# /chat 压测：按不同并发数发送请求，统计吞吐量与延迟分位数，验证吞吐随并发增长
+#
+# 运行（建议配合本地模拟 LLM 服务，见 README「离线压测」）：
+#   python -m src.api.load_test --url http://127.0.0.1:8000/chat --concurrency 1,4,16 --requests 64
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List
+
+import requests
+
+from src.graph_rag.answer_warmup import load_questions
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(q * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_level(url: str, questions: List[str], concurrency: int, total: int, timeout: float) -> Dict[str, Any]:
+    """以固定并发发送 total 个请求（问题轮流取自 questions）。"""
+    def _one(i: int):
+        start = time.monotonic()
+        try:
+            resp = requests.post(url, json={"query": questions[i % len(questions)]}, timeout=timeout)
+            ok = resp.status_code == 200
+        except requests.RequestException:
+            ok = False
+        return ok, (time.monotonic() - start) * 1000
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(_one, range(total)))
+    elapsed = time.monotonic() - start
+    latencies = sorted(ms for ok, ms in results if ok)
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "ok": len(latencies),
+        "errors": total - len(latencies),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "p50_ms": round(_percentile(latencies, 0.5), 1),
+        "p95_ms": round(_percentile(latencies, 0.95), 1),
+        "max_ms": round(latencies[-1], 1) if latencies else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="/chat 并发压测")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/chat")
+    parser.add_argument("--concurrency", default="1,2,4,8,16", help="逗号分隔的并发数列表")
+    parser.add_argument("--requests", type=int, default=32, help="每个并发级别发送的请求数")
+    parser.add_argument("--questions", default=None, help="问题列表 JSON（默认使用预热问题清单）")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    questions = load_questions(args.questions)
+    report = []
+    for level in [int(c) for c in args.concurrency.split(",") if c.strip()]:
+        result = run_level(args.url, questions, level, max(args.requests, level), args.timeout)
+        report.append(result)
+        print(
+            f"并发 {result['concurrency']:>3}: {result['throughput_rps']:>7.2f} req/s, "
+            f"p50 {result['p50_ms']:>8.1f}ms, p95 {result['p95_ms']:>8.1f}ms, 失败 {result['errors']}"
+        )
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,41 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import List, Optional, Any, Dict
+import asyncio
+import json
+import time
 import uvicorn
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
+from src.api.admission import AdmissionRejected, Ticket, create_admission_controller
+from src.api.session_store import ConversationSession, create_session_store, new_session_id
+from src.graph_rag.graph_stats import GraphStatsCache
 from src.graph_rag.rag_engine import RAGEngine
+from src.utils import metrics
+from src.utils.config_loader import config
+from src.utils.deadline import deadline_scope
 from src.utils.logger import logger
 
+# 请求带此 header 时在响应中返回各阶段耗时（调试用）
+DEBUG_TIMINGS_HEADER = (config.get("tracing", {}) or {}).get("debug_header", "X-Debug-Timings")
+# 每个会话在服务端保留的最近消息条数
+SESSION_MAX_TURNS = int(((config.get("api", {}) or {}).get("session_store", {}) or {}).get("max_turns", 20))
+# 同时执行的 RAG 流水线数量上限（同步的 LLM / Neo4j 调用放到独立线程池，不阻塞事件循环）
+# 排队长度、请求截止时间与降级阈值见 api.admission（src/api/admission.py）
+MAX_CONCURRENCY = max(int((config.get("api", {}) or {}).get("max_concurrency", 16)), 1)
+# /chat/batch 单次请求最多的问题数
+BATCH_MAX_QUESTIONS = int((config.get("api", {}) or {}).get("batch_max_questions", 1000))
+
 # === 修改点 1：定义请求模型，增加 history 字段 ===
 class ChatRequest(BaseModel):
     query: str
     # history 是一个列表，列表里是字典，默认为空
     # 结构示例: [{"role": "user", "content": "北京养老院"}, {"role": "assistant", "content": "..."}]
     history: List[Dict[str, str]] = []
+    # 会话 ID：携带时由服务端补全历史记录，客户端无需再发送 history；不携带则新建会话
+    session_id: Optional[str] = None
 
 # === 修改点 2：定义响应模型，增加 rewritten_query 方便调试 ===
 class ChatResponse(BaseModel):
@@ -20,52 +43,236 @@ class ChatResponse(BaseModel):
     context: str
     intent: Optional[dict] = None
     rewritten_query: Optional[str] = None  # 返回重写后的问题
+    llm_usage: Optional[dict] = None  # 本次请求各 LLM 调用的 token / 耗时 / 费用明细
+    parse_path: Optional[str] = None  # 意图解析路径：rule / llm / rule_fallback
+    timings: Optional[dict] = None  # 各阶段 / Cypher / LLM 调用的耗时 span 树，仅在带调试 header 时返回
+    session_id: Optional[str] = None  # 下一轮请求携带此 ID 即可延续对话
+    answer_source: Optional[str] = None  # 回答来源：generated / precomputed（预计算回答库）/ retrieval_only / fallback
+    degraded: bool = False  # 服务过载时以降级模式处理（未调用大模型重写与生成）
+
+class BatchChatRequest(BaseModel):
+    questions: List[str]
+
+# === Prometheus 指标 ===
+HTTP_REQUESTS = metrics.counter("kgqa_http_requests_total", "HTTP 请求数", ["method", "endpoint", "status"])
+HTTP_SECONDS = metrics.histogram("kgqa_http_request_duration_seconds", "HTTP 请求耗时", ["method", "endpoint"])
+CHAT_REQUESTS = metrics.counter(
+    "kgqa_chat_requests_total", "/chat 请求数（按意图、解析路径与回答来源）", ["intent", "parse_path", "answer_source"]
+)
+CHAT_SECONDS = metrics.histogram("kgqa_chat_duration_seconds", "/chat 流水线耗时（按意图）", ["intent"])
 
 # 全局 RAG 引擎实例
 rag_engine = None
+# 全局会话存储（内存 LRU + TTL，或 SQLite）
+session_store = None
+# /chat 专用线程池与准入控制：超出上限的请求在事件循环上排队等待，不占线程；队列满时直接返回 503
+chat_executor = None
+admission = None
+# 图谱统计缓存（按图谱版本号刷新）
+graph_stats = None
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # 启动时初始化
-    global rag_engine
+    global rag_engine, session_store, chat_executor, admission, graph_stats
     logger.info("Initializing RAG Engine...")
     rag_engine = RAGEngine()
+    if rag_engine.retriever.driver:
+        graph_stats = GraphStatsCache(rag_engine.retriever.driver, rag_engine.retriever.graph_version)
+    session_store = create_session_store()
+    chat_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="chat")
+    admission = create_admission_controller()
     yield
     # 关闭时清理
     logger.info("Closing RAG Engine...")
     if rag_engine:
         rag_engine.close()
+    if chat_executor:
+        chat_executor.shutdown(wait=False)
+    if session_store:
+        session_store.close()
 
 app = FastAPI(title="Insurance & Medical KGQA API", lifespan=lifespan)
 
+@app.middleware("http")
+async def metrics_middleware(request: Request, call_next):
+    # 按路由模板（如 /sessions/{session_id}）统计，避免路径参数撑爆标签基数
+    start = time.monotonic()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        endpoint = getattr(route, "path", None) or "unmatched"
+        HTTP_REQUESTS.inc(method=request.method, endpoint=endpoint, status=str(status))
+        HTTP_SECONDS.observe(time.monotonic() - start, method=request.method, endpoint=endpoint)
+
+def _collect_runtime_metrics():
+    # 抓取 /metrics 时才计算：线程池 / 连接池占用与各缓存命中率
+    yield ("kgqa_chat_max_concurrency", "gauge", "/chat 线程池大小", {}, MAX_CONCURRENCY)
+    if admission is not None:
+        s = admission.stats()
+        yield ("kgqa_chat_in_flight", "gauge", "正在执行的 /chat 流水线数", {}, s["in_flight"])
+        yield ("kgqa_chat_waiting", "gauge", "排队等待执行的 /chat 请求数", {}, s["waiting"])
+        yield ("kgqa_chat_admitted_total", "counter", "被接纳的 /chat 请求数", {}, s["admitted"])
+        yield ("kgqa_chat_degraded_total", "counter", "以降级模式处理的 /chat 请求数", {}, s["degraded"])
+        for reason in ("queue_full", "queue_timeout"):
+            yield ("kgqa_chat_rejected_total", "counter", "被拒绝（503）的 /chat 请求数",
+                   {"reason": reason}, s[f"rejected_{reason}"])
+    if rag_engine is None:
+        return
+    yield ("kgqa_neo4j_pool_max_size", "gauge", "Neo4j 驱动连接池上限", {}, rag_engine.retriever.max_pool_size)
+
+    caches = {}
+    if rag_engine.llm.cache is not None:
+        s = rag_engine.llm.cache.stats()
+        caches["llm_response"] = (s["memory_hits"] + s["disk_hits"], s["memory_hits"] + s["disk_hits"] + s["misses"])
+    if rag_engine.answer_store is not None:
+        s = rag_engine.answer_store.stats(top_n=0)
+        caches["answer_store"] = (s["hits"], s["lookups"])
+    if session_store is not None:
+        s = session_store.stats()
+        caches["sessions"] = (s["hits"], s["hits"] + s["misses"])
+    for name, (hits, lookups) in caches.items():
+        yield ("kgqa_cache_hits_total", "counter", "缓存命中次数", {"cache": name}, hits)
+        yield ("kgqa_cache_lookups_total", "counter", "缓存查询次数", {"cache": name}, lookups)
+        yield ("kgqa_cache_hit_ratio", "gauge", "缓存命中率", {"cache": name}, hits / lookups if lookups else 0.0)
+
+metrics.register_collector(_collect_runtime_metrics)
+
 @app.post("/chat", response_model=ChatResponse)
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
     if not request.query:
         raise HTTPException(status_code=400, detail="Query cannot be empty")
-    
+
+    debug_timings = bool(http_request.headers.get(DEBUG_TIMINGS_HEADER))
+    try:
+        async with admission.admit() as ticket:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(chat_executor, _handle_chat, request, debug_timings, ticket)
+    except AdmissionRejected as e:
+        # 过载时快速失败，客户端按 Retry-After 重试，而不是排队到超时
+        logger.warning(f"/chat rejected: {e.reason}")
+        raise HTTPException(
+            status_code=503, detail=f"Server busy ({e.reason})", headers={"Retry-After": str(e.retry_after)}
+        )
+
+def _handle_chat(request: ChatRequest, debug_timings: bool, ticket: Ticket) -> ChatResponse:
+    """在 chat_executor 线程中执行：读写会话、在请求截止时间内调用同步的 RAG 流水线。"""
+    # 会话不存在（首次请求或已过期）时新建；客户端显式传了 history 则以客户端为准
+    session = session_store.get(request.session_id) if request.session_id else None
+    if session is None:
+        session = ConversationSession(session_id=request.session_id or new_session_id())
+    if request.history:
+        # 客户端提供的历史与会话中保存的上一轮意图、检索结果不一定对应，不再使用
+        session.turns = list(request.history)
+        session.last_intent = {}
+        session.last_context = ""
+
     try:
         # === 修改点 3：将 history 传给 rag_engine ===
         # 注意：这里的 rag_engine.chat 需要你在 rag_engine.py 里同步修改支持接收 history 参数
-        result = rag_engine.chat(request.query, request.history)
+        start = time.monotonic()
+        with deadline_scope(ticket.deadline):
+            result = rag_engine.chat(
+                request.query, session.turns, degraded=ticket.degraded,
+                last_intent=session.last_intent, last_context=session.last_context,
+            )
+        intent = (result.get("intent") or {}).get("intent", "unknown")
+        CHAT_REQUESTS.inc(
+            intent=intent,
+            parse_path=result.get("parse_path") or "none",
+            answer_source=result.get("answer_source") or "generated",
+        )
+        CHAT_SECONDS.observe(time.monotonic() - start, intent=intent)
+
+        session.add_exchange(request.query, result["answer"], SESSION_MAX_TURNS)
+        session.last_intent = result.get("intent") or {}
+        session.last_context = result.get("context") or ""
+        session_store.save(session)
         
         return ChatResponse(
             answer=result["answer"],
             context=result["context"],
             intent=result["intent"],
-            rewritten_query=result.get("rewritten_query") # 获取重写后的问题
+            rewritten_query=result.get("rewritten_query"), # 获取重写后的问题
+            llm_usage=result.get("llm_usage"),
+            parse_path=result.get("parse_path"),
+            timings=result.get("timings") if debug_timings else None,
+            session_id=session.session_id,
+            answer_source=result.get("answer_source"),
+            degraded=ticket.degraded
         )
     except Exception as e:
         logger.error(f"API Error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/batch")
+def chat_batch_endpoint(request: BatchChatRequest):
+    """
+    批量问答：以 NDJSON 流式返回，每完成一个问题输出一行（含 index 对应请求中的位置），
+    最后一行为 {"done": true, ...} 汇总。
+    """
+    if not request.questions or any(not q.strip() for q in request.questions):
+        raise HTTPException(status_code=400, detail="Questions cannot be empty")
+    if len(request.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+
+    def _lines():
+        for item in rag_engine.chat_batch(request.questions):
+            yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+
+    return StreamingResponse(_lines(), media_type="application/x-ndjson")
+
+@app.get("/sessions/{session_id}")
+def get_session(session_id: str):
+    session = session_store.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return session.to_dict()
+
+@app.delete("/sessions/{session_id}")
+def delete_session(session_id: str):
+    if not session_store.delete(session_id):
+        raise HTTPException(status_code=404, detail="Session not found or expired")
+    return {"deleted": session_id}
+
+@app.get("/answer_store/stats")
+def answer_store_stats():
+    # 预计算回答库命中率，以及未命中最多的意图（用于调整 data/warmup/questions.json）
+    if not rag_engine or rag_engine.answer_store is None:
+        return {"enabled": False}
+    return {"enabled": True, **rag_engine.answer_store.stats()}
+
+@app.get("/stats")
+def stats_endpoint():
+    # 图谱各标签节点数 / 各关系类型边数；按图谱版本号缓存，导入新数据后自动刷新
+    if graph_stats is None:
+        raise HTTPException(status_code=503, detail="Neo4j is not connected")
+    try:
+        return graph_stats.get()
+    except Exception as e:
+        logger.error(f"Stats Error: {e}")
+        raise HTTPException(status_code=503, detail=str(e))
+
+@app.get("/metrics")
+def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
 @app.get("/health")
-async def health_check():
-    # 增加一个简单的 Neo4j 连接状态检查
+def health_check():
+    # 真实的 Neo4j 连通性检查（verify_connectivity），结果缓存 neo4j.health_check_seconds 秒
     neo4j_status = False
-    if rag_engine and rag_engine.retriever and rag_engine.retriever.driver:
-        neo4j_status = True
+    if rag_engine and rag_engine.retriever:
+        neo4j_status = rag_engine.retriever.check_connectivity()
         
-    return {"status": "ok", "neo4j_connected": neo4j_status}
+    return {
+        "status": "ok" if neo4j_status else "degraded",
+        "neo4j_connected": neo4j_status,
+        "chat": admission.stats() if admission else None,
+    }
 
 if __name__ == "__main__":
     uvicorn.run("src.api.main:app", host="0.0.0.0", port=8000, reload=True)
\ No newline at end of file
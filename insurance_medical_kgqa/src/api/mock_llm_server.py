@@ -0,0 +1,217 @@
+# 本地模拟 LLM 服务：实现 OpenAI 兼容的 /v1/chat/completions（含流式），用于离线压测与基准测试
+#
+# 启动：python -m src.api.mock_llm_server --port 8001 [--script data/mock_llm/default_script.yaml]
+# 使用：把 config.yaml 中 llm.api_base 改为 http://127.0.0.1:8001/v1（API Key 可随意填写）
+import argparse
+import asyncio
+import json
+import math
+import random
+import re
+import time
+import uuid
+from pathlib import Path
+from string import Template
+from typing import Any, Dict, List, Optional
+
+import uvicorn
+import yaml
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from src.utils.config_loader import get_project_root
+from src.utils.logger import logger
+
+DEFAULT_SCRIPT = "data/mock_llm/default_script.yaml"
+
+# 粗略的 token 估算：中文约 1.5 个字符一个 token
+CHARS_PER_TOKEN = 1.5
+
+
+def estimate_tokens(text: str) -> int:
+    return max(1, math.ceil(len(text) / CHARS_PER_TOKEN)) if text else 0
+
+
+class LatencyModel:
+    """首 token 前等待时间的分布：constant / uniform / normal / lognormal（单位毫秒）。"""
+
+    def __init__(self, conf: Optional[Dict[str, Any]] = None):
+        conf = conf or {}
+        self.distribution = conf.get("distribution", "constant")
+        self.median_ms = float(conf.get("median_ms", conf.get("mean_ms", 300)))
+        self.sigma = float(conf.get("sigma", 0.3))
+        self.stddev_ms = float(conf.get("stddev_ms", self.median_ms * 0.2))
+        self.min_ms = float(conf.get("min_ms", 0))
+        self.max_ms = float(conf.get("max_ms", 60000))
+
+    def sample(self, rng: random.Random) -> float:
+        if self.distribution == "lognormal":
+            value = rng.lognormvariate(math.log(max(self.median_ms, 1e-3)), self.sigma)
+        elif self.distribution == "normal":
+            value = rng.gauss(self.median_ms, self.stddev_ms)
+        elif self.distribution == "uniform":
+            value = rng.uniform(self.min_ms, self.max_ms)
+        else:
+            value = self.median_ms
+        return min(max(value, self.min_ms), self.max_ms)
+
+
+class ScriptRule:
+    """一条脚本规则：按 system / user 正则匹配，返回模板化的回答。"""
+
+    def __init__(self, conf: Dict[str, Any], default_latency: LatencyModel, default_tps: float):
+        self.name = conf.get("name", "rule")
+        self.system = re.compile(conf["system"], re.S) if conf.get("system") else None
+        self.user = re.compile(conf["user"], re.S) if conf.get("user") else None
+        self.response = Template(str(conf.get("response", "")))
+        self.latency = LatencyModel(conf["latency"]) if conf.get("latency") else default_latency
+        self.tokens_per_second = float(conf.get("tokens_per_second", default_tps))
+
+    def match(self, system_text: str, user_text: str) -> Optional[Dict[str, str]]:
+        """命中返回 user 正则的命名分组（可能为空 dict），未命中返回 None。"""
+        if self.system is not None and not self.system.search(system_text):
+            return None
+        if self.user is None:
+            return {}
+        m = self.user.search(user_text)
+        if m is None:
+            return None
+        return {k: v for k, v in m.groupdict().items() if v is not None}
+
+
+class MockScript:
+    """加载 YAML 脚本，给每个请求挑选规则、生成回答与耗时。"""
+
+    def __init__(self, conf: Dict[str, Any]):
+        self.rng = random.Random(conf.get("seed"))
+        self.latency = LatencyModel(conf.get("latency"))
+        self.tokens_per_second = float(conf.get("tokens_per_second", 60))
+        self.rules = [ScriptRule(r, self.latency, self.tokens_per_second) for r in conf.get("rules", [])]
+        self.hits: Dict[str, int] = {}
+
+    @classmethod
+    def from_file(cls, path: str) -> "MockScript":
+        p = Path(path)
+        if not p.is_absolute():
+            p = get_project_root() / p
+        with open(p, "r", encoding="utf-8") as f:
+            return cls(yaml.safe_load(f) or {})
+
+    def respond(self, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+        system_text = "\n".join(str(m.get("content", "")) for m in messages if m.get("role") == "system")
+        user_text = next((str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), "")
+        for rule in self.rules:
+            groups = rule.match(system_text, user_text)
+            if groups is None:
+                continue
+            self.hits[rule.name] = self.hits.get(rule.name, 0) + 1
+            return {
+                "rule": rule.name,
+                "content": rule.response.safe_substitute(groups).strip(),
+                "ttft_ms": rule.latency.sample(self.rng),
+                "tokens_per_second": rule.tokens_per_second,
+            }
+        self.hits["<none>"] = self.hits.get("<none>", 0) + 1
+        return {"rule": None, "content": "", "ttft_ms": self.latency.sample(self.rng), "tokens_per_second": self.tokens_per_second}
+
+
+def _split_tokens(text: str) -> List[str]:
+    """把回答切成近似 token 的小块，用于流式输出。"""
+    step = max(int(round(CHARS_PER_TOKEN)), 1)
+    return [text[i:i + step] for i in range(0, len(text), step)]
+
+
+def create_app(script_path: str = DEFAULT_SCRIPT) -> FastAPI:
+    script = MockScript.from_file(script_path)
+    app = FastAPI(title="Mock OpenAI-compatible LLM")
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "mock-llm", "object": "model", "owned_by": "local"}]}
+
+    @app.get("/stats")
+    async def rule_stats():
+        return {"rule_hits": script.hits}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        messages = body.get("messages", [])
+        model = body.get("model", "mock-llm")
+        plan = script.respond(messages)
+        content = plan["content"]
+        max_tokens = body.get("max_tokens")
+        tokens = _split_tokens(content)
+        if max_tokens:
+            tokens = tokens[:int(max_tokens)]
+            content = "".join(tokens)
+        prompt_tokens = sum(estimate_tokens(str(m.get("content", ""))) for m in messages)
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(tokens),
+            "total_tokens": prompt_tokens + len(tokens),
+        }
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+        created = int(time.time())
+        per_token_s = 1.0 / plan["tokens_per_second"] if plan["tokens_per_second"] > 0 else 0.0
+
+        if not body.get("stream"):
+            await asyncio.sleep(plan["ttft_ms"] / 1000 + per_token_s * len(tokens))
+            return JSONResponse({
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": usage,
+            })
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+
+        def _chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None) -> str:
+            payload = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            }
+            return f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+        async def _stream():
+            await asyncio.sleep(plan["ttft_ms"] / 1000)
+            yield _chunk({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if i > 0 and per_token_s:
+                    await asyncio.sleep(per_token_s)
+                yield _chunk({"content": token})
+            yield _chunk({}, finish_reason="stop")
+            if include_usage:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": usage,
+                }
+                yield f"data: {json.dumps(payload, ensure_ascii=False)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(_stream(), media_type="text/event-stream")
+
+    logger.info(f"Mock LLM 脚本已加载: {script_path}（{len(script.rules)} 条规则）")
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容模拟 LLM 服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--script", default=DEFAULT_SCRIPT, help="YAML 脚本路径（相对项目根目录）")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.script), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
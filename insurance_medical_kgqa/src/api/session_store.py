@@ -0,0 +1,198 @@
+# 服务端会话存储：按 session_id 保存对话轮次、上轮解析出的意图与检索结果，客户端每轮只需发送新问题
+import copy
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field, fields
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.utils.config_loader import config, get_project_root
+from src.utils.logger import logger
+
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+
+@dataclass
+class ConversationSession:
+    session_id: str
+    turns: List[Dict[str, str]] = field(default_factory=list)  # [{"role": "user"/"assistant", "content": ...}]
+    last_intent: Dict[str, Any] = field(default_factory=dict)  # 上一轮解析出的意图与实体，供本地指代消解确定话题
+    last_context: str = ""  # 上一轮的检索结果，回溯型追问（「上面的」）直接沿用
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def add_exchange(self, query: str, answer: str, max_turns: int) -> None:
+        """追加一问一答，只保留最近 max_turns 条消息。"""
+        self.turns.append({"role": "user", "content": query})
+        self.turns.append({"role": "assistant", "content": answer})
+        if max_turns > 0 and len(self.turns) > max_turns:
+            self.turns = self.turns[-max_turns:]
+        self.updated_at = time.time()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ConversationSession":
+        # 忽略未知字段（其他版本保存的会话）
+        known = {f.name for f in fields(cls)}
+        return cls(**{k: v for k, v in data.items() if k in known})
+
+
+class InMemorySessionStore:
+    """
+    内存会话存储：OrderedDict 做 LRU，超过 ttl_seconds 未访问的会话过期。
+    get 返回副本（与 SQLite 版一致），调用方在线程池中修改后 save 写回，不会与同一会话的并发请求共享对象。
+    """
+
+    def __init__(self, max_sessions: int = 10000, ttl_seconds: Optional[float] = 24 * 3600):
+        self.max_sessions = max(int(max_sessions), 1)
+        self.ttl_seconds = ttl_seconds or None
+        self._sessions: "OrderedDict[str, ConversationSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "saves": 0, "evictions": 0, "expired": 0}
+
+    def _is_expired(self, session: ConversationSession, now: float) -> bool:
+        return self.ttl_seconds is not None and now - session.updated_at > self.ttl_seconds
+
+    def get(self, session_id: str) -> Optional[ConversationSession]:
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                self._stats["misses"] += 1
+                return None
+            if self._is_expired(session, now):
+                del self._sessions[session_id]
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._sessions.move_to_end(session_id)
+            self._stats["hits"] += 1
+            return copy.deepcopy(session)
+
+    def save(self, session: ConversationSession) -> None:
+        session = copy.deepcopy(session)
+        with self._lock:
+            self._sessions[session.session_id] = session
+            self._sessions.move_to_end(session.session_id)
+            self._stats["saves"] += 1
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backend": "memory", "sessions": len(self._sessions), **self._stats}
+
+    def close(self) -> None:
+        pass
+
+
+class SQLiteSessionStore:
+    """SQLite 会话存储：进程重启后会话仍然有效；容量与过期策略同内存版（按 updated_at 淘汰）。"""
+
+    def __init__(self, path: str, max_sessions: int = 10000, ttl_seconds: Optional[float] = 24 * 3600):
+        self.max_sessions = max(int(max_sessions), 1)
+        self.ttl_seconds = ttl_seconds or None
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "saves": 0, "evictions": 0, "expired": 0}
+        self._writes = 0
+
+        p = Path(path)
+        if not p.is_absolute():
+            p = get_project_root() / p
+        p.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(p), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_updated ON sessions(updated_at)")
+        self._conn.commit()
+        logger.info(f"会话存储使用 SQLite: {p}")
+
+    def get(self, session_id: str) -> Optional[ConversationSession]:
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            data, updated_at = row
+            if self.ttl_seconds is not None and now - updated_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+                self._conn.commit()
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+        return ConversationSession.from_dict(json.loads(data))
+
+    def save(self, session: ConversationSession) -> None:
+        data = json.dumps(session.to_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, data, updated_at) VALUES (?, ?, ?)",
+                (session.session_id, data, session.updated_at),
+            )
+            self._stats["saves"] += 1
+            self._writes += 1
+            # 每写入一批再检查容量与过期，避免每次写都做 COUNT
+            if self._writes % 100 == 0:
+                self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        if self.ttl_seconds is not None:
+            cur = self._conn.execute("DELETE FROM sessions WHERE updated_at < ?", (time.time() - self.ttl_seconds,))
+            self._stats["expired"] += cur.rowcount
+        (count,) = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        overflow = count - self.max_sessions
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM sessions WHERE session_id IN "
+                "(SELECT session_id FROM sessions ORDER BY updated_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self._stats["evictions"] += overflow
+
+    def delete(self, session_id: str) -> bool:
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+            self._conn.commit()
+            return cur.rowcount > 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+            return {"backend": "sqlite", "sessions": count, **self._stats}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def create_session_store():
+    """按 config.yaml 中 api.session_store 创建会话存储。"""
+    conf = (config.get("api", {}) or {}).get("session_store", {}) or {}
+    max_sessions = conf.get("max_sessions", 10000)
+    ttl_seconds = conf.get("ttl_seconds", 24 * 3600)
+    if conf.get("backend", "memory") == "sqlite":
+        try:
+            return SQLiteSessionStore(conf.get("sqlite_path", "data/cache/sessions.sqlite"), max_sessions, ttl_seconds)
+        except sqlite3.Error as e:
+            logger.warning(f"SQLite 会话存储初始化失败，改用内存存储: {e}")
+    return InMemorySessionStore(max_sessions, ttl_seconds)
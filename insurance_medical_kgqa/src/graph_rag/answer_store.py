@@ -0,0 +1,127 @@
+# 预计算回答库：高频标准问题的回答按「归一化问题 + 检索意图 + 图谱版本」存储，/chat 命中时直接返回，无需检索和生成。
+# 回答只针对具体问题：检索意图相同但问法不同（「高血压吃什么药」/「高血压有什么症状」）的问题不共用回答，
+# 它们共用的是检索结果（GraphRetriever 按检索签名缓存）
+import hashlib
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Optional
+
+from src.graph_rag.graph_retriever import retrieval_signature
+from src.graph_rag.llm_cache import LLMResponseCache
+from src.utils.config_loader import config
+
+# 闲聊类意图的回答不依赖图谱，不做预计算
+_SKIP_INTENTS = {"general_qa"}
+
+# 未命中的意图最多统计多少种（用于调整预热问题清单）
+_MAX_TRACKED_MISSES = 1000
+
+
+_QUESTION_NOISE = re.compile(r"[\s\"'“”‘’.,，。、!！?？~～;；:：]+")
+
+
+def normalize_question(question: str) -> str:
+    """归一化问题文本：全角转半角、小写，去掉空白与标点（「高血压吃什么药？」与「高血压吃什么药」视为同一问题）。"""
+    return _QUESTION_NOISE.sub("", unicodedata.normalize("NFKC", question or "").lower())
+
+
+def answer_key(parsed_intent: Dict[str, Any], graph_version: str) -> str:
+    """问题取 parsed_intent 中的 raw_query（/chat 为重写后的独立问题，预热与批量问答为原问题）。"""
+    question = normalize_question(parsed_intent.get("raw_query", ""))
+    payload = f"{graph_version}\n{question}\n{retrieval_signature(parsed_intent)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PrecomputedAnswerStore:
+    """
+    存储层复用 LLMResponseCache（内存 LRU + SQLite），预热任务与 API 进程通过同一个 SQLite 文件共享回答。
+    图谱重新导入后版本号变化，旧回答自然不再命中，随 LRU / 容量淘汰。
+    """
+
+    def __init__(self, memory_max_entries: int = 2000, disk_path: Optional[str] = None,
+                 disk_max_entries: int = 20000, ttl_seconds: Optional[float] = None):
+        self._cache = LLMResponseCache(
+            memory_max_entries=memory_max_entries,
+            disk_path=disk_path,
+            disk_max_entries=disk_max_entries,
+            ttl_seconds=ttl_seconds,
+        )
+        self._lock = threading.Lock()
+        self._lookups = 0
+        self._hits = 0
+        self._question_hits: Counter = Counter()  # 命中的标准问题 -> 次数
+        self._misses: Counter = Counter()  # 未命中的意图签名 -> 次数
+
+    @staticmethod
+    def cacheable(parsed_intent: Dict[str, Any]) -> bool:
+        return (
+            bool(parsed_intent)
+            and parsed_intent.get("intent", "general_qa") not in _SKIP_INTENTS
+            and bool(normalize_question(parsed_intent.get("raw_query", "")))
+        )
+
+    def get(self, parsed_intent: Dict[str, Any], graph_version: str) -> Optional[Dict[str, Any]]:
+        """命中返回 {"answer", "context", "question", "intent", "created_at"}，否则返回 None。"""
+        if not self.cacheable(parsed_intent):
+            return None
+        raw = self._cache.get(answer_key(parsed_intent, graph_version))
+        entry = json.loads(raw) if raw is not None else None
+        with self._lock:
+            self._lookups += 1
+            if entry is not None:
+                self._hits += 1
+                self._question_hits[entry.get("question", "")] += 1
+            else:
+                signature = retrieval_signature(parsed_intent)
+                if signature in self._misses or len(self._misses) < _MAX_TRACKED_MISSES:
+                    self._misses[signature] += 1
+        return entry
+
+    def put(self, question: str, parsed_intent: Dict[str, Any], graph_version: str,
+            answer: str, context: str) -> bool:
+        if not self.cacheable(parsed_intent):
+            return False
+        entry = {
+            "question": question,
+            "intent": {k: v for k, v in parsed_intent.items() if k != "raw_query"},
+            "answer": answer,
+            "context": context,
+            "graph_version": graph_version,
+            "created_at": time.time(),
+        }
+        self._cache.set(answer_key(parsed_intent, graph_version), json.dumps(entry, ensure_ascii=False, default=str))
+        return True
+
+    def stats(self, top_n: int = 20) -> Dict[str, Any]:
+        """命中率，以及命中最多的标准问题和未命中最多的意图（用于调整预热问题清单）。"""
+        with self._lock:
+            return {
+                "lookups": self._lookups,
+                "hits": self._hits,
+                "hit_ratio": round(self._hits / self._lookups, 4) if self._lookups else 0.0,
+                "top_hit_questions": self._question_hits.most_common(top_n),
+                "top_missed_intents": [
+                    {"intent": json.loads(sig), "count": n} for sig, n in self._misses.most_common(top_n)
+                ],
+                "storage": self._cache.stats(),
+            }
+
+    def close(self) -> None:
+        self._cache.close()
+
+
+def create_answer_store() -> Optional[PrecomputedAnswerStore]:
+    """按 config.yaml 中 rag.answer_store 创建；未开启时返回 None。"""
+    conf = (config.get("rag", {}) or {}).get("answer_store", {}) or {}
+    if not conf.get("enabled", False):
+        return None
+    return PrecomputedAnswerStore(
+        memory_max_entries=conf.get("memory_max_entries", 2000),
+        disk_path=conf.get("disk_path", "data/cache/answer_store.sqlite"),
+        disk_max_entries=conf.get("disk_max_entries", 20000),
+        ttl_seconds=conf.get("ttl_seconds") or None,
+    )
@@ -0,0 +1,104 @@
+# 预热任务：把高频标准问题逐个跑一遍 RAGEngine，按当前图谱版本写入预计算回答库
+#
+# 运行：python -m src.graph_rag.answer_warmup [data/warmup/questions.json]
+# （neo4j_loader 导入完成后会自动运行，见 rag.answer_store.warm_up_after_load）
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.graph_rag.answer_store import normalize_question
+from src.graph_rag.graph_retriever import retrieval_signature
+from src.utils.config_loader import config, get_project_root
+from src.utils.logger import logger
+
+DEFAULT_QUESTIONS = "data/warmup/questions.json"
+
+
+def load_questions(path: Optional[str] = None) -> List[str]:
+    conf = (config.get("rag", {}) or {}).get("answer_store", {}) or {}
+    p = Path(path or conf.get("questions_file") or DEFAULT_QUESTIONS)
+    if not p.is_absolute():
+        p = get_project_root() / p
+    with open(p, "r", encoding="utf-8") as f:
+        return [q.strip() for q in json.load(f) if q and q.strip()]
+
+
+def warm_up(engine: Any, questions: List[str]) -> Dict[str, Any]:
+    """
+    逐个预计算问题的回答。归一化后相同、且解析出相同检索意图的问题只计算一次（记为 duplicate）。
+    Returns:
+        {"graph_version", "total", "stored", "duplicates", "failed", "elapsed_s", "questions": [...]}
+    """
+    graph_version = engine.retriever.graph_version()
+    seen: Dict[tuple, str] = {}  # (归一化问题, 意图签名) -> 第一个问题
+    items = []
+    start = time.monotonic()
+    for question in questions:
+        item: Dict[str, Any] = {"question": question}
+        t0 = time.monotonic()
+        try:
+            parsed = engine.parser.parse(question)
+            parsed["raw_query"] = question
+            signature = (normalize_question(question), retrieval_signature(parsed))
+            if signature in seen:
+                item.update(status="duplicate", duplicate_of=seen[signature])
+            elif not engine.answer_store.cacheable(parsed):
+                item.update(status="skipped", intent=parsed.get("intent"))
+            else:
+                seen[signature] = question
+                result = engine.precompute(question)
+                item.update(
+                    status="stored" if result["stored"] else "failed",
+                    intent=parsed.get("intent"),
+                    cost=result["llm_usage"]["total"]["cost"],
+                )
+        except Exception as e:
+            logger.error(f"预热失败: {question}: {e}")
+            item.update(status="failed", error=str(e))
+        item["elapsed_ms"] = round((time.monotonic() - t0) * 1000, 1)
+        items.append(item)
+
+    def _count(status: str) -> int:
+        return sum(1 for i in items if i["status"] == status)
+
+    return {
+        "graph_version": graph_version,
+        "total": len(items),
+        "stored": _count("stored"),
+        "duplicates": _count("duplicate"),
+        "skipped": _count("skipped"),
+        "failed": _count("failed"),
+        "elapsed_s": round(time.monotonic() - start, 2),
+        "questions": items,
+    }
+
+
+def run_warm_up(path: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    from src.graph_rag.rag_engine import RAGEngine
+
+    engine = RAGEngine()
+    if engine.answer_store is None:
+        logger.warning("rag.answer_store 未开启，跳过预热")
+        engine.close()
+        return None
+    try:
+        report = warm_up(engine, load_questions(path))
+    finally:
+        engine.close()
+    logger.info(
+        f"预热完成（图谱版本 {report['graph_version']}）：写入 {report['stored']}/{report['total']}，"
+        f"重复 {report['duplicates']}，跳过 {report['skipped']}，失败 {report['failed']}，耗时 {report['elapsed_s']}s"
+    )
+    return report
+
+
+def main():
+    report = run_warm_up(sys.argv[1] if len(sys.argv) > 1 else None)
+    if report is not None:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,268 @@
+# 本地指代消解：根据最近几轮对话中的实体栈补全「它」「第一家」「价格多少」这类追问，解决不了再交给大模型重写
+import re
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.graph_rag.intent_rules import AGE_PATTERN, Gazetteer, get_default_gazetteer, parse_cn_number
+
+# 话题词：用户问题里表示「在问哪一类东西」的词，按长度降序匹配
+TOPIC_WORDS = sorted([
+    "养老院", "养老机构", "敬老院", "护理院", "老年公寓", "养老中心", "养老社区",
+    "重疾险", "医疗险", "防癌险", "意外险", "寿险", "护理险", "保险",
+], key=len, reverse=True)
+
+# 回答中出现的小节标题，不是具体的产品 / 机构名
+_HEADINGS = {"疾病信息", "推荐保险", "适老保险", "保险产品库", "养老机构推荐", "养老机构", "产品"}
+
+SINGULAR_PRONOUNS = sorted([
+    "这家养老院", "那家养老院", "该养老院", "这款产品", "那款产品", "该产品", "这个产品",
+    "这家", "那家", "这款", "那款", "这个", "那个", "这种病", "这个病", "该病", "它",
+], key=len, reverse=True)
+COLLECTIVE_PRONOUNS = sorted(["上面的", "上述", "这些", "那些", "它们", "这几个", "这几家", "这几款"], key=len, reverse=True)
+PERSON_PRONOUNS = ("她", "他")
+
+ORDINAL_PATTERN = re.compile(r"(第([一二三四五六七八九十\d]+)|最后一)(家|个|款|种|项)")
+ELLIPSIS_SWAP_PATTERN = re.compile(r"^(?:那|那么)?(?P<x>[^，。？?]{1,12}?)(?:的呢|呢)[？?]?$")
+LIST_QUESTION_PATTERN = re.compile(r"有哪些|哪些|哪家|哪个|哪几")
+
+# 可以补上话题的省略问题白名单（其余没有实体 / 话题词的问题交给大模型，如「谢谢」「怎么申请理赔？」）
+# 属性：「价格多少？」「地址在哪」「电话是多少」
+ELLIPSIS_ATTRIBUTE_PATTERN = re.compile(
+    r"^(?:那|那么)?(?:它的|的)?(?:价格|价钱|收费|费用|多少钱|保费|地址|电话|联系方式|床位|保障期限|投保年龄)"
+    r"(?:是)?(?:多少钱?|怎么样|如何|是什么|在哪里?|呢)?[？?]?$"
+)
+# 条件：「70岁能买吗」「80周岁可以入住吗」
+ELLIPSIS_CONDITION_PATTERN = re.compile(
+    r"^(?:那|那么)?[\d一二三四五六七八九十百]+周?岁(?:的人|的老人)?(?:能|可以)(?:买|投保|入住|住)吗[？?]?$"
+)
+# 筛选：「5000以下的有哪些？」「3000元以内的呢」
+ELLIPSIS_FILTER_PATTERN = re.compile(
+    r"^(?:那|那么)?(?:价格|月费)?[\d一二三四五六七八九十百千万]+(?:元|块)?(?:以下|以内|以上)的?(?:有哪些|有哪几家|呢)?[？?]?$"
+)
+_ELLIPSIS_PATTERNS = (ELLIPSIS_ATTRIBUTE_PATTERN, ELLIPSIS_CONDITION_PATTERN, ELLIPSIS_FILTER_PATTERN)
+
+_NUMBERED_BOLD = re.compile(r"^\s*\d+[\.、．]\s*\*\*(.+?)\*\*", re.M)
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_BRACKETED = re.compile(r"【(.+?)】")
+
+
+def _item_type(name: str) -> str:
+    if re.search(r"养老|护理院|老年公寓|颐养|敬老|福利院|康养", name):
+        return "nursing_home"
+    if re.search(r"险|保", name):
+        return "insurance"
+    return "item"
+
+
+@dataclass
+class EntityStack:
+    """最近几轮对话中的实体：按出现先后入栈，越靠后越新。"""
+    entities: List[Tuple[str, str]] = field(default_factory=list)  # (类型, 名称)
+    listed: List[str] = field(default_factory=list)  # 最近一次回答中列出的条目（用于「第一家」）
+    topic: Optional[str] = None  # 最近一个能确定话题的用户问题所问的内容，如「北京养老院」
+    last_user_query: Optional[str] = None  # 确定 topic 的那条用户问题
+    age: Optional[int] = None
+    diseases: List[str] = field(default_factory=list)
+
+    def latest(self, *types: str) -> Optional[str]:
+        for entity_type, name in reversed(self.entities):
+            if not types or entity_type in types:
+                return name
+        return None
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "entities": [list(e) for e in self.entities],
+            "listed": list(self.listed),
+            "topic": self.topic,
+            "age": self.age,
+            "diseases": list(self.diseases),
+        }
+
+
+class CoreferenceResolver:
+    """基于规则的指代 / 省略补全。resolve 返回 None 表示规则无法确定，需要调用大模型。"""
+
+    def __init__(self, gazetteer: Optional[Gazetteer] = None, max_messages: int = 6):
+        self._gazetteer = gazetteer
+        self.max_messages = max_messages
+
+    @property
+    def gazetteer(self) -> Gazetteer:
+        if self._gazetteer is None:
+            self._gazetteer = get_default_gazetteer()
+        return self._gazetteer
+
+    # ---------- 实体栈 ----------
+    def build_stack(self, history: List[Dict[str, str]], last_intent: Optional[Dict[str, Any]] = None) -> EntityStack:
+        """
+        last_intent 为上一轮解析出的意图（服务端会话保存），其中 raw_query 是补全后的完整问题：
+        上一轮是「那上海呢」这类追问时，历史原文里推断不出话题，需以它为准。
+        """
+        stack = EntityStack()
+        for msg in history[-self.max_messages:]:
+            content = msg.get("content") or ""
+            if msg.get("role") == "user":
+                self._push_user_turn(stack, content)
+            else:
+                listed = self._extract_listed(content)
+                if listed:
+                    stack.listed = listed
+                    stack.entities.extend((_item_type(name), name) for name in listed)
+        if last_intent:
+            self._push_intent(stack, last_intent)
+        return stack
+
+    def _push_intent(self, stack: EntityStack, intent: Dict[str, Any]) -> None:
+        query = intent.get("raw_query")
+        if isinstance(query, str) and query.strip():
+            self._push_user_turn(stack, query.strip())
+        # 大模型解析出的字段可能是词典里没有的名称
+        diseases = intent.get("disease")
+        for name in diseases if isinstance(diseases, list) else [diseases]:
+            if isinstance(name, str) and name and name not in stack.diseases:
+                stack.diseases.append(name)
+                stack.entities.append(("disease", name))
+        if stack.age is None and isinstance(intent.get("age"), int):
+            stack.age = intent["age"]
+
+    def _push_user_turn(self, stack: EntityStack, text: str) -> None:
+        found = self.gazetteer.find(text)
+        for word, entity_type in found:
+            stack.entities.append((entity_type, word))
+            if entity_type == "disease" and word not in stack.diseases:
+                stack.diseases.append(word)
+        m = AGE_PATTERN.search(text)
+        if m:
+            stack.age = parse_cn_number(m.group(1)) or stack.age
+        topic = self._topic_of(text, found)
+        if not topic and ELLIPSIS_SWAP_PATTERN.match(text.strip()):
+            # 「那上海呢？」：在上一个问题上换掉同类实体，话题随之更新；换不了时旧话题已失效
+            swapped = self._swap(stack, found)
+            if not swapped:
+                stack.topic = stack.last_user_query = None
+                return
+            text, topic = swapped, self._topic_of(swapped, self.gazetteer.find(swapped))
+        if topic:
+            stack.topic = topic
+            stack.last_user_query = text
+
+    def _swap(self, stack: EntityStack, found: List[Tuple[str, str]]) -> Optional[str]:
+        """把 last_user_query 中与 found[0] 同类的实体换成 found[0]，无法替换时返回 None。"""
+        if not found or not stack.last_user_query:
+            return None
+        new_word, new_type = found[0]
+        old = next((w for w, t in self.gazetteer.find(stack.last_user_query) if t == new_type), None)
+        return stack.last_user_query.replace(old, new_word, 1) if old else None
+
+    @staticmethod
+    def _topic_of(text: str, found: List[Tuple[str, str]]) -> Optional[str]:
+        topic_word = next((w for w in TOPIC_WORDS if w in text), None)
+        city = next((w for w, t in found if t == "city"), None)
+        if topic_word:
+            return f"{city or ''}{topic_word}"
+        named = [w for w, t in found if t in ("disease", "drug")]
+        return named[0] if named else None
+
+    @staticmethod
+    def _extract_listed(text: str) -> List[str]:
+        for pattern in (_NUMBERED_BOLD, _BRACKETED, _BOLD):
+            names = []
+            for name in pattern.findall(text):
+                name = name.strip()
+                if name and name not in _HEADINGS and not name.startswith("产品") and name not in names:
+                    names.append(name)
+            if names:
+                return names
+        return []
+
+    # ---------- 消解 ----------
+    def resolve(
+        self, query: str, history: List[Dict[str, str]], last_intent: Optional[Dict[str, Any]] = None
+    ) -> Optional[str]:
+        """
+        Args:
+            last_intent: 上一轮解析出的意图（可选），见 build_stack。
+        Returns:
+            补全后的独立问题；问题本身已完整时原样返回；规则无法确定时返回 None。
+        """
+        if not history:
+            return query
+        stack = self.build_stack(history, last_intent)
+        text = query.strip()
+
+        # 1. 序数指代：「第一家」「第二款」
+        m = ORDINAL_PATTERN.search(text)
+        if m:
+            if not stack.listed:
+                return None
+            index = len(stack.listed) - 1 if m.group(1) == "最后一" else (parse_cn_number(m.group(2)) or 0) - 1
+            if not 0 <= index < len(stack.listed):
+                return None
+            resolved = text.replace(m.group(0), stack.listed[index], 1)
+            return resolved.replace(f"{stack.listed[index]}的的", f"{stack.listed[index]}的")
+
+        # 2. 集合指代：「这些」「上面的」
+        for pronoun in COLLECTIVE_PRONOUNS:
+            if pronoun in text:
+                if stack.listed:
+                    return text.replace(pronoun, "、".join(stack.listed[:5]) + ("中" if LIST_QUESTION_PATTERN.search(text) else ""), 1)
+                return text.replace(pronoun, stack.topic, 1) if stack.topic else None
+
+        # 3. 单数指代：「它」「这家」
+        for pronoun in SINGULAR_PRONOUNS:
+            if pronoun in text:
+                referent = self._singular_referent(stack)
+                return text.replace(pronoun, referent, 1) if referent else None
+
+        # 4. 人称指代：「她适合买什么保险」→ 用历史中的年龄 / 疾病描述这个人
+        if any(p in text for p in PERSON_PRONOUNS):
+            profile = self._profile(stack)
+            if not profile:
+                return None
+            for p in PERSON_PRONOUNS:
+                text = text.replace(p, profile, 1) if p in text else text
+            return text
+
+        found = self.gazetteer.find(text)
+        has_topic_word = any(w in text for w in TOPIC_WORDS)
+
+        # 5. 替换式省略：「那重庆呢？」→ 把上一个问题里的同类实体换掉
+        m = ELLIPSIS_SWAP_PATTERN.match(text)
+        if m and found and stack.last_user_query:
+            return self._swap(stack, found)
+
+        # 6. 问题已经包含实体或话题词：视为完整问题
+        if found or has_topic_word:
+            return query
+
+        # 7. 属性 / 条件省略：「价格多少？」「5000以下的有哪些？」→ 补上最近的话题
+        #    只处理白名单内的短句；寒暄、换话题（「谢谢」「能报销吗」）返回 None 交给大模型
+        if not stack.topic or not any(p.match(text) for p in _ELLIPSIS_PATTERNS):
+            return None
+        if LIST_QUESTION_PATTERN.search(text):
+            joiner = "中"
+        else:
+            # 「70岁能买吗」这类以条件开头的问题直接拼接：「重疾险70岁能买吗」
+            joiner = "" if text[0].isdigit() else "的"
+        return f"{stack.topic}{joiner}{text}"
+
+    @staticmethod
+    def _singular_referent(stack: EntityStack) -> Optional[str]:
+        # 上一轮回答只列出一个条目时指代明确；列出多个时有歧义，交给大模型
+        if len(stack.listed) == 1:
+            return stack.listed[0]
+        if stack.listed:
+            return None
+        return stack.latest("disease", "drug", "insurance", "nursing_home", "item")
+
+    @staticmethod
+    def _profile(stack: EntityStack) -> Optional[str]:
+        if stack.age is None and not stack.diseases:
+            return None
+        parts = []
+        if stack.age is not None:
+            parts.append(f"{stack.age}岁")
+        if stack.diseases:
+            parts.append(f"患有{'、'.join(stack.diseases[:3])}")
+        return "、".join(parts) + "的老人"
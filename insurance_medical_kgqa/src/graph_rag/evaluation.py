@@ -0,0 +1,110 @@
+# 评测：对比融合「重写 + 解析」与分步调用在多轮追问评测集上的一致性与耗时
+#
+# 运行：python -m src.graph_rag.evaluation [data/eval/followup_cases.json]
+import json
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.utils.config_loader import get_project_root
+from src.utils.logger import logger
+
+DEFAULT_CASES = "data/eval/followup_cases.json"
+
+# 参与比较的意图字段；parse_path / rule_confidence / raw_query 等元信息不参与
+COMPARED_FIELDS = ("intent", "age", "disease", "drug", "city", "price_max")
+
+
+def normalize_intent(parsed: Dict[str, Any]) -> Dict[str, Any]:
+    """把意图 dict 规整为可比较的形式：列表转集合、数字转 int、空值去掉。"""
+    normalized: Dict[str, Any] = {}
+    for field in COMPARED_FIELDS:
+        value = parsed.get(field)
+        if value in (None, "", []):
+            continue
+        if isinstance(value, list):
+            value = tuple(sorted(str(v) for v in value))
+        elif field in ("age", "price_max"):
+            try:
+                value = int(value)
+            except (TypeError, ValueError):
+                pass
+        normalized[field] = value
+    return normalized
+
+
+def load_cases(path: Optional[str] = None) -> List[Dict[str, Any]]:
+    p = Path(path or DEFAULT_CASES)
+    if not p.is_absolute():
+        p = get_project_root() / p
+    with open(p, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compare_rewrite_parse_modes(engine: Any, cases: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    对每个用例分别跑分步模式（_llm_rewrite + parser.parse）与融合模式（_rewrite_and_parse），
+    比较归一化后的意图字段。两种模式都直接调用大模型，不经本地指代消解，否则分步模式的耗时与结果不可比。
+    Returns:
+        {"total", "matched", "agreement", "separate_ms", "fused_ms", "mismatches": [...]}
+    """
+    matched = 0
+    separate_ms = 0.0
+    fused_ms = 0.0
+    mismatches = []
+    for case in cases:
+        history, query = case.get("history", []), case["query"]
+
+        start = time.monotonic()
+        rewritten = engine._llm_rewrite(query, history)
+        separate = normalize_intent(engine.parser.parse(rewritten))
+        separate_ms += (time.monotonic() - start) * 1000
+
+        start = time.monotonic()
+        fused_result = engine._rewrite_and_parse(query, history)
+        fused_ms += (time.monotonic() - start) * 1000
+        fused_rewritten, fused = (fused_result[0], normalize_intent(fused_result[1])) if fused_result else (None, None)
+
+        if fused == separate:
+            matched += 1
+        else:
+            mismatches.append({
+                "id": case.get("id"),
+                "query": query,
+                "separate": {"rewritten_query": rewritten, "intent": separate},
+                "fused": {"rewritten_query": fused_rewritten, "intent": fused},
+            })
+
+    total = len(cases)
+    return {
+        "total": total,
+        "matched": matched,
+        "agreement": round(matched / total, 4) if total else 0.0,
+        "separate_ms": round(separate_ms / total, 1) if total else 0.0,
+        "fused_ms": round(fused_ms / total, 1) if total else 0.0,
+        "mismatches": mismatches,
+    }
+
+
+def main():
+    from src.graph_rag.rag_engine import RAGEngine
+
+    cases = load_cases(sys.argv[1] if len(sys.argv) > 1 else None)
+    engine = RAGEngine()
+    # 关闭响应缓存，保证两种模式都真实调用大模型，耗时可比
+    engine.llm.cache = None
+    engine.parser.llm.cache = None
+    try:
+        report = compare_rewrite_parse_modes(engine, cases)
+    finally:
+        engine.close()
+    logger.info(
+        f"融合模式一致率 {report['matched']}/{report['total']} ({report['agreement']:.0%})，"
+        f"平均耗时 分步 {report['separate_ms']}ms / 融合 {report['fused_ms']}ms"
+    )
+    print(json.dumps(report, ensure_ascii=False, indent=2, default=list))
+
+
+if __name__ == "__main__":
+    main()
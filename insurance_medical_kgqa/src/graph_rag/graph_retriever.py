@@ -1,21 +1,111 @@
 
 import os
-from neo4j import GraphDatabase
+import json
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+from neo4j import GraphDatabase, Query
 from src.utils.config_loader import config
+from src.utils.deadline import DeadlineExceeded, remaining
+from src.utils.graph_version import UNVERSIONED, read_graph_version
 from src.utils.logger import logger
+from src.utils.metrics import CYPHER_ERRORS, CYPHER_SECONDS, NEO4J_SESSIONS_ACTIVE
+from src.utils.singleflight import SingleFlight
+from src.utils.tracing import span
+
+# 相同检索条件的并发请求只查询一次 Neo4j
+_retrieve_flight = SingleFlight("graph_retrieve")
+
+# 保险检索中优先精准匹配的产品系列名（可根据业务数据扩展）
+KNOWN_SERIES = ["蓝医保", "好医保", "金医保", "平安", "众安", "长相安"]
+
+# 检索结果只取决于这些意图字段；parse_path / rule_confidence / raw_query 等元信息不影响检索
+RETRIEVAL_FIELDS = ("intent", "disease", "drug", "age", "city", "price_max")
+
+
+def detect_series(raw_query: str) -> str:
+    """返回问题中提到的第一个产品系列名，没有则返回空字符串。"""
+    for series in KNOWN_SERIES:
+        if series in (raw_query or ""):
+            return series
+    return ""
+
+
+def retrieval_signature(parsed_query: dict) -> str:
+    """
+    检索条件的签名：两个解析结果签名相同，则检索结果相同。
+    raw_query 只通过其中的产品系列名影响保险检索，因此用系列名代替原文。
+    """
+    signature = {field: parsed_query.get(field) for field in RETRIEVAL_FIELDS if parsed_query.get(field) not in (None, "", [])}
+    signature.setdefault("intent", "general_qa")
+    if signature["intent"] == "insurance_query":
+        signature["series"] = detect_series(parsed_query.get("raw_query", ""))
+    return json.dumps(signature, ensure_ascii=False, sort_keys=True, default=str)
 
 class GraphRetriever:
     def __init__(self):
         self.uri = config.get("neo4j", {}).get("uri", "bolt://localhost:7687")
         self.username = config.get("neo4j", {}).get("username", "neo4j")
         self.password = config.get("neo4j", {}).get("password", "password")or os.getenv("NEO4J_PASSWORD")
+        self.max_pool_size = int(config.get("neo4j", {}).get("max_connection_pool_size", 100))
         
         try:
-            self.driver = GraphDatabase.driver(self.uri, auth=(self.username, self.password))
+            self.driver = GraphDatabase.driver(
+                self.uri, auth=(self.username, self.password), max_connection_pool_size=self.max_pool_size
+            )
         except Exception as e:
             logger.error(f"Failed to connect to Neo4j: {e}")
             self.driver = None
 
+        # 图谱版本号缓存：每隔 version_check_seconds 秒才重新查询一次
+        self.version_check_seconds = float(config.get("neo4j", {}).get("version_check_seconds", 30))
+        self._graph_version = None
+        self._graph_version_checked = 0.0
+        self._version_lock = threading.Lock()
+
+        # 连通性检查缓存：/health 每隔 health_check_seconds 秒才真正访问一次数据库
+        self.health_check_seconds = float(config.get("neo4j", {}).get("health_check_seconds", 10))
+        self._connected = False
+        self._connectivity_checked = None
+        self._connectivity_lock = threading.Lock()
+
+    def graph_version(self) -> str:
+        """当前图谱版本号（见 src/utils/graph_version.py），用于按版本失效的缓存。"""
+        with self._version_lock:
+            now = time.monotonic()
+            if self._graph_version is None or now - self._graph_version_checked > self.version_check_seconds:
+                self._graph_version = read_graph_version(self.driver) if self.driver else UNVERSIONED
+                self._graph_version_checked = now
+            return self._graph_version
+
+    def check_connectivity(self) -> bool:
+        """调用 driver.verify_connectivity() 确认数据库可用，结果缓存 health_check_seconds 秒。"""
+        with self._connectivity_lock:
+            now = time.monotonic()
+            if self._connectivity_checked is None or now - self._connectivity_checked > self.health_check_seconds:
+                self._connectivity_checked = now
+                if not self.driver:
+                    self._connected = False
+                else:
+                    try:
+                        self.driver.verify_connectivity()
+                        self._connected = True
+                    except Exception as e:
+                        logger.warning(f"Neo4j 连通性检查失败: {e}")
+                        self._connected = False
+            return self._connected
+
+    @contextmanager
+    def _session(self):
+        """driver.session() 的包装：统计正在使用的会话数（即连接池占用）。"""
+        NEO4J_SESSIONS_ACTIVE.inc()
+        try:
+            with self.driver.session() as session:
+                yield session
+        finally:
+            NEO4J_SESSIONS_ACTIVE.dec()
+
     def close(self):
         if self.driver:
             self.driver.close()
@@ -24,225 +114,308 @@ class GraphRetriever:
         """
         根据解析后的查询意图和关键词，在 Neo4j 中检索相关子图，
         并返回格式化的 Context 文本。
+        相同检索条件的并发调用共享同一次查询结果。
         """
+        key = (self.uri, retrieval_signature(parsed_query))
+        return _retrieve_flight.do(key, self._retrieve, parsed_query)
+
+    @staticmethod
+    def _run(session, template: str, cypher: str, **params) -> list:
+        """
+        执行一条 Cypher 并取回全部记录；每次查询记一个 cypher.<模板名> span 和一次耗时指标。
+        设置了请求截止时间时，以剩余时间作为事务超时，由 Neo4j 服务端终止超时的查询。
+        """
+        rem = remaining()
+        if rem is not None:
+            if rem <= 0:
+                raise DeadlineExceeded(f"请求已超过截止时间，跳过查询 {template}")
+            cypher = Query(cypher, timeout=rem)
+        with span(f"cypher.{template}", template=template) as s:
+            start = time.monotonic()
+            try:
+                records = list(session.run(cypher, **params))
+            except Exception:
+                CYPHER_ERRORS.inc(template=template)
+                raise
+            finally:
+                CYPHER_SECONDS.observe(time.monotonic() - start, template=template)
+            if s is not None:
+                s.set(rows=len(records))
+            return records
+
+    def _retrieve(self, parsed_query: dict) -> str:
         if not self.driver:
             return "Error: Database connection unavailable."
+        with self._session() as session:
+            data = self._fetch(session, [parsed_query])
+        return self._format_context(parsed_query, data)
 
-        context_parts = []
-        intent = parsed_query.get("intent", "general_qa")
-        diseases = parsed_query.get("disease", [])
-        drugs = parsed_query.get("drug", [])
-        age = parsed_query.get("age")
-        
-        # === 修改点 1: 获取解析出的城市和价格上限 ===
+    def retrieve_batch(self, parsed_queries: List[dict]) -> List[str]:
+        """
+        批量检索：先汇总所有问题需要的疾病、系列名、养老院筛选条件，
+        每类查询只用一条 UNWIND 语句完成，再按问题分别拼装 Context。
+        返回顺序与 parsed_queries 一致。
+        """
+        if not parsed_queries:
+            return []
+        if not self.driver:
+            return ["Error: Database connection unavailable."] * len(parsed_queries)
+        with self._session() as session:
+            data = self._fetch(session, parsed_queries)
+        return [self._format_context(q, data) for q in parsed_queries]
+
+    @staticmethod
+    def _nursing_filter(parsed_query: dict):
+        """
+        养老院检索条件 (city, price_max)；不需要检索养老院时返回 None。
+        条件用作检索结果的 dict key，这里统一类型：大模型可能把城市解析成列表（取第一个）、价格解析成字符串或小数。
+        """
         city = parsed_query.get("city")
-        price_max = parsed_query.get("price_max") 
-        
-        with self.driver.session() as session:
-            
-            # 1. 疾病相关检索 (并发症、药品、保险)
-            if diseases:
-                for disease_name in diseases:
-                    # 检索疾病基本信息、并发症、药品
-                    cypher_disease = """
-                    MATCH (d:Disease {name: $name})
-                    OPTIONAL MATCH (d)-[:HAS_COMPLICATION]->(c:Disease)
-                    OPTIONAL MATCH (d)-[:TREATED_BY]->(m:Drug)
-                    OPTIONAL MATCH (d)-[:HAS_SYMPTOM]->(s:Symptom)
-                    RETURN d, collect(DISTINCT c.name) as complications, 
-                           collect(DISTINCT m.name) as drugs,
-                           collect(DISTINCT s.name) as symptoms
-                    """
-                    result = session.run(cypher_disease, name=disease_name).single()
-                    
-                    if result:
-                        d_node = result['d']
-                        complications = result['complications']
-                        drug_list = result['drugs']
-                        symptom_list = result['symptoms']
-                        
-                        info = f"【疾病信息】{disease_name}:\n"
-                        if d_node.get('intro'):
-                            info += f"  - 简介: {d_node.get('intro')}\n"
-                        if d_node.get('treat_detail'):
-                            info += f"  - 治疗: {d_node.get('treat_detail')}\n"
-                        if symptom_list:
-                            info += f"  - 症状: {', '.join(symptom_list[:5])}\n"
-                        if complications:
-                            info += f"  - 并发症: {', '.join(complications[:5])}\n"
-                        if drug_list:
-                            info += f"  - 常用药物: {', '.join(drug_list[:5])}\n"
-                        context_parts.append(info)
-
-                    # 检索覆盖该疾病的保险
-                    cypher_insurance = """
-                    MATCH (i:Insurance)-[:COVERS_DISEASE]->(d:Disease {name: $name})
-                    RETURN i.name as ins_name, i.description as desc, i.age_limit as age_limit
-                    """
-                    ins_results = session.run(cypher_insurance, name=disease_name)
-                    ins_list = [f"{r['ins_name']} (年龄限制: {r['age_limit']})" for r in ins_results]
-                    
-                    if ins_list:
-                        context_parts.append(f"【推荐保险】针对 {disease_name} 的相关保险产品: {', '.join(ins_list)}")
-
-            # 2. 年龄相关保险检索
-            if age:
-                if age >= 60:
-                    cypher_age = """
-                    MATCH (i:Insurance)-[:TARGETS_POPULATION]->(p:Population {name: '老年人'})
-                    RETURN i.name as ins_name, i.age_limit as age_limit, i.description as desc
-                    LIMIT 5
-                    """
-                    age_results = session.run(cypher_age)
-                    rec_ins = []
-                    for r in age_results:
-                        rec_ins.append(f"{r['ins_name']} ({r['age_limit']})")
-                    
-                    if rec_ins:
-                        context_parts.append(f"【适老保险】适合 {age} 岁人群的保险产品: {', '.join(rec_ins)}")
-
-# ... (保留上面的疾病和年龄检索代码) ...
-
-            # ==========================================
-            # === 修改点：增强版保险精准检索逻辑 ===
-            # ==========================================
-            # ==========================================
-            # === 修改后的保险检索逻辑：优先关键词匹配 ===
-            # ==========================================
-            if intent == "insurance_query":
-                # 1. 获取原始问题文本
-                raw_query = parsed_query.get("raw_query", "")
-                
-                # 2. 动态构建 Cypher 查询
-                # 逻辑：如果问题里包含具体的系列名（如"蓝医保"），就优先搜它
-                # 否则才去搜泛泛的"医疗"、"重疾"
-                
-                specific_keyword = ""
-                # 这里可以根据你的业务数据扩展常见系列名
-                known_series = ["蓝医保", "好医保", "金医保", "平安", "众安", "长相安"]
-                for series in known_series:
-                    if series in raw_query:
-                        specific_keyword = series
-                        break
-                
-                if specific_keyword:
-                    # === 场景 A: 精准狙击 ===
-                    # 用户提到了具体系列，直接 CONTAINS 那个系列名
-                    logger.info(f"🔍 检测到特定产品系列: {specific_keyword}，执行精准检索")
-                    cypher_ins = f"""
-                    MATCH (i:Insurance)
-                    WHERE i.name CONTAINS '{specific_keyword}'
-                    RETURN i.name as name, 
-                           i.age_limit as age_limit, 
-                           i.description as desc,
-                           i.category as category,
-                           i.price as price
-                    LIMIT 6  // 精准搜索时 LIMIT 可以大一点，确保该系列全覆盖
-                    """
-                else:
-                    # === 场景 B: 泛泛搜索 (保留原有逻辑) ===
-                    # 用户只说了"推荐个保险"，那就随机推荐
-                    logger.info("🔍 未检测到特定系列，执行通用随机检索")
-                    cypher_ins = """
-                    MATCH (i:Insurance)
-                    WHERE i.name CONTAINS '重疾' OR i.name CONTAINS '医疗' OR i.name CONTAINS '护理' OR i.name CONTAINS '防癌'
-                    RETURN i.name as name, 
-                           i.age_limit as age_limit, 
-                           i.description as desc,
-                           i.category as category,
-                           i.price as price
-                    ORDER BY rand()
-                    LIMIT 20
-                    """
-
-                # 执行查询
-                gen_results = session.run(cypher_ins)
-                
-                ins_data = []
-                for r in gen_results:
-                    ins_data.append({
-                        "name": r['name'],
-                        "category": r.get('category', '未知'),
-                        "age_limit": r['age_limit'],
-                        "desc": r['desc']
-                    })
-                
-                # 格式化输出给 LLM
-                filtered_ins_list = []
-                for item in ins_data:
-                    item_str = f"【产品】{item['name']}\n   - 险种: {item['category']}\n   - 投保年龄: {item['age_limit']}\n   - 描述: {item['desc'][:50]}..."
-                    filtered_ins_list.append(item_str)
-                
-                if filtered_ins_list:
-                    context_parts.append(f"【保险产品库】(已根据关键词 '{specific_keyword or '通用'}' 筛选):\n" + "\n".join(filtered_ins_list))
-             
-            
-            # === 修改点 2: 修复养老院检索逻辑 ===
-            # 只要意图是找养老院，或者查询中包含了城市/价格，就触发检索
-            if intent == "nursing_home_search" or city or price_max:
-                params = {}
-                # 基础查询
-                query_parts = ["MATCH (n:NursingHome)"]
-                where_clauses = []
-                
-                # 逻辑修复：如果在找城市，去 'address' 或 'name' 里找，而不是不存在的 'city' 属性
-                if city:
-                    where_clauses.append("(n.address CONTAINS $city OR n.name CONTAINS $city)")
-                    params['city'] = city
-                
-                # 逻辑修复：启用价格过滤，注意数据库里的 price 是字符串，需要转数字
-                if price_max:
-                    where_clauses.append("toInteger(n.price) <= $price_max")
-                    params['price_max'] = price_max
-                
-                if where_clauses:
-                    query_parts.append("WHERE " + " AND ".join(where_clauses))
-                
-                # 逻辑修复：RETURN 中删除了 n.city，改用 address
-                query_parts.append("""
-                    RETURN n.name as name, 
-                           n.price as price, 
-                           n.address as address, 
-                           n.services as services, 
-                           n.beds as beds, 
-                           n.nature as nature 
-                        LIMIT 5
-                """)                
-                nh_query = "\n".join(query_parts)
-                logger.info(f"Executing Cypher: {nh_query} | Params: {params}") # 添加日志方便调试
-                
-                nh_results = session.run(nh_query, **params)
-                
-                nh_list = []
-                for r in nh_results:
-                    # 4. 【关键修改】构建详细的信息卡片，而不是简单的一句话
-                    detail = f"【{r['name']}】"
-                    detail += f"\n  - 价格: {r['price']}元/月"
-                    detail += f"\n  - 地址: {r['address']}"
-                    
-                    # 使用 .get() 或检查 None，防止数据缺失时报错
-                    if r['nature']:
-                        detail += f"\n  - 性质: {r['nature']}"
-                    if r['beds']:
-                        detail += f"\n  - 床位: {r['beds']}"
-                    if r['services']:
-                        # 截取过长的服务描述，避免 Context 爆长
-                        services = r['services'][:100] + "..." if len(str(r['services'])) > 100 else r['services']
-                        detail += f"\n  - 特色服务: {services}"
-                    
-                    nh_list.append(detail)
-                
-                if nh_list:
-                    # 将结构化的文本加入 context
-                    context_str = f"【养老机构推荐】(筛选条件: 城市={city or '不限'}, 预算<{price_max or '不限'}):\n" + "\n".join(nh_list)
-                    context_parts.append(context_str)
+        if isinstance(city, (list, tuple)):
+            city = next((c for c in city if c), None)
+        city = (str(city).strip() if city else "") or None
+        try:
+            price_max = int(float(parsed_query.get("price_max") or 0)) or None
+        except (TypeError, ValueError, OverflowError):
+            price_max = None
+        # 只要意图是找养老院，或者查询中包含了城市/价格，就触发检索
+        if parsed_query.get("intent", "general_qa") == "nursing_home_search" or city or price_max:
+            return city, price_max
+        return None
+
+    @staticmethod
+    def _diseases(parsed_query: dict) -> List[str]:
+        """疾病列表：大模型可能把单个疾病解析成字符串，统一成列表并去掉空值。"""
+        diseases = parsed_query.get("disease")
+        if not isinstance(diseases, (list, tuple)):
+            diseases = [diseases]
+        return [str(d).strip() for d in diseases if d and str(d).strip()]
+
+    @staticmethod
+    def _age(parsed_query: dict) -> Optional[int]:
+        """年龄统一成 int：大模型可能解析成 "65" 或 65.0，无法解析时返回 None。"""
+        try:
+            return int(float(parsed_query.get("age") or 0)) or None
+        except (TypeError, ValueError, OverflowError):
+            return None
+
+    def _fetch(self, session, parsed_queries: List[dict]) -> dict:
+        """按查询类型分组执行 Cypher，返回供 _format_context 使用的检索结果。"""
+        diseases, series, nursing_filters = [], [], []
+        need_elder_insurance = need_general_insurance = False
+        for q in parsed_queries:
+            for name in self._diseases(q):
+                if name not in diseases:
+                    diseases.append(name)
+            if (self._age(q) or 0) >= 60:
+                need_elder_insurance = True
+            if q.get("intent", "general_qa") == "insurance_query":
+                # 如果问题里包含具体的系列名（如"蓝医保"），就优先搜它，否则才去搜泛泛的"医疗"、"重疾"
+                keyword = detect_series(q.get("raw_query", ""))
+                if keyword:
+                    if keyword not in series:
+                        series.append(keyword)
                 else:
-                    context_parts.append(f"【养老机构】未找到符合条件的养老院 (城市: {city}, 预算: {price_max})。")
+                    need_general_insurance = True
+            nh_filter = self._nursing_filter(q)
+            if nh_filter is not None and nh_filter not in nursing_filters:
+                nursing_filters.append(nh_filter)
+
+        data = {"diseases": {}, "disease_insurance": {}, "elder_insurance": [], "series": {},
+                "general_insurance": [], "nursing_homes": {}}
+
+        # 1. 疾病相关检索 (并发症、药品、保险)
+        if diseases:
+            # 检索疾病基本信息、并发症、药品
+            cypher_disease = """
+            UNWIND $names AS name
+            MATCH (d:Disease {name: name})
+            OPTIONAL MATCH (d)-[:HAS_COMPLICATION]->(c:Disease)
+            OPTIONAL MATCH (d)-[:TREATED_BY]->(m:Drug)
+            OPTIONAL MATCH (d)-[:HAS_SYMPTOM]->(s:Symptom)
+            RETURN name, d, collect(DISTINCT c.name) as complications,
+                   collect(DISTINCT m.name) as drugs,
+                   collect(DISTINCT s.name) as symptoms
+            """
+            for r in self._run(session, "disease", cypher_disease, names=diseases):
+                data["diseases"][r["name"]] = r
+
+            # 检索覆盖该疾病的保险
+            cypher_insurance = """
+            UNWIND $names AS name
+            MATCH (i:Insurance)-[:COVERS_DISEASE]->(d:Disease {name: name})
+            RETURN name, i.name as ins_name, i.description as desc, i.age_limit as age_limit
+            """
+            for r in self._run(session, "insurance_by_disease", cypher_insurance, names=diseases):
+                data["disease_insurance"].setdefault(r["name"], []).append(r)
+
+        # 2. 年龄相关保险检索
+        if need_elder_insurance:
+            cypher_age = """
+            MATCH (i:Insurance)-[:TARGETS_POPULATION]->(p:Population {name: '老年人'})
+            RETURN i.name as ins_name, i.age_limit as age_limit, i.description as desc
+            LIMIT 5
+            """
+            data["elder_insurance"] = self._run(session, "insurance_by_age", cypher_age)
+
+        # 3. 保险检索：优先关键词匹配
+        if series:
+            # === 场景 A: 精准狙击 ===
+            # 用户提到了具体系列，直接 CONTAINS 那个系列名
+            logger.info(f"🔍 检测到特定产品系列: {', '.join(series)}，执行精准检索")
+            # 每个关键词在 CALL 子查询内 LIMIT，够数即停止匹配，不必先 collect 全部匹配节点再截取
+            cypher_series = """
+            UNWIND $keywords AS kw
+            CALL {
+                WITH kw
+                MATCH (i:Insurance)
+                WHERE i.name CONTAINS kw
+                RETURN i
+                LIMIT 6  // 精准搜索时 LIMIT 可以大一点，确保该系列全覆盖
+            }
+            RETURN kw,
+                   i.name as name,
+                   i.age_limit as age_limit,
+                   i.description as desc,
+                   i.category as category,
+                   i.price as price
+            """
+            for r in self._run(session, "insurance_series", cypher_series, keywords=series):
+                data["series"].setdefault(r["kw"], []).append(r)
+        if need_general_insurance:
+            # === 场景 B: 泛泛搜索 ===
+            # 用户只说了"推荐个保险"，那就随机推荐（同一批问题共享一次随机结果）
+            logger.info("🔍 未检测到特定系列，执行通用随机检索")
+            cypher_general = """
+            MATCH (i:Insurance)
+            WHERE i.name CONTAINS '重疾' OR i.name CONTAINS '医疗' OR i.name CONTAINS '护理' OR i.name CONTAINS '防癌'
+            RETURN i.name as name,
+                   i.age_limit as age_limit,
+                   i.description as desc,
+                   i.category as category,
+                   i.price as price
+            ORDER BY rand()
+            LIMIT 20
+            """
+            data["general_insurance"] = self._run(session, "insurance_general", cypher_general)
+
+        # 4. 养老院检索
+        if nursing_filters:
+            # 如果在找城市，去 'address' 或 'name' 里找，而不是不存在的 'city' 属性；
+            # 数据库里的 price 是字符串，需要转数字；每个筛选条件同样在子查询内 LIMIT
+            cypher_nh = """
+            UNWIND $filters AS f
+            CALL {
+                WITH f
+                MATCH (n:NursingHome)
+                WHERE (f.city IS NULL OR n.address CONTAINS f.city OR n.name CONTAINS f.city)
+                  AND (f.price_max IS NULL OR toInteger(n.price) <= f.price_max)
+                RETURN n
+                LIMIT 5
+            }
+            RETURN f.idx as idx,
+                   n.name as name,
+                   n.price as price,
+                   n.address as address,
+                   n.services as services,
+                   n.beds as beds,
+                   n.nature as nature
+            """
+            params = [{"idx": i, "city": c, "price_max": p} for i, (c, p) in enumerate(nursing_filters)]
+            logger.info(f"Executing Cypher: nursing_home | Filters: {params}") # 添加日志方便调试
+            for r in self._run(session, "nursing_home", cypher_nh, filters=params):
+                data["nursing_homes"].setdefault(nursing_filters[r["idx"]], []).append(r)
+
+        return data
+
+    def _format_context(self, parsed_query: dict, data: dict) -> str:
+        """把 _fetch 的结果按单个问题拼装成 Context 文本。"""
+        context_parts = []
+        intent = parsed_query.get("intent", "general_qa")
+        diseases = self._diseases(parsed_query)
+        age = self._age(parsed_query)
+
+        # 1. 疾病相关检索 (并发症、药品、保险)
+        for disease_name in diseases:
+            result = data["diseases"].get(disease_name)
+            if result:
+                d_node = result['d']
+                complications = result['complications']
+                drug_list = result['drugs']
+                symptom_list = result['symptoms']
+
+                info = f"【疾病信息】{disease_name}:\n"
+                if d_node.get('intro'):
+                    info += f"  - 简介: {d_node.get('intro')}\n"
+                if d_node.get('treat_detail'):
+                    info += f"  - 治疗: {d_node.get('treat_detail')}\n"
+                if symptom_list:
+                    info += f"  - 症状: {', '.join(symptom_list[:5])}\n"
+                if complications:
+                    info += f"  - 并发症: {', '.join(complications[:5])}\n"
+                if drug_list:
+                    info += f"  - 常用药物: {', '.join(drug_list[:5])}\n"
+                context_parts.append(info)
+
+            ins_list = [f"{r['ins_name']} (年龄限制: {r['age_limit']})" for r in data["disease_insurance"].get(disease_name, [])]
+            if ins_list:
+                context_parts.append(f"【推荐保险】针对 {disease_name} 的相关保险产品: {', '.join(ins_list)}")
+
+        # 2. 年龄相关保险检索
+        if age and age >= 60:
+            rec_ins = [f"{r['ins_name']} ({r['age_limit']})" for r in data["elder_insurance"]]
+            if rec_ins:
+                context_parts.append(f"【适老保险】适合 {age} 岁人群的保险产品: {', '.join(rec_ins)}")
+
+        # 3. 保险检索：优先关键词匹配
+        if intent == "insurance_query":
+            specific_keyword = detect_series(parsed_query.get("raw_query", ""))
+            ins_data = data["series"].get(specific_keyword, []) if specific_keyword else data["general_insurance"]
+
+            # 格式化输出给 LLM
+            filtered_ins_list = []
+            for r in ins_data:
+                item_str = f"【产品】{r['name']}\n   - 险种: {r.get('category', '未知')}\n   - 投保年龄: {r['age_limit']}\n   - 描述: {r['desc'][:50]}..."
+                filtered_ins_list.append(item_str)
+
+            if filtered_ins_list:
+                context_parts.append(f"【保险产品库】(已根据关键词 '{specific_keyword or '通用'}' 筛选):\n" + "\n".join(filtered_ins_list))
+
+        # === 修改点 2: 修复养老院检索逻辑 ===
+        nh_filter = self._nursing_filter(parsed_query)
+        if nh_filter is not None:
+            # === 修改点 1: 使用规整后的城市和价格上限 ===
+            city, price_max = nh_filter
+            nh_list = []
+            for r in data["nursing_homes"].get(nh_filter, []):
+                # 4. 【关键修改】构建详细的信息卡片，而不是简单的一句话
+                detail = f"【{r['name']}】"
+                detail += f"\n  - 价格: {r['price']}元/月"
+                detail += f"\n  - 地址: {r['address']}"
+
+                # 使用 .get() 或检查 None，防止数据缺失时报错
+                if r['nature']:
+                    detail += f"\n  - 性质: {r['nature']}"
+                if r['beds']:
+                    detail += f"\n  - 床位: {r['beds']}"
+                if r['services']:
+                    # 截取过长的服务描述，避免 Context 爆长
+                    services = r['services'][:100] + "..." if len(str(r['services'])) > 100 else r['services']
+                    detail += f"\n  - 特色服务: {services}"
+
+                nh_list.append(detail)
+
+            if nh_list:
+                # 将结构化的文本加入 context
+                context_str = f"【养老机构推荐】(筛选条件: 城市={city or '不限'}, 预算<{price_max or '不限'}):\n" + "\n".join(nh_list)
+                context_parts.append(context_str)
+            else:
+                context_parts.append(f"【养老机构】未找到符合条件的养老院 (城市: {city}, 预算: {price_max})。")
 
         # === ！！！必须确保这下面有这两行代码！！！ ===
         if not context_parts:
             return "知识图谱检索完成，但在图谱中未发现与该特定实体或条件直接匹配的记录。"
-        
+
         return "\n".join(context_parts)  # <--- 这行丢失会导致报错！
 
 if __name__ == "__main__":
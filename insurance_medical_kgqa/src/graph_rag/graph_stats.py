@@ -0,0 +1,71 @@
+# 图谱统计：各标签节点数、各关系类型边数，按图谱版本号缓存，供 /stats 接口与前端侧边栏展示
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from src.utils.logger import logger
+
+# 内部元数据节点，不计入统计
+_HIDDEN_LABELS = {"GraphMeta"}
+
+# 单标签 / 单关系类型的 count 查询由 Neo4j 的 count store 直接返回，不扫描节点
+_LABELS = "CALL db.labels() YIELD label RETURN label"
+_REL_TYPES = "CALL db.relationshipTypes() YIELD relationshipType RETURN relationshipType"
+
+
+def _quote(name: str) -> str:
+    return "`" + name.replace("`", "``") + "`"
+
+
+def compute_graph_stats(driver) -> Dict[str, Any]:
+    """逐个标签 / 关系类型查询计数，返回 {"nodes": {label: n}, "relationships": {type: n}, "total_nodes", "total_relationships"}。"""
+    with driver.session() as session:
+        labels = [r["label"] for r in session.run(_LABELS) if r["label"] not in _HIDDEN_LABELS]
+        rel_types = [r["relationshipType"] for r in session.run(_REL_TYPES)]
+        nodes = {
+            label: session.run(f"MATCH (n:{_quote(label)}) RETURN count(n) AS c").single()["c"]
+            for label in labels
+        }
+        relationships = {
+            rel: session.run(f"MATCH ()-[r:{_quote(rel)}]->() RETURN count(r) AS c").single()["c"]
+            for rel in rel_types
+        }
+        # 多标签节点按标签相加会重复计数，总数单独查询（同样走 count store）
+        total_nodes = session.run("MATCH (n) RETURN count(n) AS c").single()["c"] - sum(
+            session.run(f"MATCH (n:{_quote(label)}) RETURN count(n) AS c").single()["c"] for label in _HIDDEN_LABELS
+        )
+        total_relationships = session.run("MATCH ()-[r]->() RETURN count(r) AS c").single()["c"]
+    return {
+        "nodes": dict(sorted(nodes.items(), key=lambda kv: -kv[1])),
+        "relationships": dict(sorted(relationships.items(), key=lambda kv: -kv[1])),
+        "total_nodes": total_nodes,
+        "total_relationships": total_relationships,
+    }
+
+
+class GraphStatsCache:
+    """
+    统计结果按图谱版本号缓存：版本号不变时直接返回缓存，导入数据后版本号变化才重新计数，
+    前端每次刷新页面都不会对数据库产生额外查询（版本号本身由 GraphRetriever 按间隔缓存）。
+    """
+
+    def __init__(self, driver, version_getter: Callable[[], str]):
+        self.driver = driver
+        self.version_getter = version_getter
+        self._lock = threading.Lock()
+        self._version: Optional[str] = None
+        self._stats: Optional[Dict[str, Any]] = None
+
+    def get(self) -> Dict[str, Any]:
+        version = self.version_getter()
+        with self._lock:
+            if self._stats is None or version != self._version:
+                start = time.monotonic()
+                self._stats = {
+                    **compute_graph_stats(self.driver),
+                    "graph_version": version,
+                    "computed_at": time.time(),
+                }
+                self._version = version
+                logger.info(f"图谱统计已刷新（版本 {version}），耗时 {(time.monotonic() - start) * 1000:.0f}ms")
+            return self._stats
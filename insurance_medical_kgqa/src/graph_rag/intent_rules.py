@@ -0,0 +1,214 @@
+# 规则意图识别：关键词 + 正则 + 词典匹配的快速通道，置信度足够时无需调用大模型
+import csv
+import json
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from src.utils.aho_corasick import AhoCorasick
+from src.utils.config_loader import get_project_root
+from src.utils.logger import logger
+
+# 已爬取养老院数据覆盖的城市 + 其他常见城市
+KNOWN_CITIES = [
+    "北京", "上海", "天津", "重庆", "广州", "深圳", "杭州", "南京", "苏州", "成都", "武汉", "西安",
+    "郑州", "长沙", "济南", "青岛", "沈阳", "大连", "哈尔滨", "长春", "石家庄", "太原", "合肥",
+    "福州", "厦门", "南昌", "南宁", "海口", "贵阳", "昆明", "兰州", "西宁", "银川", "乌鲁木齐",
+    "呼和浩特", "拉萨", "宁波", "无锡", "佛山", "东莞",
+]
+
+# 常见病名：疾病数据里多为「老年人高血压」这类细分病名，口语中的通用病名需要补充
+# （高血压 / 糖尿病 / 恶性肿瘤 也是 Neo4jLoader 为保险建立 COVERS_DISEASE 关联时使用的节点名）
+COMMON_DISEASES = [
+    "高血压", "糖尿病", "冠心病", "恶性肿瘤", "癌症", "脑卒中", "中风", "心脏病", "脑梗", "心梗",
+    "阿尔茨海默病", "帕金森", "慢阻肺", "哮喘", "肾衰竭", "白内障", "关节炎", "骨质疏松", "痛风", "甲状腺结节",
+]
+
+# 各意图的触发关键词（命中即计一票）
+INTENT_KEYWORDS: Dict[str, List[str]] = {
+    "nursing_home_search": ["养老院", "养老机构", "敬老院", "护理院", "老年公寓", "养老中心", "养老社区", "疗养院", "福利院", "床位"],
+    "insurance_query": ["保险", "投保", "保费", "理赔", "承保", "重疾", "医疗险", "防癌险", "意外险", "寿险", "医保", "续保", "险种"],
+    "medical_query": ["症状", "并发症", "治疗", "怎么治", "吃什么药", "用药", "药物", "药品", "病因", "预防", "科室", "挂什么科", "副作用", "禁忌", "疾病"],
+    "general_qa": ["你好", "您好", "谢谢", "你是谁", "再见"],
+}
+
+# 指代词：问题依赖上下文时规则无法可靠补全，交给大模型
+ANAPHORA_PATTERN = re.compile(r"它|它们|这个|那个|这些|那些|上面|上述|刚才|第[一二三四五六七八九十\d]+(家|个|款)")
+
+AGE_PATTERN = re.compile(r"([\d一二三四五六七八九十百]{1,4})\s*(?:多)?\s*(?:周岁|岁)")
+PRICE_PATTERN = re.compile(
+    r"(?:预算|不超过|不高于|低于|最多)?\s*(\d+(?:\.\d+)?)\s*(万|千|k|K)?\s*(?:元|块)?(?:/月|每月|一个月)?\s*(以下|以内|之内|内|左右|封顶)"
+)
+PRICE_PREFIX_PATTERN = re.compile(r"(?:预算|不超过|不高于|低于|最多)\s*(\d+(?:\.\d+)?)\s*(万|千|k|K)?")
+
+_CN_DIGITS = {"一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5, "六": 6, "七": 7, "八": 8, "九": 9}
+
+
+def parse_cn_number(text: str) -> Optional[int]:
+    """解析阿拉伯数字或「七十」「六十五」「一百」这类简单中文数字。"""
+    if text.isdigit():
+        return int(text)
+    if text == "十":
+        return 10
+    if "百" in text:
+        head, _, tail = text.partition("百")
+        rest = parse_cn_number(tail) if tail else 0
+        return (_CN_DIGITS.get(head, 1) * 100) + (rest or 0)
+    if "十" in text:
+        head, _, tail = text.partition("十")
+        tens = _CN_DIGITS.get(head, 1) if head else 1
+        return tens * 10 + (_CN_DIGITS.get(tail, 0) if tail else 0)
+    if len(text) == 1 and text in _CN_DIGITS:
+        return _CN_DIGITS[text]
+    return None
+
+
+class Gazetteer:
+    """
+    词典匹配：词表编译成 Aho-Corasick 自动机，同一位置优先最长匹配。
+    词表来自 DataCleaned 下的疾病、药品数据以及城市列表。
+    """
+
+    def __init__(self, entries: Dict[str, Iterable[str]], min_length: int = 2):
+        self._automaton = AhoCorasick()
+        for entity_type, names in entries.items():
+            for name in names:
+                name = (name or "").strip()
+                if len(name) < min_length:
+                    continue
+                self._automaton.add(name, entity_type)
+        self._automaton.build()
+
+    def find(self, text: str) -> List[Tuple[str, str]]:
+        """返回文本中匹配到的 (词, 类型) 列表，按出现顺序，匹配区间互不重叠。"""
+        return [(text[start:end], entity_type) for start, end, entity_type in self._automaton.find_longest(text)]
+
+
+def _load_default_entries() -> Dict[str, List[str]]:
+    root = get_project_root() / "DataCleaned"
+    entries: Dict[str, List[str]] = {"city": list(KNOWN_CITIES), "disease": list(COMMON_DISEASES), "drug": []}
+    try:
+        with open(root / "Diseases" / "diseases.json", "r", encoding="utf-8") as f:
+            entries["disease"].extend(d.get("name") for d in json.load(f))
+    except (OSError, ValueError) as e:
+        logger.warning(f"规则意图识别：疾病词表加载失败: {e}")
+    try:
+        with open(root / "Drugs" / "medicine.json", "r", encoding="utf-8") as f:
+            for content in json.load(f).values():
+                entries["drug"].extend(m.get("name") for m in content.get("medicines", []))
+    except (OSError, ValueError) as e:
+        logger.warning(f"规则意图识别：药品词表加载失败: {e}")
+    try:
+        with open(root / "NursingHomes" / "nursing_homes.csv", "r", encoding="utf-8-sig") as f:
+            entries["city"].extend((row.get("城市") or "").strip() for row in csv.DictReader(f))
+    except OSError as e:
+        logger.warning(f"规则意图识别：城市列表加载失败: {e}")
+    entries["city"] = sorted(set(c for c in entries["city"] if c))
+    return entries
+
+
+_default_gazetteer: Optional[Gazetteer] = None
+_gazetteer_lock = threading.Lock()
+
+
+def get_default_gazetteer() -> Gazetteer:
+    """懒加载的全局词典（进程内只构建一次）。"""
+    global _default_gazetteer
+    with _gazetteer_lock:
+        if _default_gazetteer is None:
+            _default_gazetteer = Gazetteer(_load_default_entries())
+        return _default_gazetteer
+
+
+class RuleIntentClassifier:
+    """规则意图识别器：输出与 QueryParser 的 LLM 结果同构的 dict，并给出置信度。"""
+
+    def __init__(self, gazetteer: Optional[Gazetteer] = None):
+        self._gazetteer = gazetteer
+
+    @property
+    def gazetteer(self) -> Gazetteer:
+        if self._gazetteer is None:
+            self._gazetteer = get_default_gazetteer()
+        return self._gazetteer
+
+    def classify(self, query: str) -> Tuple[dict, float]:
+        """
+        Returns:
+            (解析结果, 置信度 0~1)。解析结果字段同 LLM：intent / age / disease / drug / city / price_max。
+        """
+        text = query.strip()
+        result: dict = {}
+
+        age = self._extract_age(text)
+        if age is not None:
+            result["age"] = age
+        price_max = self._extract_price(text)
+        if price_max is not None:
+            result["price_max"] = price_max
+
+        diseases: List[str] = []
+        drugs: List[str] = []
+        for word, entity_type in self.gazetteer.find(text):
+            if entity_type == "city" and "city" not in result:
+                result["city"] = word
+            elif entity_type == "disease" and word not in diseases:
+                diseases.append(word)
+            elif entity_type == "drug" and word not in drugs:
+                drugs.append(word)
+        if diseases:
+            result["disease"] = diseases
+        if drugs:
+            result["drug"] = drugs
+
+        matched = [intent for intent, words in INTENT_KEYWORDS.items() if any(w in text for w in words)]
+        if len(matched) == 1:
+            intent = matched[0]
+            confidence = 0.8
+            if intent == "nursing_home_search" and ("city" in result or "price_max" in result):
+                confidence = 0.95
+            elif intent == "insurance_query" and ("age" in result or diseases):
+                confidence = 0.9
+            elif intent == "medical_query" and (diseases or drugs):
+                confidence = 0.95
+        elif not matched:
+            if diseases or drugs:
+                # 只提到疾病/药品名（如「介绍一下阿司匹林」）
+                intent, confidence = "medical_query", 0.8
+            elif "city" in result and "price_max" in result:
+                intent, confidence = "nursing_home_search", 0.7
+            else:
+                intent, confidence = "general_qa", 0.3
+        else:
+            # 多个意图同时命中：以保险优先（疾病/年龄作为保险的条件），但置信度降低
+            intent = "insurance_query" if "insurance_query" in matched else matched[0]
+            confidence = 0.5
+
+        if ANAPHORA_PATTERN.search(text):
+            confidence = min(confidence, 0.4)
+        if len(text) > 40:
+            confidence -= 0.1
+
+        result["intent"] = intent
+        return result, round(max(confidence, 0.0), 2)
+
+    @staticmethod
+    def _extract_age(text: str) -> Optional[int]:
+        m = AGE_PATTERN.search(text)
+        if not m:
+            return None
+        age = parse_cn_number(m.group(1))
+        return age if age is not None and 0 < age < 130 else None
+
+    @staticmethod
+    def _extract_price(text: str) -> Optional[int]:
+        m = PRICE_PATTERN.search(text) or PRICE_PREFIX_PATTERN.search(text)
+        if not m:
+            return None
+        value = float(m.group(1))
+        unit = m.group(2)
+        if unit == "万":
+            value *= 10000
+        elif unit in ("千", "k", "K"):
+            value *= 1000
+        return int(value)
@@ -0,0 +1,204 @@
+# LLM 响应缓存：内存 LRU + SQLite 磁盘两级缓存，用于低温度的确定性调用
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.utils.config_loader import config, get_project_root
+from src.utils.logger import logger
+
+
+def make_cache_key(model: str, messages: List[Dict[str, str]], **params: Any) -> str:
+    """
+    由模型名、消息列表和采样参数生成缓存 key（SHA-256）。
+    参数按 key 排序后序列化，保证同一请求得到同一个 key。
+    """
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        ensure_ascii=False,
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """两级缓存：内存 OrderedDict 做 LRU，SQLite 文件做持久化（可选）。"""
+
+    def __init__(
+        self,
+        memory_max_entries: int = 1024,
+        disk_path: Optional[str] = None,
+        disk_max_entries: int = 50000,
+        ttl_seconds: Optional[float] = 7 * 24 * 3600,
+    ):
+        """
+        Args:
+            memory_max_entries: 内存层最多保留的条目数。
+            disk_path: SQLite 文件路径，为空则只使用内存层。
+            disk_max_entries: 磁盘层最多保留的条目数，超出后按最近访问时间淘汰。
+            ttl_seconds: 条目有效期（秒），None 或 0 表示永不过期。
+        """
+        self.memory_max_entries = max(int(memory_max_entries), 0)
+        self.disk_max_entries = max(int(disk_max_entries), 0)
+        self.ttl_seconds = ttl_seconds or None
+
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, created_at)
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "sets": 0, "evictions": 0, "expired": 0}
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._disk_writes = 0
+        if disk_path:
+            self._open_disk(disk_path)
+
+    def _open_disk(self, disk_path: str) -> None:
+        path = Path(disk_path)
+        if not path.is_absolute():
+            path = get_project_root() / path
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = sqlite3.connect(str(path), check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_accessed ON llm_cache(accessed_at)")
+            self._conn.commit()
+            logger.info(f"LLM 磁盘缓存已启用: {path}")
+        except sqlite3.Error as e:
+            logger.warning(f"LLM 磁盘缓存初始化失败，仅使用内存缓存: {e}")
+            self._conn = None
+
+    def _is_expired(self, created_at: float, now: float) -> bool:
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def get(self, key: str) -> Optional[str]:
+        """命中返回缓存的回答文本，未命中或已过期返回 None。"""
+        now = time.time()
+        with self._lock:
+            item = self._memory.get(key)
+            if item is not None:
+                value, created_at = item
+                if not self._is_expired(created_at, now):
+                    self._memory.move_to_end(key)
+                    self._stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+                self._stats["expired"] += 1
+
+            if self._conn is not None:
+                try:
+                    row = self._conn.execute(
+                        "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                    ).fetchone()
+                    if row is not None:
+                        value, created_at = row
+                        if not self._is_expired(created_at, now):
+                            self._conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                            self._conn.commit()
+                            self._put_memory(key, value, created_at)
+                            self._stats["disk_hits"] += 1
+                            return value
+                        self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        self._conn.commit()
+                        self._stats["expired"] += 1
+                except sqlite3.Error as e:
+                    logger.warning(f"读取 LLM 磁盘缓存失败: {e}")
+
+            self._stats["misses"] += 1
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        """写入缓存（内存层 + 磁盘层）。"""
+        now = time.time()
+        with self._lock:
+            self._put_memory(key, value, now)
+            self._stats["sets"] += 1
+            if self._conn is None:
+                return
+            try:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, created_at, accessed_at) VALUES (?, ?, ?, ?)",
+                    (key, value, now, now),
+                )
+                self._disk_writes += 1
+                # 每写入一批再检查容量，避免每次写都做 COUNT
+                if self._disk_writes % 100 == 0:
+                    self._evict_disk()
+                self._conn.commit()
+            except sqlite3.Error as e:
+                logger.warning(f"写入 LLM 磁盘缓存失败: {e}")
+
+    def _put_memory(self, key: str, value: str, created_at: float) -> None:
+        if self.memory_max_entries == 0:
+            return
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_max_entries:
+            self._memory.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _evict_disk(self) -> None:
+        if self.ttl_seconds is not None:
+            self._conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        total = self._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+        overflow = total - self.disk_max_entries
+        if overflow > 0:
+            self._conn.execute(
+                "DELETE FROM llm_cache WHERE key IN "
+                "(SELECT key FROM llm_cache ORDER BY accessed_at ASC LIMIT ?)",
+                (overflow,),
+            )
+            self._stats["evictions"] += overflow
+
+    def clear(self) -> None:
+        """清空内存层与磁盘层。"""
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """返回命中/未命中计数与命中率。"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        hits = stats["memory_hits"] + stats["disk_hits"]
+        lookups = hits + stats["misses"]
+        stats["hit_ratio"] = round(hits / lookups, 4) if lookups else 0.0
+        return stats
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+# 进程内共享一个缓存实例：QueryParser、RAGEngine、TextGraphBuilder 各自持有 LLMIntegration，但应命中同一份缓存
+_shared_cache: Optional[LLMResponseCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_llm_cache() -> Optional[LLMResponseCache]:
+    """按 config.yaml 中 llm.cache 配置返回共享缓存实例；未启用时返回 None。"""
+    global _shared_cache
+    cache_conf = config.get("llm", {}).get("cache", {}) or {}
+    if not cache_conf.get("enabled", True):
+        return None
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            _shared_cache = LLMResponseCache(
+                memory_max_entries=cache_conf.get("memory_max_entries", 1024),
+                disk_path=cache_conf.get("disk_path"),
+                disk_max_entries=cache_conf.get("disk_max_entries", 50000),
+                ttl_seconds=cache_conf.get("ttl_seconds", 7 * 24 * 3600),
+            )
+        return _shared_cache
@@ -1,13 +1,22 @@
 
 import os  # <--- 新增：引入系统模块
+import time
 from typing import List, Dict, Any, Optional, Generator
 from src.utils.config_loader import config
 from src.utils.logger import logger
+from src.graph_rag.llm_cache import get_llm_cache, make_cache_key
+from src.graph_rag.llm_resilience import LLMCallError, get_resilient_caller
+from src.graph_rag.llm_usage import LLMCallRecord, estimate_cost, record_call, usage_stats
+from src.utils.singleflight import SingleFlight
+from src.utils.tracing import span
 from dotenv import load_dotenv # <--- 新增：确保加载 .env
 
 # 强制加载一次环境变量
 load_dotenv()
 
+# 进程内共享：相同模型 + 消息 + 参数的并发请求只向上游发一次
+_chat_flight = SingleFlight("llm_chat")
+
 class LLMIntegration:
     """大模型集成：优先读 config，其次读环境变量。"""
 
@@ -17,6 +26,8 @@ class LLMIntegration:
         self.model_type = llm_conf.get("model_type", "api")
         self.model_name = llm_conf.get("model_name", "qwen-turbo")
         self.api_base = llm_conf.get("api_base")
+        # 流式调用可以测得首 token 时间（TTFT），并通过 stream_options 拿到 usage
+        self.stream = bool(llm_conf.get("stream", False))
         
         # === 核心修改：双重保险机制 ===
         # 1. 尝试从 config.yaml 读
@@ -26,6 +37,11 @@ class LLMIntegration:
         # 同样的逻辑也可以用于 Neo4j 密码（虽然这里只处理 LLM）
         
         self._client = None
+
+        # 响应缓存（内存 LRU + SQLite），是否使用由每次调用的 use_cache 决定
+        self.cache = get_llm_cache()
+        # 超时 / 重试 / 对冲 / 熔断（进程内共享，熔断状态对所有实例生效）
+        self.resilience = get_resilient_caller()
         
         # 调试日志：只打印前几位，防止泄露
         masked_key = (self.api_key[:8] + "...") if self.api_key else "未找到!"
@@ -42,7 +58,8 @@ class LLMIntegration:
             
             self._client = OpenAI(
                 api_key=self.api_key, 
-                base_url=self.api_base
+                base_url=self.api_base,
+                max_retries=0  # 重试由 ResilientCaller 统一控制，避免 SDK 内部重试叠加
             )
             return self._client
         except Exception as e:
@@ -50,26 +67,154 @@ class LLMIntegration:
             raise
     
     # 下面的 chat 和 generate 函数直接复用之前的即可，不用改
-    def chat(self, messages, temperature=0.3, max_tokens=None, **kwargs):
-        if self.model_type == "api":
-            try:
-                client = self._get_client()
-                resp = client.chat.completions.create(
-                    model=self.model_name,
-                    messages=messages,
-                    temperature=temperature,
-                    max_tokens=max_tokens or 1024,
-                    **kwargs,
-                )
-                return (resp.choices[0].message.content or "").strip()
-            except Exception as e:
-                logger.error(f"调用大模型 API 失败: {e}")
-                return "抱歉，系统暂时无法生成回答 (LLM API Error)。"
-        return "非 API 模式"
+    def chat(self, messages, temperature=0.3, max_tokens=None, use_cache=False, caller="other", **kwargs):
+        """
+        多轮对话调用。
+        caller 标记调用方（rewrite / parse / answer / extract），用于 token、耗时与费用记账。
+        use_cache=True 时先查响应缓存（key 由模型、消息与采样参数哈希得到），
+        适用于意图解析、问题重写、三元组抽取等低温度的确定性调用。
+        缓存未命中时，相同 key 的并发调用通过 single-flight 合并为一次上游请求。
+        上游请求带超时、重试与熔断保护；最终失败时抛出 LLMCallError，
+        由调用方决定如何降级（不再把错误提示当作正常回答返回）。
+        Raises:
+            LLMCallError: 重试耗尽、不可重试的错误或熔断器打开（CircuitOpenError）。
+        """
+        # 每次调用一个 span（llm.rewrite / llm.parse / llm.answer ...），token 等明细由 record_call 写入
+        with span(f"llm.{caller}", model=self.model_name):
+            return self._chat(messages, temperature, max_tokens, use_cache, caller, **kwargs)
+
+    def _chat(self, messages, temperature, max_tokens, use_cache, caller, **kwargs):
+        if self.model_type != "api":
+            return "非 API 模式"
+
+        start = time.monotonic()
+        max_tokens = max_tokens or 1024
+        request_key = make_cache_key(
+            self.model_name, messages, temperature=temperature, max_tokens=max_tokens, **kwargs
+        )
+        use_cache = use_cache and self.cache is not None
+        if use_cache:
+            cached = self.cache.get(request_key)
+            if cached is not None:
+                elapsed_ms = (time.monotonic() - start) * 1000
+                record_call(LLMCallRecord(
+                    caller=caller, model=self.model_name, latency_ms=elapsed_ms, ttft_ms=elapsed_ms, cached=True,
+                ))
+                return cached
+
+        try:
+            (content, outcome, usage), shared = _chat_flight.execute(
+                (self.api_base, request_key),
+                self._request, messages, temperature, max_tokens, use_cache, request_key, **kwargs,
+            )
+        except Exception as e:
+            logger.error(f"调用大模型 API 失败: {e}")
+            record_call(LLMCallRecord(
+                caller=caller, model=self.model_name,
+                latency_ms=(time.monotonic() - start) * 1000, outcome="failure",
+            ))
+            if isinstance(e, LLMCallError):
+                raise
+            raise LLMCallError(str(e)) from e
+
+        elapsed_ms = (time.monotonic() - start) * 1000
+        if shared:
+            # 共享他人结果：只记耗时，不重复计 token 与费用
+            record_call(LLMCallRecord(
+                caller=caller, model=self.model_name, latency_ms=elapsed_ms, ttft_ms=elapsed_ms, shared=True,
+            ))
+        else:
+            prompt_tokens, completion_tokens, ttft_ms = usage
+            record_call(LLMCallRecord(
+                caller=caller,
+                model=self.model_name,
+                prompt_tokens=prompt_tokens,
+                completion_tokens=completion_tokens,
+                latency_ms=elapsed_ms,
+                ttft_ms=ttft_ms,
+                cost=estimate_cost(prompt_tokens, completion_tokens),
+                attempts=outcome.attempts,
+            ))
+        return content
+
+    def _request(self, messages, temperature, max_tokens, use_cache, request_key, **kwargs):
+        """
+        真正发起一次上游请求（经 ResilientCaller），成功后按需写入缓存。
+        Returns:
+            (content, CallOutcome, (prompt_tokens, completion_tokens, ttft_ms))
+        """
+        client = self._get_client()
+
+        def _create(timeout):
+            attempt_start = time.monotonic()
+            if self.stream:
+                return self._create_streaming(client, messages, temperature, max_tokens, timeout, attempt_start, **kwargs)
+            resp = client.chat.completions.create(
+                model=self.model_name,
+                messages=messages,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                timeout=timeout,
+                **kwargs,
+            )
+            content = (resp.choices[0].message.content or "").strip()
+            usage = getattr(resp, "usage", None)
+            # 非流式调用无法区分首 token，TTFT 记为整体耗时
+            ttft_ms = (time.monotonic() - attempt_start) * 1000
+            return content, self._usage_tokens(usage), ttft_ms
+
+        (content, (prompt_tokens, completion_tokens), ttft_ms), outcome = self.resilience.call(_create)
+        # 只缓存成功且非空的回答
+        if use_cache and content:
+            self.cache.set(request_key, content)
+        return content, outcome, (prompt_tokens, completion_tokens, ttft_ms)
+
+    def _create_streaming(self, client, messages, temperature, max_tokens, timeout, attempt_start, **kwargs):
+        """流式请求：拼接增量内容，记录首个内容块的到达时间，并从最后一个块读取 usage。"""
+        stream = client.chat.completions.create(
+            model=self.model_name,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            timeout=timeout,
+            stream=True,
+            stream_options={"include_usage": True},
+            **kwargs,
+        )
+        parts = []
+        usage = None
+        ttft_ms = None
+        for chunk in stream:
+            if getattr(chunk, "usage", None):
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if ttft_ms is None:
+                    ttft_ms = (time.monotonic() - attempt_start) * 1000
+                parts.append(delta)
+        return "".join(parts).strip(), self._usage_tokens(usage), ttft_ms
+
+    @staticmethod
+    def _usage_tokens(usage):
+        """从 API 返回的 usage 字段取 (prompt_tokens, completion_tokens)，缺失时记 0。"""
+        if usage is None:
+            return 0, 0
+        return int(getattr(usage, "prompt_tokens", 0) or 0), int(getattr(usage, "completion_tokens", 0) or 0)
+
+    def stats(self) -> Dict[str, Any]:
+        """缓存、韧性层、single-flight 与按调用方聚合的 token / 耗时 / 费用指标。"""
+        return {
+            "usage": usage_stats.snapshot(),
+            "cache": self.cache.stats() if self.cache is not None else None,
+            "resilience": self.resilience.stats(),
+            "singleflight": _chat_flight.stats(),
+        }
 
     def generate(self, prompt, system_prompt=None, temperature=0.3, **kwargs):
         messages = []
         if system_prompt:
             messages.append({"role": "system", "content": system_prompt})
         messages.append({"role": "user", "content": prompt})
-        return self.chat(messages, temperature=temperature, **kwargs)
\ No newline at end of file
+        return self.chat(messages, temperature=temperature, **kwargs)
@@ -0,0 +1,289 @@
+# LLM 调用韧性层：单次超时、抖动指数退避重试、对冲请求与熔断器
+import contextvars
+import random
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from src.utils.config_loader import config
+from src.utils.deadline import DeadlineExceeded, bounded_timeout, expired, remaining
+from src.utils.logger import logger
+
+
+class LLMCallError(Exception):
+    """大模型调用最终失败（重试耗尽或不可重试的错误）。"""
+
+
+class CircuitOpenError(LLMCallError):
+    """熔断器处于打开状态，请求被快速拒绝。"""
+
+
+# 可重试的 HTTP 状态码与异常类型名（openai SDK 的异常按类名判断，避免在模块加载时导入 openai）
+_RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+_RETRYABLE_NAMES = {"APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError"}
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """判断异常是否值得重试：超时、连接错误、限流和 5xx。"""
+    if isinstance(exc, (TimeoutError, ConnectionError)):
+        return True
+    status = getattr(exc, "status_code", None)
+    if status is not None:
+        return status in _RETRYABLE_STATUS
+    return type(exc).__name__ in _RETRYABLE_NAMES
+
+
+@dataclass
+class CallOutcome:
+    """单次 chat 调用的执行情况。"""
+    attempts: int = 0
+    hedged: bool = False
+    hedge_won: bool = False
+    outcome: str = "pending"  # success / failure / rejected
+    latency: float = 0.0
+    error: Optional[str] = None
+
+
+class CircuitBreaker:
+    """
+    三态熔断器：closed -> 连续失败达到阈值 -> open（快速失败）
+    -> 冷却时间到 -> half_open（放行一个探测请求）-> 成功则 closed，失败则重新 open。
+    """
+
+    def __init__(self, failure_threshold: int = 5, recovery_timeout: float = 30.0):
+        self.failure_threshold = max(int(failure_threshold), 1)
+        self.recovery_timeout = recovery_timeout
+        self._state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self) -> str:
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.recovery_timeout:
+            self._state = "half_open"
+            self._probe_in_flight = False
+        return self._state
+
+    def allow(self) -> bool:
+        """是否放行本次请求。half_open 状态下同一时间只放行一个探测请求。"""
+        with self._lock:
+            state = self._current_state()
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = "closed"
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def release_probe(self) -> None:
+        """探测请求既没有成功也不算上游故障（如请求截止时间耗尽）：保持 half_open，放行下一个探测请求。"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == "half_open" or self._failures >= self.failure_threshold:
+                if self._state != "open":
+                    logger.warning(f"LLM 熔断器打开：连续失败 {self._failures} 次，{self.recovery_timeout}s 内快速失败")
+                self._state = "open"
+                self._opened_at = time.monotonic()
+                self._probe_in_flight = False
+
+
+class ResilientCaller:
+    """按配置对上游调用做超时、重试、对冲与熔断，并累计调用指标。"""
+
+    def __init__(
+        self,
+        timeout_seconds: float = 30.0,
+        max_retries: int = 2,
+        backoff_base_seconds: float = 0.5,
+        backoff_max_seconds: float = 8.0,
+        hedge_enabled: bool = False,
+        hedge_quantile: float = 0.95,
+        hedge_min_delay_seconds: float = 1.0,
+        circuit_failure_threshold: int = 5,
+        circuit_recovery_seconds: float = 30.0,
+        max_workers: int = 16,
+    ):
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max(int(max_retries), 0)
+        self.backoff_base = backoff_base_seconds
+        self.backoff_max = backoff_max_seconds
+        self.hedge_enabled = hedge_enabled
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_delay = hedge_min_delay_seconds
+        self.breaker = CircuitBreaker(circuit_failure_threshold, circuit_recovery_seconds)
+
+        self._latencies: deque = deque(maxlen=200)  # 最近成功请求的耗时，用于估计对冲阈值
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-hedge") if hedge_enabled else None
+        self._lock = threading.Lock()
+        self._stats = {
+            "calls": 0, "successes": 0, "failures": 0, "rejected": 0,
+            "attempts": 0, "retries": 0, "timeouts": 0,
+            "hedges": 0, "hedge_wins": 0, "deadline_exceeded": 0,
+        }
+
+    def _incr(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += n
+
+    def _hedge_delay(self) -> float:
+        """对冲阈值：样本足够时取最近耗时的 p95，否则用配置的最小延迟。"""
+        with self._lock:
+            samples = sorted(self._latencies)
+        if len(samples) < 20:
+            return self.hedge_min_delay
+        idx = min(int(len(samples) * self.hedge_quantile), len(samples) - 1)
+        return max(samples[idx], self.hedge_min_delay)
+
+    def _backoff(self, retry: int) -> float:
+        """全抖动指数退避：[0, min(max, base * 2^retry)] 内均匀取值。"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** retry)))
+
+    def call(self, fn: Callable[[float], Any]) -> Tuple[Any, CallOutcome]:
+        """
+        执行 fn(timeout)，返回 (结果, CallOutcome)。
+        fn 接收本次尝试的超时时间（秒），应在超时或出错时抛出异常。
+        设置了请求截止时间（见 src/utils/deadline.py）时，每次尝试的超时与退避等待都不超过剩余时间，
+        截止时间已过则不再重试；因截止时间导致的失败不计入熔断。
+        Raises:
+            CircuitOpenError: 熔断器打开。
+            LLMCallError: 重试耗尽或遇到不可重试的错误。
+        """
+        outcome = CallOutcome()
+        self._incr("calls")
+        if not self.breaker.allow():
+            self._incr("rejected")
+            outcome.outcome = "rejected"
+            outcome.error = "circuit open"
+            raise CircuitOpenError("LLM 上游熔断中，请求被快速拒绝")
+
+        start = time.monotonic()
+        last_exc: Optional[BaseException] = None
+        for retry in range(self.max_retries + 1):
+            if retry > 0:
+                self._incr("retries")
+                rem = remaining()
+                time.sleep(self._backoff(retry - 1) if rem is None else min(self._backoff(retry - 1), max(rem, 0)))
+            try:
+                timeout = bounded_timeout(self.timeout_seconds)
+            except DeadlineExceeded as e:
+                last_exc = e
+                break
+            try:
+                result = self._attempt(fn, outcome, timeout)
+            except Exception as e:
+                last_exc = e
+                if isinstance(e, TimeoutError) or type(e).__name__ == "APITimeoutError":
+                    self._incr("timeouts")
+                if timeout < self.timeout_seconds and expired():
+                    # 超时是因为请求截止时间而被缩短，不是上游故障
+                    last_exc = DeadlineExceeded(f"请求已超过截止时间: {e}")
+                    break
+                if not is_retryable(e) or retry == self.max_retries:
+                    break
+                logger.warning(f"LLM 调用失败（第 {outcome.attempts} 次尝试），准备重试: {e}")
+                continue
+            outcome.latency = time.monotonic() - start
+            outcome.outcome = "success"
+            with self._lock:
+                if outcome.attempts == 1:
+                    self._latencies.append(outcome.latency)
+                self._stats["successes"] += 1
+            self.breaker.record_success()
+            return result, outcome
+
+        outcome.latency = time.monotonic() - start
+        outcome.outcome = "failure"
+        outcome.error = str(last_exc)
+        self._incr("failures")
+        if isinstance(last_exc, DeadlineExceeded):
+            # 请求自身的截止时间耗尽，不反映上游健康状况，熔断器状态不变；
+            # 但若本次是 half_open 的探测请求，需要释放探测名额，否则熔断器永远停在 half_open
+            self._incr("deadline_exceeded")
+            self.breaker.release_probe()
+        elif last_exc is not None and is_retryable(last_exc):
+            # 只有上游不健康类错误计入熔断
+            self.breaker.record_failure()
+        else:
+            # 参数/鉴权等错误说明上游能正常响应，不算上游故障
+            self.breaker.record_success()
+        raise LLMCallError(f"LLM 调用失败（共 {outcome.attempts} 次尝试）: {last_exc}") from last_exc
+
+    def _attempt(self, fn: Callable[[float], Any], outcome: CallOutcome, timeout: float) -> Any:
+        """一次逻辑尝试；开启对冲时，主请求超过阈值仍未返回则并发发出一个副本，先成功者胜出。"""
+        outcome.attempts += 1
+        self._incr("attempts")
+        if self._executor is None:
+            return fn(timeout)
+
+        primary = self._executor.submit(contextvars.copy_context().run, fn, timeout)
+        done, _ = wait([primary], timeout=self._hedge_delay())
+        if done:
+            return primary.result()
+
+        self._incr("hedges")
+        self._incr("attempts")
+        outcome.hedged = True
+        hedge = self._executor.submit(contextvars.copy_context().run, fn, bounded_timeout(timeout))
+        pending = {primary, hedge}
+        last_exc: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for f in done:
+                if f.exception() is None:
+                    if f is hedge:
+                        outcome.hedge_won = True
+                        self._incr("hedge_wins")
+                    return f.result()
+                last_exc = f.exception()
+        raise last_exc
+
+    def stats(self) -> Dict[str, Any]:
+        """累计的尝试次数与结果计数，以及熔断器状态。"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["circuit_state"] = self.breaker.state
+        return stats
+
+
+# 熔断器状态需要在所有 LLMIntegration 实例间共享，否则每个实例各自计数起不到保护作用
+_shared_caller: Optional[ResilientCaller] = None
+_shared_caller_lock = threading.Lock()
+
+
+def get_resilient_caller() -> ResilientCaller:
+    """按 config.yaml 中 llm.resilience 配置返回共享的 ResilientCaller。"""
+    global _shared_caller
+    with _shared_caller_lock:
+        if _shared_caller is None:
+            conf = config.get("llm", {}).get("resilience", {}) or {}
+            _shared_caller = ResilientCaller(
+                timeout_seconds=conf.get("timeout_seconds", 30.0),
+                max_retries=conf.get("max_retries", 2),
+                backoff_base_seconds=conf.get("backoff_base_seconds", 0.5),
+                backoff_max_seconds=conf.get("backoff_max_seconds", 8.0),
+                hedge_enabled=conf.get("hedge_enabled", False),
+                hedge_quantile=conf.get("hedge_quantile", 0.95),
+                hedge_min_delay_seconds=conf.get("hedge_min_delay_seconds", 1.0),
+                circuit_failure_threshold=conf.get("circuit_failure_threshold", 5),
+                circuit_recovery_seconds=conf.get("circuit_recovery_seconds", 30.0),
+            )
+        return _shared_caller
@@ -0,0 +1,197 @@
+# LLM 调用记账：每次调用的 token、耗时、首 token 时间与费用，按调用方（rewrite / parse / answer / extract）聚合
+import contextvars
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.utils.config_loader import config
+from src.utils.metrics import LLM_CALL_SECONDS, LLM_CALLS, LLM_TOKENS
+from src.utils.tracing import current_span
+
+# 耗时直方图桶上界（毫秒），最后一个桶为 +Inf
+LATENCY_BUCKETS_MS = (50, 100, 250, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+@dataclass
+class LLMCallRecord:
+    """单次 chat 调用的记账记录。"""
+    caller: str
+    model: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: float = 0.0
+    ttft_ms: Optional[float] = None  # 首 token 时间；非流式调用等于整体耗时
+    cost: float = 0.0
+    cached: bool = False  # 命中响应缓存
+    shared: bool = False  # 通过 single-flight 共享了其他请求的结果
+    attempts: int = 0
+    outcome: str = "success"
+    timestamp: float = field(default_factory=time.time)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def to_dict(self) -> Dict[str, Any]:
+        d = asdict(self)
+        d["total_tokens"] = self.total_tokens
+        return d
+
+
+def estimate_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    """按 config.yaml 中 llm.pricing（每千 token 单价）估算费用。"""
+    pricing = config.get("llm", {}).get("pricing", {}) or {}
+    return (
+        prompt_tokens / 1000.0 * float(pricing.get("prompt_per_1k", 0.0))
+        + completion_tokens / 1000.0 * float(pricing.get("completion_per_1k", 0.0))
+    )
+
+
+def _percentile(sorted_values: List[float], q: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    idx = min(int(round(q * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return round(sorted_values[idx], 2)
+
+
+class _CallerStats:
+    """单个调用方的累计值、耗时直方图与最近样本（用于分位数）。"""
+
+    def __init__(self, sample_size: int):
+        self.calls = 0
+        self.cached = 0
+        self.shared = 0
+        self.failures = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.latency_sum_ms = 0.0
+        self.buckets = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.latencies: deque = deque(maxlen=sample_size)
+        self.ttfts: deque = deque(maxlen=sample_size)
+
+    def add(self, rec: LLMCallRecord) -> None:
+        self.calls += 1
+        self.cached += int(rec.cached)
+        self.shared += int(rec.shared)
+        self.failures += int(rec.outcome != "success")
+        self.prompt_tokens += rec.prompt_tokens
+        self.completion_tokens += rec.completion_tokens
+        self.cost += rec.cost
+        self.latency_sum_ms += rec.latency_ms
+        for i, bound in enumerate(LATENCY_BUCKETS_MS):
+            if rec.latency_ms <= bound:
+                self.buckets[i] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+        self.latencies.append(rec.latency_ms)
+        if rec.ttft_ms is not None:
+            self.ttfts.append(rec.ttft_ms)
+
+    def snapshot(self) -> Dict[str, Any]:
+        latencies = sorted(self.latencies)
+        ttfts = sorted(self.ttfts)
+        # 累积直方图（与 Prometheus 的 le 语义一致）
+        histogram, running = {}, 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            running += count
+            histogram[f"le_{bound}"] = running
+        histogram["le_inf"] = running + self.buckets[-1]
+        return {
+            "calls": self.calls,
+            "cached": self.cached,
+            "shared": self.shared,
+            "failures": self.failures,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.prompt_tokens + self.completion_tokens,
+            "cost": round(self.cost, 6),
+            "latency_ms_sum": round(self.latency_sum_ms, 2),
+            "latency_ms": {q: _percentile(latencies, v) for q, v in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99))},
+            "ttft_ms": {q: _percentile(ttfts, v) for q, v in (("p50", 0.5), ("p90", 0.9), ("p95", 0.95), ("p99", 0.99))},
+            "latency_histogram_ms": histogram,
+        }
+
+
+class UsageAggregator:
+    """进程内按调用方聚合 LLM 调用记录。"""
+
+    def __init__(self, sample_size: int = 1000):
+        self.sample_size = sample_size
+        self._by_caller: Dict[str, _CallerStats] = {}
+        self._lock = threading.Lock()
+
+    def record(self, rec: LLMCallRecord) -> None:
+        with self._lock:
+            stats = self._by_caller.get(rec.caller)
+            if stats is None:
+                stats = self._by_caller[rec.caller] = _CallerStats(self.sample_size)
+            stats.add(rec)
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """返回 {caller: {calls, tokens, cost, 分位数, 直方图, ...}}。"""
+        with self._lock:
+            return {caller: stats.snapshot() for caller, stats in self._by_caller.items()}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._by_caller.clear()
+
+
+# 进程级聚合器
+usage_stats = UsageAggregator()
+
+# 当前请求（如一次 RAGEngine.chat）收集到的调用记录；None 表示不在请求上下文中
+_request_records: contextvars.ContextVar[Optional[List[LLMCallRecord]]] = contextvars.ContextVar(
+    "llm_request_records", default=None
+)
+
+
+def record_call(rec: LLMCallRecord) -> None:
+    """写入进程级聚合与 Prometheus 指标，并追加到当前请求的记录列表（如有）。"""
+    usage_stats.record(rec)
+    source = "cache" if rec.cached else ("shared" if rec.shared else "upstream")
+    LLM_CALLS.inc(caller=rec.caller, outcome=rec.outcome, source=source)
+    if source == "upstream":
+        LLM_CALL_SECONDS.observe(rec.latency_ms / 1000.0, caller=rec.caller, outcome=rec.outcome)
+        LLM_TOKENS.inc(rec.prompt_tokens, caller=rec.caller, kind="prompt")
+        LLM_TOKENS.inc(rec.completion_tokens, caller=rec.caller, kind="completion")
+    current = current_span()
+    if current is not None:
+        current.set(
+            prompt_tokens=rec.prompt_tokens, completion_tokens=rec.completion_tokens,
+            ttft_ms=None if rec.ttft_ms is None else round(rec.ttft_ms, 1),
+            cached=rec.cached, shared=rec.shared, attempts=rec.attempts, outcome=rec.outcome,
+        )
+    records = _request_records.get()
+    if records is not None:
+        records.append(rec)
+
+
+@contextmanager
+def track_llm_usage() -> Iterator[List[LLMCallRecord]]:
+    """在 with 块内收集本请求的所有 LLM 调用记录。"""
+    records: List[LLMCallRecord] = []
+    token = _request_records.set(records)
+    try:
+        yield records
+    finally:
+        _request_records.reset(token)
+
+
+def summarize_records(records: List[LLMCallRecord]) -> Dict[str, Any]:
+    """把一次请求的调用记录整理成明细 + 合计，供 RAGEngine.chat 返回。"""
+    total = {"calls": len(records), "prompt_tokens": 0, "completion_tokens": 0, "cost": 0.0, "latency_ms": 0.0}
+    for rec in records:
+        total["prompt_tokens"] += rec.prompt_tokens
+        total["completion_tokens"] += rec.completion_tokens
+        total["cost"] += rec.cost
+        total["latency_ms"] += rec.latency_ms
+    total["total_tokens"] = total["prompt_tokens"] + total["completion_tokens"]
+    total["cost"] = round(total["cost"], 6)
+    total["latency_ms"] = round(total["latency_ms"], 2)
+    return {"calls": [rec.to_dict() for rec in records], "total": total}
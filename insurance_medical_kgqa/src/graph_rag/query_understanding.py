@@ -1,22 +1,17 @@
 import json
 import re
+from src.utils.config_loader import config
 from src.utils.logger import logger
 from src.graph_rag.llm_integration import LLMIntegration  # <--- 引入统一的 LLM 管家
+from src.graph_rag.llm_resilience import LLMCallError
+from src.graph_rag.intent_rules import RuleIntentClassifier
+from src.utils.singleflight import SingleFlight
 
-class QueryParser:
-    def __init__(self):
-        # === 核心修改：不再直接连接 OpenAI，而是使用 LLMIntegration ===
-        # 这样它就能自动读取 .env 里的 DASHSCOPE_API_KEY 了
-        self.llm = LLMIntegration()
+# 相同问题的并发解析只调用一次大模型（热点问题突发时尤为明显）
+_parse_flight = SingleFlight("query_parse")
 
-    def parse(self, query: str) -> dict:
-        """
-        利用大模型解析用户查询意图和关键实体。
-        """
-        system_prompt = """
-        你是一个智能意图识别助手。你的任务是分析用户的自然语言问题，提取关键信息，并以严格的 JSON 格式返回。
-        
-        请提取以下字段：
+# 意图字段说明：QueryParser 与 RAGEngine 的融合「重写 + 解析」调用共用，保证两种模式的输出口径一致
+INTENT_FIELDS_PROMPT = """        请提取以下字段：
         1. intent (字符串, 必选): 用户意图。可选值：
            - "insurance_query" (咨询保险产品、投保条件等)
            - "medical_query" (咨询疾病、药品、症状等)
@@ -28,11 +23,77 @@ class QueryParser:
         5. city (字符串, 可选): 提到的城市或地区（如“北京”、“朝阳区”）。
         6. price_max (整数, 可选): 提到的预算或价格上限（如“5000以下”则提取为 5000）。
 
-        注意：
+"""
+
+INTENT_SYSTEM_PROMPT = """
+        你是一个智能意图识别助手。你的任务是分析用户的自然语言问题，提取关键信息，并以严格的 JSON 格式返回。
+        
+""" + INTENT_FIELDS_PROMPT + """        注意：
         - 如果没有提取到某个字段，请不要包含在 JSON 中，或者设为 null。
         - 仅返回 JSON 字符串，不要包含 Markdown 格式（如 ```json ... ```）。
         """
 
+
+def parse_intent_json(response_text: str) -> dict:
+    """清理大模型输出中的 Markdown 标记并解析为意图 dict，缺少 intent 时补 general_qa。"""
+    cleaned_text = re.sub(r"```json|```", "", response_text).strip()
+    parsed_result = json.loads(cleaned_text)
+    if not isinstance(parsed_result, dict):
+        raise json.JSONDecodeError("intent JSON is not an object", cleaned_text, 0)
+    if "intent" not in parsed_result:
+        parsed_result["intent"] = "general_qa"
+    return parsed_result
+
+class QueryParser:
+    def __init__(self):
+        # === 核心修改：不再直接连接 OpenAI，而是使用 LLMIntegration ===
+        # 这样它就能自动读取 .env 里的 DASHSCOPE_API_KEY 了
+        self.llm = LLMIntegration()
+
+        # 规则快速通道：置信度达到阈值时直接返回，不调用大模型
+        parser_conf = config.get("query_parser", {}) or {}
+        self.rule_fast_path = bool(parser_conf.get("rule_fast_path", True))
+        self.rule_confidence_threshold = float(parser_conf.get("rule_confidence_threshold", 0.75))
+        self.rules = RuleIntentClassifier()
+
+    def parse(self, query: str) -> dict:
+        """
+        解析用户查询意图和关键实体：先走规则快速通道，置信度不足再调用大模型。
+        返回的 dict 中 parse_path 标明本次走的路径：
+          - "rule": 规则结果置信度足够，未调用大模型
+          - "llm": 大模型解析
+          - "rule_fallback": 大模型不可用或输出无法解析，退回规则结果
+        相同 query 的并发调用共享同一次解析结果（各自拿到独立的 dict 拷贝）。
+        """
+        return _parse_flight.do(query, self._parse, query)
+
+    def parse_rules_only(self, query: str) -> dict:
+        """只用规则解析，不调用大模型（服务降级时使用），parse_path 为 "rule_degraded"。"""
+        rule_result, confidence = self.rules.classify(query)
+        rule_result["rule_confidence"] = confidence
+        rule_result["parse_path"] = "rule_degraded"
+        return rule_result
+
+    def _parse(self, query: str) -> dict:
+        rule_result, confidence = self.rules.classify(query)
+        rule_result["rule_confidence"] = confidence
+        if self.rule_fast_path and confidence >= self.rule_confidence_threshold:
+            rule_result["parse_path"] = "rule"
+            logger.info(f"Intent parsed by rules (confidence={confidence}): {rule_result}")
+            return rule_result
+
+        parsed = self._parse_with_llm(query)
+        if parsed is None:
+            rule_result["parse_path"] = "rule_fallback"
+            return rule_result
+        parsed["parse_path"] = "llm"
+        parsed["rule_confidence"] = confidence
+        return parsed
+
+    def _parse_with_llm(self, query: str):
+        """调用大模型解析，失败返回 None。"""
+        system_prompt = INTENT_SYSTEM_PROMPT
+
         user_prompt = f"用户问题：{query}"
 
         try:
@@ -40,27 +101,24 @@ class QueryParser:
             response_text = self.llm.generate(
                 prompt=user_prompt, 
                 system_prompt=system_prompt,
-                temperature=0.1 # 意图识别需要精确，温度调低
+                temperature=0.1, # 意图识别需要精确，温度调低
+                use_cache=True,  # 相同问题的解析结果可直接复用
+                caller="parse"
             )
             
-            # 清理可能存在的 Markdown 格式
-            cleaned_text = re.sub(r"```json|```", "", response_text).strip()
-            
-            # 解析 JSON
-            parsed_result = json.loads(cleaned_text)
-            
-            # 简单的后处理：确保 intent 存在
-            if "intent" not in parsed_result:
-                parsed_result["intent"] = "general_qa"
-                
-            return parsed_result
+            # 清理 Markdown 格式、解析 JSON，并确保 intent 存在
+            return parse_intent_json(response_text)
 
         except json.JSONDecodeError:
             logger.error(f"Intent parsing failed (JSON Error). LLM Output: {response_text}")
-            return {"intent": "general_qa"} # 降级处理
+            return None # 降级处理：由调用方退回规则结果
+        except LLMCallError as e:
+            # LLM 不可用（重试耗尽 / 熔断），直接降级，不再把错误提示当 JSON 解析
+            logger.error(f"Intent parsing failed (LLM unavailable): {e}")
+            return None
         except Exception as e:
             logger.error(f"Intent parsing failed: {e}")
-            return {"intent": "general_qa"}
+            return None
 
 if __name__ == "__main__":
     # 测试代码
@@ -1,8 +1,32 @@
-from typing import List, Dict
+import contextvars
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+from src.utils.config_loader import config
 from src.utils.logger import logger
-from src.graph_rag.query_understanding import QueryParser
-from src.graph_rag.graph_retriever import GraphRetriever
+from src.graph_rag.answer_store import create_answer_store
+from src.graph_rag.coreference import CoreferenceResolver
+from src.graph_rag.query_understanding import INTENT_FIELDS_PROMPT, QueryParser, parse_intent_json
+from src.graph_rag.graph_retriever import GraphRetriever, retrieval_signature
 from src.graph_rag.llm_integration import LLMIntegration
+from src.graph_rag.llm_resilience import LLMCallError
+from src.graph_rag.llm_usage import summarize_records, track_llm_usage
+from src.utils.deadline import DeadlineExceeded
+from src.utils.tracing import span, trace
+
+# 回溯型追问关键词：用户只想在上轮推荐结果里选，屏蔽新检索结果
+RECALL_KEYWORDS = ["上面的", "上述", "刚才", "这几个", "其中", "推荐的"]
+RECALL_NOTICE = "（本轮检索结果已屏蔽，请严格基于 [用户上轮对话历史] 回答）"
+RECALL_NOTICE_WITH_CONTEXT = "（本轮检索结果已屏蔽，请严格基于 [用户上轮对话历史] 回答；以下为上轮推荐所依据的检索结果，仅供核对）"
+
+# 大模型不可用时的兜底回答
+LLM_UNAVAILABLE_ANSWER = "抱歉，大模型服务暂时不可用，请稍后再试。"
+GENERATE_FAILED_ANSWER = "抱歉，生成回答时出现错误。"
+# 降级模式或请求即将超时时，直接返回检索结果
+RETRIEVAL_ONLY_PREFIX = "当前咨询人数较多，以下是知识库中检索到的相关信息，供您参考：\n\n"
+BUSY_ANSWER = "抱歉，当前咨询人数较多，请稍后再试。"
+# 检索失败、无匹配结果或结果被屏蔽时 context 的开头
+_NO_RESULT_PREFIXES = ("检索失败", "Error:", "知识图谱检索完成，但", "（本轮检索结果已屏蔽")
 
 class RAGEngine:
     def __init__(self):
@@ -10,23 +34,58 @@ class RAGEngine:
         self.parser = QueryParser()
         self.retriever = GraphRetriever()
         self.llm = LLMIntegration()
+        # 最终回答是否走 LLM 响应缓存（默认关闭，需在 config.yaml 中显式开启）
+        cache_conf = config.get("llm", {}).get("cache", {}) or {}
+        self.cache_answers = bool(cache_conf.get("cache_final_answers", False))
+        # 融合模式：有历史记录时用一次 LLM 调用同时完成问题重写与意图解析
+        rag_conf = config.get("rag", {}) or {}
+        self.fused_rewrite_parse = bool(rag_conf.get("fused_rewrite_parse", False))
+        # 本地指代消解：能用规则补全的追问不再调用大模型重写
+        self.coreference = CoreferenceResolver() if rag_conf.get("local_coreference", True) else None
+        # 推测检索：LLM 重写问题的同时，先用原始问题解析意图并检索
+        self.speculative_retrieval = bool(rag_conf.get("speculative_retrieval", False))
+        self._speculation_pool = ThreadPoolExecutor(
+            max_workers=int(rag_conf.get("speculative_workers", 4)), thread_name_prefix="speculative"
+        ) if self.speculative_retrieval else None
+        # 批量问答：LLM 调用（解析、生成）的并发上限，以及每条 UNWIND 检索语句最多携带的意图数
+        self.batch_concurrency = max(int(rag_conf.get("batch_concurrency", 8)), 1)
+        self.batch_retrieve_size = max(int(rag_conf.get("batch_retrieve_size", 200)), 1)
+        # 预计算回答库（未开启时为 None）
+        self.answer_store = create_answer_store()
+
+    @staticmethod
+    def _format_history(history: List[Dict[str, str]]) -> str:
+        """取最近的 2 轮对话拼成文本，节省 token 且避免干扰。"""
+        history_text = ""
+        for msg in history[-4:]:
+            role = "用户" if msg['role'] == "user" else "AI助手"
+            history_text += f"{role}: {msg['content']}\n"
+        return history_text
+
+    def _resolve_locally(self, user_query: str, history: List[Dict[str, str]], last_intent: Optional[dict] = None):
+        """用本地规则补全追问（last_intent 为上一轮解析出的意图，用于确定话题）；规则无法确定（或未开启）时返回 None。"""
+        if not history or self.coreference is None:
+            return None
+        try:
+            resolved = self.coreference.resolve(user_query, history, last_intent)
+        except Exception as e:
+            logger.error(f"Local coreference failed: {e}")
+            return None
+        if resolved is not None:
+            logger.info(f"🔄 Local Rewrite: '{user_query}' -> '{resolved}'")
+        return resolved
 
     # === 新增函数：独立的问题重写模块 ===
-    def _rewrite_query(self, user_query: str, history: List[Dict[str, str]]) -> str:
+    def _llm_rewrite(self, user_query: str, history: List[Dict[str, str]]) -> str:
         """
-        利用历史记录，将用户的后续问题重写为独立完整的句子。
+        调用大模型，利用历史记录将用户的后续问题重写为独立完整的句子（不经本地指代消解）；调用失败时返回原问题。
         例如：Context="北京有哪些养老院?", Query="价格多少?" -> Rewrite="北京的养老院价格是多少?"
         """
         if not history:
             return user_query
 
         # 取最近的 2-3 轮对话作为上下文，节省 token 且避免干扰
-        recent_history = history[-4:] 
-        
-        history_text = ""
-        for msg in recent_history:
-            role = "用户" if msg['role'] == "user" else "AI助手"
-            history_text += f"{role}: {msg['content']}\n"
+        history_text = self._format_history(history)
 
         prompt = f"""
         你是一个对话重写助手。你的任务是根据【对话历史】将【用户最新问题】重写为一个语义完整、指代清晰的独立问题。
@@ -45,27 +104,164 @@ class RAGEngine:
         
         # 调用 LLM 进行重写
         try:
-            rewritten_query = self.llm.generate(prompt, temperature=0.1) # 低温保证稳定
+            rewritten_query = self.llm.generate(prompt, temperature=0.1, use_cache=True, caller="rewrite") # 低温保证稳定
             logger.info(f"🔄 Query Rewrite: '{user_query}' -> '{rewritten_query}'")
             return rewritten_query
         except Exception as e:
             logger.error(f"Query rewrite failed: {e}")
             return user_query
 
+    def _rewrite_and_parse(self, user_query: str, history: List[Dict[str, str]]):
+        """
+        融合模式：一次结构化输出调用同时返回重写后的独立问题和意图 JSON，
+        把多轮追问的关键路径从 3 次 LLM 调用缩短为 2 次。
+        Returns:
+            (重写后的问题, 意图 dict)；融合调用失败时返回 None，由调用方退回分步模式。
+        """
+        system_prompt = f"""
+        你是一个对话理解助手。请根据【对话历史】完成两件事，并把结果合并为一个严格的 JSON 对象返回。
+
+        任务一：将【用户最新问题】重写为一个语义完整、指代清晰的独立问题，放在 rewritten_query 字段（字符串, 必选）。
+        1. 补全省略的主语（如“它”、“第一家”指代的是什么）。
+        2. 如果问题本身已经很清晰，不需要上下文，则原样返回。
+
+        任务二：对重写后的问题做意图识别，字段与 rewritten_query 放在同一层级。
+{INTENT_FIELDS_PROMPT}        注意：
+        - 如果没有提取到某个字段，请不要包含在 JSON 中，或者设为 null。
+        - 仅返回 JSON 字符串，不要包含 Markdown 格式（如 ```json ... ```）。
+        """
+
+        user_prompt = f"""
+        【对话历史】
+        {self._format_history(history)}
+
+        【用户最新问题】
+        {user_query}
+        """
+
+        try:
+            response_text = self.llm.generate(
+                prompt=user_prompt, system_prompt=system_prompt,
+                temperature=0.1, use_cache=True, caller="rewrite_parse",
+            )
+            parsed = parse_intent_json(response_text)
+        except Exception as e:
+            logger.error(f"Fused rewrite+parse failed, falling back to separate calls: {e}")
+            return None
+
+        rewritten_query = (parsed.pop("rewritten_query", None) or "").strip() or user_query
+        parsed["parse_path"] = "fused"
+        logger.info(f"🔄 Fused Rewrite: '{user_query}' -> '{rewritten_query}'")
+        return rewritten_query, parsed
+
+    def _speculate(self, user_query: str, parsed_future: Future) -> str:
+        """推测任务：解析原始问题（结果先写入 parsed_future 供比对），再执行检索。"""
+        with span("speculate"):
+            try:
+                parsed = self.parser.parse(user_query)
+                parsed['raw_query'] = user_query
+            except Exception as e:
+                parsed_future.set_exception(e)
+                raise
+            parsed_future.set_result(parsed)
+            return self.retriever.retrieve(parsed)
+
+    def _start_speculation(self, user_query: str):
+        """提交推测任务，返回 (解析结果 future, 检索结果 future)。"""
+        parsed_future: Future = Future()
+        # 复制 contextvars，推测调用的 LLM 用量同样记入本次请求
+        ctx = contextvars.copy_context()
+        context_future = self._speculation_pool.submit(ctx.run, self._speculate, user_query, parsed_future)
+        return parsed_future, context_future
+
+    @staticmethod
+    def _take_speculation(speculation, parsed_intent: dict):
+        """
+        重写后的意图与推测意图检索条件一致时返回推测的检索结果，否则丢弃并返回 None。
+        """
+        parsed_future, context_future = speculation
+        try:
+            speculative_intent = parsed_future.result()
+        except Exception as e:
+            logger.warning(f"Speculative parse failed: {e}")
+            return None
+        if retrieval_signature(speculative_intent) != retrieval_signature(parsed_intent):
+            context_future.cancel()
+            logger.info("🎲 推测检索未命中：重写后的意图与原始问题不同，重新检索")
+            return None
+        try:
+            context = context_future.result()
+        except Exception as e:
+            logger.warning(f"Speculative retrieval failed: {e}")
+            return None
+        logger.info("🎲 推测检索命中，复用原始问题的检索结果")
+        return context
+
+    def chat(self, user_query: str, history: List[Dict[str, str]] = [], degraded: bool = False,
+             last_intent: Optional[dict] = None, last_context: Optional[str] = None) -> dict:
+        """
+        问答主入口。返回结果中的 llm_usage 为本次请求每个 LLM 调用的
+        token、耗时与费用明细（rewrite / parse / answer）；timings 为各阶段、
+        每条 Cypher 与每次 LLM 调用的耗时 span 树。
+        degraded=True（服务过载时由准入控制设置）时不调用大模型：
+        跳过问题重写、只用规则解析意图，回答取预计算结果或直接返回检索结果。
+        last_intent 为上一轮返回的 intent（服务端会话保存），本地指代消解据此确定上一轮的话题。
+        last_context 为上一轮返回的 context（服务端会话保存）：回溯型追问（「上面的」）直接沿用，不再重新检索。
+        """
+        with trace("rag.chat", degraded=degraded) as root, track_llm_usage() as llm_records:
+            result = self._chat(
+                user_query, history, degraded=degraded, last_intent=last_intent, last_context=last_context
+            )
+        result["llm_usage"] = summarize_records(llm_records)
+        result["timings"] = root.to_dict()
+        return result
+
     # === 修改 chat 函数，接收 history 参数 ===
-    def chat(self, user_query: str, history: List[Dict[str, str]] = []) -> dict:
+    def _chat(self, user_query: str, history: List[Dict[str, str]], use_answer_store: bool = True,
+              degraded: bool = False, last_intent: Optional[dict] = None,
+              last_context: Optional[str] = None) -> dict:
         
         # 1. 【核心升级】多轮对话意图补全
-        # 如果有历史记录，先尝试重写问题
-        current_query = self._rewrite_query(user_query, history)
+        # 本地规则能补全时直接使用；否则融合模式下一次调用同时完成重写与意图解析
+        with span("rewrite") as s:
+            resolved = self._resolve_locally(user_query, history, last_intent)
+            # 需要调用 LLM 重写时，同时用原始问题推测性地解析并检索
+            speculation = None
+            if resolved is None and history and self._speculation_pool is not None and not degraded:
+                speculation = self._start_speculation(user_query)
+            fused = None
+            if resolved is None and history and self.fused_rewrite_parse and not degraded:
+                fused = self._rewrite_and_parse(user_query, history)
+            if resolved is not None:
+                current_query, parsed_intent = resolved, None
+                rewrite_path = "local"
+            elif degraded:
+                # 降级模式不调用大模型重写，直接使用原始问题
+                current_query, parsed_intent = user_query, None
+                rewrite_path = "skipped" if history else "none"
+            elif fused is not None:
+                current_query, parsed_intent = fused
+                rewrite_path = "fused"
+            else:
+                # 如果有历史记录，调用大模型重写问题（本地指代消解已在上面尝试过）
+                current_query = self._llm_rewrite(user_query, history)
+                parsed_intent = None
+                rewrite_path = "llm" if history else "none"
+            if s is not None:
+                s.set(path=rewrite_path)
         
         # logger.info(f"Processing query (Original): {user_query}")
         logger.info(f"Processing query (Rewritten): {current_query}")
         
         # 2. 意图识别（使用重写后的问题）
         try:
-            # 注意：这里传给 parser 的是 current_query (补全后的)
-            parsed_intent = self.parser.parse(current_query)
+            if parsed_intent is None:
+                # 注意：这里传给 parser 的是 current_query (补全后的)
+                with span("parse"):
+                    if degraded:
+                        parsed_intent = self.parser.parse_rules_only(current_query)
+                    else:
+                        parsed_intent = self.parser.parse(current_query)
             # ===【新增】把问题文本也塞进去，方便检索器做关键词匹配 ===
             parsed_intent['raw_query'] = current_query
             logger.info(f"Parsed intent: {parsed_intent}")
@@ -73,15 +269,45 @@ class RAGEngine:
             logger.error(f"Intent parsing failed: {e}")
             parsed_intent = {}
 
+        # 2.5 预计算回答：标准问题命中时直接返回（回溯型追问需要看历史，不走预计算）
+        recall = bool(history) and any(k in user_query for k in RECALL_KEYWORDS)
+        if use_answer_store and self.answer_store is not None and not recall:
+            with span("answer_store"):
+                entry = self.answer_store.get(parsed_intent, self.retriever.graph_version())
+            if entry is not None:
+                logger.info(f"⚡ 命中预计算回答: {entry.get('question')}")
+                return {
+                    "answer": entry["answer"],
+                    "context": entry["context"],
+                    "intent": parsed_intent,
+                    "rewritten_query": current_query,
+                    "parse_path": parsed_intent.get("parse_path"),
+                    "answer_source": "precomputed"
+                }
+
         # 3. 图谱检索（使用重写后的问题）
-        try:
-            context = self.retriever.retrieve(parsed_intent)
-        except Exception as e:
-            context = "检索失败"
+        with span("retrieve", intent=parsed_intent.get("intent")) as s:
+            if recall and last_context:
+                # 回溯型追问只在上轮结果里选：沿用上一轮的检索结果，不再重新检索
+                if speculation is not None:
+                    speculation[1].cancel()
+                context = last_context
+                if s is not None:
+                    s.set(reused_last_context=True)
+            else:
+                context = self._take_speculation(speculation, parsed_intent) if speculation is not None else None
+                if s is not None and speculation is not None:
+                    s.set(speculative_hit=context is not None)
+                try:
+                    if context is None:
+                        context = self.retriever.retrieve(parsed_intent)
+                except Exception as e:
+                    context = "检索失败"
 
         # 4. 生成回答
         # 提取上一轮 AI 的回答，作为补充上下文
         history_content = "无"
+        answer_context = context
         if history:
             # 找到 AI 最近的一次回答
             last_ai_reply = next((msg['content'] for msg in reversed(history) if msg['role'] == 'assistant'), "无")
@@ -89,12 +315,41 @@ class RAGEngine:
 
             # 检测是否为“回溯型”问题
             # 如果用户用了“上面的”、“这些”、“刚才”等词，说明他只想在历史里选
-            keywords = ["上面的", "上述", "刚才", "这几个", "其中", "推荐的"]
-            if any(k in user_query for k in keywords):
+            if recall:
                 logger.info("🔒 检测到指代性追问，强制屏蔽新检索结果，仅依赖历史记录。")
-                # 关键操作：把 context 替换掉！让 AI 没得选，只能看 history
-                context = "（本轮检索结果已屏蔽，请严格基于 [用户上轮对话历史] 回答）"
+                if last_context:
+                    # 上轮的检索结果是历史推荐的依据，附上供核对投保年龄等信息
+                    answer_context = f"{RECALL_NOTICE_WITH_CONTEXT}\n{context}"
+                else:
+                    # 关键操作：把 context 替换掉！让 AI 没得选，只能看 history
+                    context = answer_context = RECALL_NOTICE
 
+        if degraded:
+            answer, answer_source = self._retrieval_only_answer(context)
+        else:
+            answer, answer_source = self._generate_answer(current_query, answer_context, history_content)
+        return {
+            "answer": answer,
+            "context": context,
+            "intent": parsed_intent,
+            "rewritten_query": current_query, # 可以返回给前端看看效果
+            "parse_path": parsed_intent.get("parse_path"), # rule / llm / rule_fallback
+            "answer_source": answer_source # generated / precomputed / retrieval_only / fallback
+        }
+
+    @staticmethod
+    def _retrieval_only_answer(context: str):
+        """不经大模型，直接把检索结果作为回答（降级模式、或请求截止时间已到）。"""
+        if not context.strip() or context.startswith(_NO_RESULT_PREFIXES):
+            return BUSY_ANSWER, "fallback"
+        return RETRIEVAL_ONLY_PREFIX + context, "retrieval_only"
+
+    def _generate_answer(self, current_query: str, context: str, history_content: str = "无"):
+        """
+        根据检索上下文生成最终回答。
+        Returns:
+            (回答, 来源)：来源为 generated，大模型失败时为 fallback（回答为兜底提示语）。
+        """
         # System Prompt 保持不变...
         system_prompt = """
        你是一名资深的保险与医养专家，服务于泰康保险集团。你的职责是利用提供的专业知识库（Context）来回答客户关于保险产品、疾病医疗和养老机构的问题。
@@ -149,18 +404,128 @@ class RAGEngine:
 
         # 生成回答
         try:
-            answer = self.llm.generate(prompt=user_prompt, system_prompt=system_prompt, temperature=0.1) # 温度调低，让它更听话
+            with span("generate"):
+                answer = self.llm.generate(prompt=user_prompt, system_prompt=system_prompt, temperature=0.1, use_cache=self.cache_answers, caller="answer") # 温度调低，让它更听话
+            answer_source = "generated"
+        except LLMCallError as e:
+            if isinstance(e.__cause__, DeadlineExceeded):
+                # 请求即将超时：与其返回错误，不如直接给出检索结果
+                logger.warning(f"Generate skipped (deadline exceeded): {e}")
+                return self._retrieval_only_answer(context)
+            logger.error(f"Generate failed (LLM unavailable): {e}")
+            answer = LLM_UNAVAILABLE_ANSWER
+            answer_source = "fallback"
         except Exception as e:
             logger.error(f"Generate failed: {e}")
-            answer = "抱歉，生成回答时出现错误。"
-        return {
-            "answer": answer,
-            "context": context,
-            "intent": parsed_intent,
-            "rewritten_query": current_query # 可以返回给前端看看效果
-        }
+            answer = GENERATE_FAILED_ANSWER
+            answer_source = "fallback"
+        return answer, answer_source
+
+    def _parse_standalone(self, question: str) -> dict:
+        try:
+            parsed = self.parser.parse(question)
+        except Exception as e:
+            logger.error(f"Intent parsing failed: {e}")
+            parsed = {}
+        parsed['raw_query'] = question
+        return parsed
+
+    def chat_batch(self, questions: List[str], max_workers: Optional[int] = None) -> Iterator[dict]:
+        """
+        批量问答（单轮，无历史），用于回归测试、批量生成 FAQ 等离线任务。
+        1. 并发解析全部问题的意图；
+        2. 预计算回答库命中的问题直接产出；
+        3. 按检索签名去重后用 retrieve_batch 分组检索（每类查询一条 UNWIND 语句）；
+        4. 问题文本与意图都相同的只生成一次，生成调用并发数不超过 max_workers。
+        按完成顺序逐条产出 {"index", "question", "answer", "context", "intent", "answer_source"}，
+        最后产出一条 {"done": True, ...} 汇总。
+        """
+        start = time.monotonic()
+        workers = max_workers or self.batch_concurrency
+        stats = {"questions": len(questions), "precomputed": 0, "unique_intents": 0, "generations": 0}
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch")
+        pending = set()
+        try:
+            # 1. 意图解析
+            parsed_list = list(pool.map(self._parse_standalone, questions))
+
+            # 2. 预计算回答
+            remaining = []
+            graph_version = self.retriever.graph_version() if self.answer_store is not None else None
+            for index, (question, parsed) in enumerate(zip(questions, parsed_list)):
+                entry = self.answer_store.get(parsed, graph_version) if self.answer_store is not None else None
+                if entry is not None:
+                    stats["precomputed"] += 1
+                    yield {"index": index, "question": question, "answer": entry["answer"], "context": entry["context"],
+                           "intent": parsed, "answer_source": "precomputed"}
+                else:
+                    remaining.append(index)
+
+            # 3. 按检索签名去重后分组检索
+            unique: Dict[str, dict] = {}
+            for index in remaining:
+                unique.setdefault(retrieval_signature(parsed_list[index]), parsed_list[index])
+            stats["unique_intents"] = len(unique)
+            signatures = list(unique)
+            contexts: Dict[str, str] = {}
+            for i in range(0, len(signatures), self.batch_retrieve_size):
+                chunk = signatures[i:i + self.batch_retrieve_size]
+                try:
+                    results = self.retriever.retrieve_batch([unique[s] for s in chunk])
+                except Exception as e:
+                    logger.error(f"Batch retrieval failed: {e}")
+                    results = ["检索失败"] * len(chunk)
+                contexts.update(zip(chunk, results))
+
+            # 4. 生成回答：相同问题 + 相同意图只生成一次
+            groups: Dict[tuple, List[int]] = {}
+            for index in remaining:
+                signature = retrieval_signature(parsed_list[index])
+                groups.setdefault((questions[index].strip(), signature), []).append(index)
+            stats["generations"] = len(groups)
+            future_indexes = {}
+            for (question, signature), indexes in groups.items():
+                future = pool.submit(self._generate_answer, question, contexts[signature])
+                future_indexes[future] = indexes
+            pending = set(future_indexes)
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    answer, answer_source = future.result()
+                    for index in future_indexes[future]:
+                        parsed = parsed_list[index]
+                        yield {"index": index, "question": questions[index], "answer": answer,
+                               "context": contexts[retrieval_signature(parsed)], "intent": parsed,
+                               "answer_source": answer_source}
+        finally:
+            # 调用方提前停止迭代（如客户端断开）时，取消尚未开始的生成任务
+            for future in pending:
+                future.cancel()
+            pool.shutdown(wait=False)
+        stats["elapsed_ms"] = round((time.monotonic() - start) * 1000, 1)
+        yield {"done": True, **stats}
+
+    def precompute(self, question: str) -> dict:
+        """
+        预热任务调用：完整跑一遍检索与生成（不查预计算库），成功时按当前图谱版本写入预计算库。
+        Returns:
+            chat 结果，附加 stored 字段表示是否已写入。
+        """
+        with track_llm_usage() as llm_records:
+            result = self._chat(question, [], use_answer_store=False)
+        result["llm_usage"] = summarize_records(llm_records)
+        result["stored"] = False
+        if self.answer_store is not None and result["answer_source"] == "generated" and result["context"] != "检索失败":
+            result["stored"] = self.answer_store.put(
+                question, result["intent"], self.retriever.graph_version(), result["answer"], result["context"]
+            )
+        return result
 
     def close(self):
+        if self._speculation_pool is not None:
+            self._speculation_pool.shutdown(wait=False)
+        if self.answer_store is not None:
+            self.answer_store.close()
         self.retriever.close()
 
 if __name__ == "__main__":
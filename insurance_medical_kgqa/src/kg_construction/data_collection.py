@@ -1,28 +1,95 @@
 # 数据收集：原始数据加载与路径配置
+# 未命中缓存的数据源在进程池中并行解析；解析结果保存为本地 pickle 快照（按文件 mtime + 大小失效），重复运行导入 / 导出 / 压测时跳过 JSON 解析
+import csv
+import hashlib
+import json
+import os
+import pickle
+import threading
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Iterable, Optional
+
+from src.utils.config_loader import config as app_config, get_project_root
+from src.utils.logger import logger
+
+# 快照格式版本：修改解析方式（如 CSV 编码处理）或快照结构后递增，旧快照随之失效
+SNAPSHOT_VERSION = 2
+
+
+def find_case_insensitive(path: Path) -> Optional[Path]:
+    """逐级按不区分大小写的方式查找路径（Windows 上写的 "Datacleaned" 在 Linux 上也能找到 "DataCleaned"）。"""
+    parts = path.parts
+    current = Path(parts[0]) if path.is_absolute() else Path(".")
+    for part in parts[1:] if path.is_absolute() else parts:
+        candidate = current / part
+        if not candidate.exists():
+            try:
+                candidate = next(c for c in current.iterdir() if c.name.lower() == part.lower())
+            except (OSError, StopIteration):
+                return None
+        current = candidate
+    return current
+
+
+def parse_file(path: Path) -> Any:
+    """按扩展名解析：.json → dict / list；.csv → 行 dict 列表（utf-8-sig，去掉 BOM，否则首列名会带上 \\ufeff）。"""
+    suffix = path.suffix.lower()
+    if suffix == ".json":
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    if suffix == ".csv":
+        with open(path, "r", encoding="utf-8-sig", newline="") as f:
+            return list(csv.DictReader(f))
+    raise ValueError(f"不支持的数据文件类型: {path}")
+
+
+def _parse_to_bytes(path: Path) -> bytes:
+    """在子进程中解析文件，结果以 pickle 字节返回（JSON 解析是 CPU 密集型，线程受 GIL 限制无法并行）。"""
+    return pickle.dumps(parse_file(path), protocol=pickle.HIGHEST_PROTOCOL)
 
 
 class DataCollector:
     """数据收集类：按配置加载医疗、保险等原始数据。"""
 
-    def __init__(self, config: Optional[Dict[str, Any]] = None):
+    def __init__(
+        self,
+        config: Optional[Dict[str, Any]] = None,
+        snapshot_dir: Optional[str] = None,
+        max_workers: int = 4,
+    ):
         """
         Args:
             config: 数据源配置，含 medical / insurance 等 key，值为文件路径列表。
+            snapshot_dir: 解析结果快照目录（相对路径基于项目根目录），为空则不使用快照。
+            max_workers: 并行解析的进程数（只有一个文件需要解析时不启动进程池）。
         """
         self.config = config or {}
-        self._base_path: Optional[Path] = None
+        self._base_path: Optional[Path] = get_project_root()
+        self.max_workers = max(int(max_workers), 1)
+        self.snapshot_dir: Optional[Path] = None
+        if snapshot_dir:
+            p = Path(snapshot_dir)
+            self.snapshot_dir = p if p.is_absolute() else get_project_root() / p
+        # 进程内缓存：{路径: (mtime_ns, size, pickle 字节)}，同一进程内重复加载时反序列化出新副本返回，
+        # 调用方修改返回的数据不会影响缓存和其他调用方
+        self._memory: Dict[Path, tuple] = {}
+        self._lock = threading.Lock()
 
     def set_base_path(self, base_path: str) -> None:
         """设置项目根路径，后续路径均相对此路径解析。"""
         self._base_path = Path(base_path)
 
     def _resolve_path(self, path_str: str) -> Path:
-        """将配置中的相对路径解析为绝对路径。"""
+        """将配置中的相对路径解析为绝对路径；大小写不一致时按不区分大小写的方式查找实际路径。"""
         p = Path(path_str)
         if not p.is_absolute() and self._base_path is not None:
             p = self._base_path / p
+        if not p.exists():
+            actual = find_case_insensitive(p)
+            if actual is not None:
+                logger.warning(f"数据路径大小写与实际不一致: {path_str} → {actual}")
+                return actual
         return p
 
     def get_medical_sources(self) -> List[str]:
@@ -33,13 +100,134 @@ class DataCollector:
         """返回保险数据源路径列表。"""
         return self.config.get("insurance", [])
 
+    def _snapshot_path(self, path: Path) -> Path:
+        digest = hashlib.sha1(str(path.resolve()).encode("utf-8")).hexdigest()[:16]
+        return self.snapshot_dir / f"{path.stem}-{digest}.pkl"
+
+    def load_file(self, path_str: str) -> Any:
+        """
+        加载单个数据文件：文件 mtime 与大小未变时依次命中进程内缓存、pickle 快照，否则重新解析并写快照。
+        每次调用返回独立的副本。
+        快照只保存在本地缓存目录，由本进程写入，不要从其他来源复制快照文件（pickle 不可信时不安全）。
+        """
+        path, signature, blob = self._lookup(str(path_str))
+        if blob is not None:
+            return pickle.loads(blob)
+        data = parse_file(path)
+        self._store(path, signature, pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL))
+        return data
+
+    def _lookup(self, path_str: str) -> tuple:
+        """返回 (路径, 文件签名, 缓存的 pickle 字节)；进程内缓存与快照都未命中时字节为 None。"""
+        path = self._resolve_path(path_str)
+        stat = path.stat()
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._memory.get(path)
+        if cached is not None and cached[:2] == signature:
+            return path, signature, cached[2]
+        blob = self._read_snapshot(path, signature)
+        if blob is not None:
+            with self._lock:
+                self._memory[path] = (*signature, blob)
+        return path, signature, blob
+
+    def _store(self, path: Path, signature: tuple, blob: bytes) -> None:
+        self._write_snapshot(path, signature, blob)
+        with self._lock:
+            self._memory[path] = (*signature, blob)
+
+    def _read_snapshot(self, path: Path, signature: tuple) -> Optional[bytes]:
+        if self.snapshot_dir is None:
+            return None
+        snapshot = self._snapshot_path(path)
+        try:
+            with open(snapshot, "rb") as f:
+                payload = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"数据快照读取失败，重新解析 {path.name}: {e}")
+            return None
+        if payload.get("version") != SNAPSHOT_VERSION or tuple(payload.get("signature", ())) != signature:
+            return None
+        logger.debug(f"命中数据快照: {path.name}")
+        return payload["data"]
+
+    def _write_snapshot(self, path: Path, signature: tuple, blob: bytes) -> None:
+        if self.snapshot_dir is None:
+            return
+        snapshot = self._snapshot_path(path)
+        tmp = snapshot.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            snapshot.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, "wb") as f:
+                pickle.dump(
+                    {"version": SNAPSHOT_VERSION, "signature": signature, "data": blob},
+                    f,
+                    protocol=pickle.HIGHEST_PROTOCOL,
+                )
+            os.replace(tmp, snapshot)  # 原子替换，并发运行的导入脚本不会读到写了一半的快照
+        except Exception as e:
+            logger.warning(f"数据快照写入失败 {path.name}: {e}")
+            tmp.unlink(missing_ok=True)
+
+    def load_files(self, paths: Iterable[str]) -> Dict[str, Any]:
+        """
+        加载多个文件，返回 {配置中的路径: 数据}；缺失或解析失败的文件记录错误后跳过。
+        命中缓存的文件直接反序列化，其余文件在进程池中并行解析。
+        """
+        paths = list(dict.fromkeys(str(p) for p in paths))
+        blobs: Dict[str, bytes] = {}
+        misses = []
+        for path_str in paths:
+            try:
+                path, signature, blob = self._lookup(path_str)
+            except Exception as e:
+                logger.error(f"数据文件加载失败 {path_str}: {e}")
+                continue
+            if blob is None:
+                misses.append((path_str, path, signature))
+            else:
+                blobs[path_str] = blob
+        blobs.update(self._parse_misses(misses))
+        return {p: pickle.loads(blobs[p]) for p in paths if p in blobs}
+
+    def _parse_misses(self, misses: List[tuple]) -> Dict[str, bytes]:
+        """解析未命中缓存的文件并写入缓存，返回 {配置中的路径: pickle 字节}。"""
+        results: Dict[str, bytes] = {}
+        workers = min(self.max_workers, len(misses))
+        futures = {}
+        if workers > 1:
+            try:
+                pool = ProcessPoolExecutor(max_workers=workers)
+            except (OSError, NotImplementedError) as e:
+                logger.warning(f"无法创建解析进程池，改为逐个解析: {e}")
+                workers = 1
+            else:
+                with pool:
+                    futures = {path_str: pool.submit(_parse_to_bytes, path) for path_str, path, _ in misses}
+        for path_str, path, signature in misses:
+            try:
+                blob = futures[path_str].result() if workers > 1 else _parse_to_bytes(path)
+            except Exception as e:
+                logger.error(f"数据文件加载失败 {path_str}: {e}")
+                continue
+            self._store(path, signature, blob)
+            results[path_str] = blob
+        return results
+
+    def _load_category(self, sources: List[str]) -> Dict[str, Any]:
+        # 数据源标识取文件名（不含扩展名），如 diseases / medicine
+        return {Path(p).stem: data for p, data in self.load_files(sources).items()}
+
     def load_medical(self) -> Dict[str, Any]:
         """
         加载所有医疗相关原始数据。
         Returns:
             键为数据源标识，值为 DataFrame 或 dict/list（如 JSON）。
         """
-        raise NotImplementedError
+        return self._load_category(self.get_medical_sources())
 
     def load_insurance(self) -> Dict[str, Any]:
         """
@@ -47,12 +235,26 @@ class DataCollector:
         Returns:
             键为数据源标识，值为 DataFrame 或 dict/list。
         """
-        raise NotImplementedError
+        return self._load_category(self.get_insurance_sources())
 
     def load_all(self) -> Dict[str, Dict[str, Any]]:
         """
-        加载全部配置的数据源。
+        加载全部配置的数据源（所有类别的文件一起加载，未命中缓存的并行解析）。
         Returns:
-            {"medical": {...}, "insurance": {...}}
+            {"medical": {...}, "insurance": {...}, ...}，与配置中的类别一致
         """
-        raise NotImplementedError
+        loaded = self.load_files(p for sources in self.config.values() for p in sources or [])
+        return {
+            category: {Path(p).stem: loaded[str(p)] for p in sources or [] if str(p) in loaded}
+            for category, sources in self.config.items()
+        }
+
+
+def create_data_collector() -> DataCollector:
+    """按 config.yaml 中的 data_sources 与 kg_construction.data_collection 创建 DataCollector。"""
+    conf = (app_config.get("kg_construction", {}) or {}).get("data_collection", {}) or {}
+    return DataCollector(
+        config=app_config.get("data_sources", {}) or {},
+        snapshot_dir=conf.get("snapshot_dir", "data/cache/snapshots"),
+        max_workers=conf.get("max_workers", 4),
+    )
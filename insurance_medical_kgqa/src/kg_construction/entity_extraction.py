@@ -1,22 +1,172 @@
-# 实体抽取：基于 HanLP/BERT-NER 的实体与关系抽取
-from typing import List, Dict, Any, Tuple, Optional
+# 实体抽取：基于图谱实体词典（Aho-Corasick 自动机）的实体识别与同句共现三元组，
+# 可在调用大模型之前对文本做预标注；条款中的复杂关系仍由 text_graph_builder 调用大模型抽取
+import re
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Dict, Any, Callable, Iterable, Iterator, Tuple, Optional
+
+from src.kg_construction.data_collection import create_data_collector
+from src.utils.aho_corasick import AhoCorasick
+from src.utils.config_loader import get_project_root
+from src.utils.logger import logger
 
 
 # 三元组：(头实体, 关系, 尾实体) 或 (头实体名, 关系类型, 尾实体名)
 Triple = Tuple[str, str, str]
+# 带类型的三元组：(头类型, 关系, 尾类型, 头实体名, 尾实体名)，前三项可直接作为写入图谱时的分组键
+TypedTriple = Tuple[str, str, str, str, str]
+# 记录 schema：字段 → [(头类型, 关系, 尾类型), ...]；头实体名取自 head_field 字段，
+# 字段值为列表时每个元素生成一个三元组（如疾病数据的 symptom / drug）
+RecordSchema = Dict[str, List[Tuple[str, str, str]]]
+
+# 词典覆盖的节点标签；同一个名称属于多个标签时取靠前的
+DEFAULT_ENTITY_LABELS = ("Disease", "Drug", "Symptom", "Department", "NursingHome", "Insurance")
+
+# 同一句中共现的 (头标签, 尾标签) → 关系类型（与 Neo4jLoader 写入的关系一致），用作候选三元组
+CO_OCCURRENCE_RELATIONS: Dict[Tuple[str, str], str] = {
+    ("Disease", "Symptom"): "HAS_SYMPTOM",
+    ("Disease", "Drug"): "TREATED_BY",
+    ("Disease", "Department"): "BELONGS_TO_DEPT",
+    ("Insurance", "Disease"): "COVERS_DISEASE",
+}
+
+_SENTENCE_SPLIT = re.compile(r"[。！？；;!?\n]")
+
+
+def load_entity_names(data_dir: Optional[Path] = None) -> Dict[str, List[str]]:
+    """从 DataCleaned 下的数据文件收集各标签的实体名（与 Neo4jLoader 导入的节点一致），文件经 DataCollector 加载（命中解析快照）。"""
+    root = Path(data_dir) if data_dir else get_project_root() / "DataCleaned"
+    collector = create_data_collector()
+    names: Dict[str, List[str]] = {label: [] for label in DEFAULT_ENTITY_LABELS}
+    try:
+        for item in collector.load_file(root / "Diseases" / "diseases.json"):
+            names["Disease"].append(item.get("name"))
+            names["Disease"].extend(item.get("neopathy") or [])
+            names["Symptom"].extend(item.get("symptom") or [])
+            names["Drug"].extend(item.get("drug") or [])
+            names["Department"].append((item.get("cure_dept") or "").strip())
+    except (OSError, ValueError) as e:
+        logger.warning(f"实体词典：疾病数据加载失败: {e}")
+    try:
+        for content in collector.load_file(root / "Drugs" / "medicine.json").values():
+            names["Drug"].extend(m.get("name") for m in content.get("medicines", []))
+    except (OSError, ValueError) as e:
+        logger.warning(f"实体词典：药品数据加载失败: {e}")
+    try:
+        names["Insurance"].extend(item.get("产品名称") for item in collector.load_file(root / "Insurance" / "insurance_info.json"))
+    except (OSError, ValueError) as e:
+        logger.warning(f"实体词典：保险数据加载失败: {e}")
+    try:
+        names["NursingHome"].extend(row.get("名称") for row in collector.load_file(root / "NursingHomes" / "nursing_homes.csv"))
+    except OSError as e:
+        logger.warning(f"实体词典：养老院数据加载失败: {e}")
+    return names
+
+
+def compile_record_schema(
+    schema: RecordSchema, head_field: str = "name", typed: bool = False
+) -> Callable[[Iterable[Dict[str, Any]]], Iterator[Any]]:
+    """
+    把记录 schema 编译成专用的生成器函数：字段名、关系类型等常量直接写进生成的代码，
+    逐条记录只做取值和判空，不再遍历 schema。
+    生成的函数接收记录的可迭代对象（可以是惰性的），逐个产出三元组；typed 为 True 时产出 TypedTriple。
+    头实体名或尾实体值为空的跳过，字符串两端空白去除。
+    """
+    lines = [
+        "def _extract(records):",
+        "    for record in records:",
+        f"        head = record.get({head_field!r})",
+        "        if head is None: continue",
+        "        head = str(head).strip()",
+        "        if not head: continue",
+    ]
+    emitted = False
+    for field, specs in schema.items():
+        if not specs:
+            continue
+        emitted = True
+        lines += [
+            f"        value = record.get({field!r})",
+            "        if value:",
+            "            for tail in (value if isinstance(value, (list, tuple)) else (value,)):",
+            "                if tail is None: continue",
+            "                tail = str(tail).strip()",
+            "                if not tail: continue",
+        ]
+        for head_type, relation, tail_type in specs:
+            if typed:
+                lines.append(f"                yield ({head_type!r}, {relation!r}, {tail_type!r}, head, tail)")
+            else:
+                lines.append(f"                yield (head, {relation!r}, tail)")
+    if not emitted:
+        # 没有关系字段时仍需是生成器（逐条消费记录，什么也不产出）
+        lines.append("    yield from ()")
+    namespace: Dict[str, Any] = {}
+    exec(compile("\n".join(lines), f"<record_schema:{head_field}>", "exec"), namespace)
+    return namespace["_extract"]
+
+
+@lru_cache(maxsize=64)
+def _compiled_for(schema_key: Tuple, head_field: str, typed: bool):
+    return compile_record_schema({field: list(specs) for field, specs in schema_key}, head_field, typed)
+
+
+def get_compiled_schema(schema: RecordSchema, head_field: str = "name", typed: bool = False):
+    """同 compile_record_schema，相同的 schema 只编译一次。"""
+    key = tuple((field, tuple(tuple(spec) for spec in specs)) for field, specs in schema.items())
+    return _compiled_for(key, head_field, typed)
 
 
 class EntityExtractor:
-    """实体与关系抽取器：从文本/结构化数据中抽取实体和三元组。"""
+    """
+    实体与关系抽取器：实体名编译成 Aho-Corasick 自动机，一次扫描找出文本中的全部实体（同一位置取最长），
+    耗时与文本长度线性相关，与词典大小无关。
+    """
 
-    def __init__(self, model_name: Optional[str] = None, **kwargs: Any):
+    def __init__(
+        self,
+        model_name: Optional[str] = None,
+        entries: Optional[Dict[str, Iterable[str]]] = None,
+        min_length: int = 2,
+        **kwargs: Any,
+    ):
         """
         Args:
-            model_name: NER/RE 模型名称或路径（如 HanLP、BERT-NER）。
+            model_name: NER/RE 模型名称或路径（词典实现不使用，保留给基于模型的实现）。
+            entries: {标签: 实体名列表}；缺省时首次使用从 DataCleaned 数据文件加载，或用 from_neo4j() 从图谱加载。
+            min_length: 短于该长度的实体名不进词典（单字名误匹配太多）。
             **kwargs: 其他模型或 pipeline 参数。
         """
         self.model_name = model_name
-        self._model = None  # 懒加载
+        self.min_length = min_length
+        self._entries = entries
+        self._model: Optional[AhoCorasick] = None  # 懒加载
+
+    @classmethod
+    def from_neo4j(cls, driver, labels: Iterable[str] = DEFAULT_ENTITY_LABELS, **kwargs: Any) -> "EntityExtractor":
+        """从图谱加载各标签的节点名构建词典（标签会拼进 Cypher，只能来自代码中的常量）。"""
+        entries: Dict[str, List[str]] = {}
+        with driver.session() as session:
+            for label in labels:
+                result = session.run(f"MATCH (n:{label}) WHERE n.name IS NOT NULL RETURN n.name AS name")
+                entries[label] = [record["name"] for record in result]
+        return cls(entries=entries, **kwargs)
+
+    @property
+    def automaton(self) -> AhoCorasick:
+        if self._model is None:
+            entries = self._entries if self._entries is not None else load_entity_names()
+            automaton = AhoCorasick()
+            for label, names in entries.items():
+                for name in names:
+                    name = str(name or "").strip()
+                    # 数据里被截断的症状名（如 "发热伴咳嗽、咯..."）不进词典
+                    if len(name) >= self.min_length and not name.endswith("..."):
+                        automaton.add(name, label)
+            automaton.build()
+            logger.info(f"实体词典构建完成：{len(automaton)} 个实体名")
+            self._model = automaton
+        return self._model
 
     def extract_entities(self, text: str) -> List[Dict[str, Any]]:
         """
@@ -24,33 +174,54 @@ class EntityExtractor:
         Args:
             text: 输入文本。
         Returns:
-            实体列表，每项含 type, name, span 等字段。
+            实体列表，每项含 type, name, span（[start, end) 字符区间），按出现顺序，区间互不重叠。
         """
-        raise NotImplementedError
+        return [
+            {"type": label, "name": text[start:end], "span": (start, end)}
+            for start, end, label in self.automaton.find_longest(text or "", word_boundary=True)
+        ]
 
     def extract_entities_batch(self, texts: List[str]) -> List[List[Dict[str, Any]]]:
-        """批量抽取实体。"""
-        raise NotImplementedError
+        """批量抽取实体（共用同一个自动机，总耗时与文本总长度线性相关）。"""
+        automaton = self.automaton
+        return [
+            [
+                {"type": label, "name": text[start:end], "span": (start, end)}
+                for start, end, label in automaton.find_longest(text or "", word_boundary=True)
+            ]
+            for text in texts
+        ]
 
     def extract_triples_from_text(self, text: str) -> List[Triple]:
         """
         从文本中抽取关系三元组 (头实体, 关系, 尾实体)。
+        同一句中共现、且标签组合在 CO_OCCURRENCE_RELATIONS 中的实体对生成候选三元组（共现不等于关系成立，
+        写入图谱前应由大模型或人工确认）。
         Args:
             text: 输入文本。
         Returns:
-            三元组列表。
+            三元组列表（去重，按出现顺序）。
         """
-        raise NotImplementedError
+        triples: Dict[Triple, None] = {}
+        for sentence in _SENTENCE_SPLIT.split(text or ""):
+            entities = self.extract_entities(sentence)
+            for i, head in enumerate(entities):
+                for tail in entities[i + 1:]:
+                    for a, b in ((head, tail), (tail, head)):
+                        relation = CO_OCCURRENCE_RELATIONS.get((a["type"], b["type"]))
+                        if relation and a["name"] != b["name"]:
+                            triples[(a["name"], relation, b["name"])] = None
+        return list(triples)
 
     def extract_triples_from_records(
-        self, records: List[Dict[str, Any]], schema: Dict[str, List[Tuple[str, str, str]]]
-    ) -> List[Triple]:
+        self, records: Iterable[Dict[str, Any]], schema: RecordSchema, head_field: str = "name"
+    ) -> Iterator[Triple]:
         """
         从结构化记录（如 DataFrame 行）按 schema 生成三元组。
         Args:
-            records: 记录列表，每项为 dict。
-            schema: 字段到 (头类型, 关系, 尾类型) 的映射或规则。
+            records: 记录的可迭代对象，每项为 dict（可以是惰性的，不会整体读入内存）。
+            schema: 字段到 (头类型, 关系, 尾类型) 的映射，头实体名取自 head_field 字段。
         Returns:
-            三元组列表。
+            三元组的迭代器（惰性产出）。
         """
-        raise NotImplementedError
+        return get_compiled_schema(schema, head_field)(records)
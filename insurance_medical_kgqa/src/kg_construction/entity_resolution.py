@@ -0,0 +1,219 @@
+# 实体消歧：LLM 抽取出的实体名写入图谱前，对齐到图谱中已有的同标签节点，
+# 避免 "恶性肿瘤"、"癌症"、"恶性肿瘤（癌症）" 被 MERGE 成三个节点。
+# 依次尝试：归一化后精确匹配 → 别名表 → 括号别名 → 字符 bigram 相似度（倒排索引召回），都不命中则作为新实体加入索引
+import json
+import re
+import threading
+import unicodedata
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from src.utils.config_loader import config, get_project_root
+from src.utils.logger import logger
+
+# 归一化时去掉的标点（NFKC 之后全角标点已转为半角）
+_PUNCT = re.compile(r"[\s\"'“”‘’《》<>【】\[\]·•.,，。、;；:：!！?？_]+")
+# 结尾的括号内容："恶性肿瘤(癌症)" → ("恶性肿瘤", "癌症")
+_BRACKET = re.compile(r"^(.+?)\((.+)\)$")
+# 年龄范围的分隔符与单位写法统一："0至65周岁" / "0~65岁" → "0-65岁"
+_AGE_SEPARATOR = re.compile(r"[至到~—–－]")
+_DIGITS = re.compile(r"\d+")
+
+
+def normalize_name(name: str, label: Optional[str] = None) -> str:
+    """归一化实体名（只用于匹配，不改变写入的名称）：全角转半角、小写、去空白和标点。"""
+    text = unicodedata.normalize("NFKC", str(name or "")).lower()
+    if label == "AgeRange":
+        text = _AGE_SEPARATOR.sub("-", text).replace("周岁", "岁")
+    return _PUNCT.sub("", text)
+
+
+def _bigrams(text: str) -> Set[str]:
+    if len(text) < 2:
+        return {text} if text else set()
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class _LabelIndex:
+    """单个标签的索引：归一化名 → 规范名，以及 (bigram, bigram 数) → 归一化名集合的倒排表。"""
+
+    def __init__(self):
+        self.exact: Dict[str, str] = {}
+        self.aliases: Dict[str, str] = {}
+        # 按 bigram 数分桶：Dice 阈值限定了候选的 bigram 数范围，召回时只扫描范围内的桶
+        self.postings: Dict[Tuple[str, int], Set[str]] = defaultdict(set)
+        self.grams: Dict[str, Set[str]] = {}
+
+    def add(self, canonical: str, key: str) -> None:
+        if key in self.exact:
+            return
+        self.exact[key] = canonical
+        grams = _bigrams(key)
+        self.grams[key] = grams
+        for g in grams:
+            self.postings[(g, len(grams))].add(key)
+
+
+class EntityResolver:
+    """
+    把三元组中的实体名改写为规范名（图谱中已有节点的 name，或别名表中的规范名）。
+    线程安全：并发抽取的文档共用一个实例，未匹配的新实体加入索引后，后续文档中的同名变体会对齐到它。
+    """
+
+    def __init__(self, similarity_threshold: float = 0.85, aliases: Optional[Dict[str, Dict[str, List[str]]]] = None):
+        self.similarity_threshold = float(similarity_threshold)
+        self._indexes: Dict[str, _LabelIndex] = defaultdict(_LabelIndex)
+        self._memo: Dict[Tuple[str, str], str] = {}
+        self._lock = threading.Lock()
+        self._stats = defaultdict(int)
+        for label, table in (aliases or {}).items():
+            for canonical, names in (table or {}).items():
+                self.add_alias(label, canonical, names)
+
+    def add_names(self, label: str, names: Iterable[str]) -> int:
+        """把已有节点名加入索引，返回加入的数量。"""
+        count = 0
+        with self._lock:
+            index = self._indexes[label]
+            for name in names:
+                name = str(name or "").strip()
+                key = normalize_name(name, label)
+                if key and key not in index.exact:
+                    index.add(name, key)
+                    count += 1
+        return count
+
+    def add_alias(self, label: str, canonical: str, names: Iterable[str]) -> None:
+        with self._lock:
+            index = self._indexes[label]
+            index.add(canonical, normalize_name(canonical, label))
+            for name in names:
+                key = normalize_name(name, label)
+                if key:
+                    index.aliases[key] = canonical
+
+    def load_from_neo4j(self, driver, labels: Iterable[str]) -> int:
+        """从图谱加载各标签已有节点的 name（标签须来自白名单，会拼进 Cypher）。"""
+        total = 0
+        with driver.session() as session:
+            for label in labels:
+                result = session.run(f"MATCH (n:{label}) WHERE n.name IS NOT NULL RETURN n.name AS name")
+                total += self.add_names(label, (record["name"] for record in result))
+        logger.info(f"实体消歧索引加载完成：{total} 个已有实体")
+        return total
+
+    def _lookup(self, index: _LabelIndex, key: str) -> Optional[str]:
+        return index.exact.get(key) or index.aliases.get(key)
+
+    def _fuzzy(self, index: _LabelIndex, key: str) -> Optional[str]:
+        """bigram Dice 相似度最高且超过阈值的候选；数字不同（"1型" / "2型"、"0-60岁" / "0-65岁"）的不合并，并列最高时不合并。"""
+        grams = _bigrams(key)
+        if not grams:
+            return None
+        # Dice >= t 要求候选的 bigram 数在 [n·t/(2-t), n·(2-t)/t] 之内
+        n, t = len(grams), self.similarity_threshold
+        sizes = range(max(int(n * t / (2 - t)), 1), int(n * (2 - t) / t) + 1) if t > 0 else ()
+        overlap: Dict[str, int] = defaultdict(int)
+        for g in grams:
+            for size in sizes:
+                for candidate in index.postings.get((g, size), ()):
+                    overlap[candidate] += 1
+        digits = _DIGITS.findall(key)
+        best, best_score, tie = None, 0.0, False
+        for candidate, shared in overlap.items():
+            score = 2.0 * shared / (len(grams) + len(index.grams[candidate]))
+            if score < self.similarity_threshold or _DIGITS.findall(candidate) != digits:
+                continue
+            if score > best_score:
+                best, best_score, tie = candidate, score, False
+            elif score == best_score and index.exact[candidate] != index.exact[best]:
+                tie = True
+        return index.exact[best] if best is not None and not tie else None
+
+    def resolve(self, name: str, label: str) -> str:
+        """返回 name 在 label 下的规范名；没有匹配时原样返回，并作为新实体加入索引。"""
+        name = str(name or "").strip()
+        memo_key = (label, name)
+        with self._lock:
+            if memo_key in self._memo:
+                self._stats["memo"] += 1
+                return self._memo[memo_key]
+            index = self._indexes[label]
+            key = normalize_name(name, label)
+            canonical, how = None, "new"
+            if not key:
+                canonical, how = name, "empty"
+            if canonical is None:
+                canonical = self._lookup(index, key)
+                how = "exact" if key in index.exact else "alias"
+            if canonical is None:
+                canonical, how = self._resolve_bracket(index, key), "bracket"
+            if canonical is None:
+                canonical, how = self._fuzzy(index, key), "fuzzy"
+            if canonical is None:
+                canonical, how = name, "new"
+                index.add(name, key)
+            self._stats[how] += 1
+            self._memo[memo_key] = canonical
+        if canonical != name:
+            logger.debug(f"实体消歧 [{label}] {name} → {canonical} ({how})")
+        return canonical
+
+    def _resolve_bracket(self, index: _LabelIndex, key: str) -> Optional[str]:
+        """
+        "恶性肿瘤(癌症)"：括号内是已知实体 / 别名时才合并（与括号前部分指向同一实体，或括号前部分未知）；
+        "高血压(iii级)" 这类括号内是限定语的，不合并到 "高血压"。
+        """
+        match = _BRACKET.match(key)
+        if not match:
+            return None
+        base, inner = (self._lookup(index, part) for part in match.groups())
+        if inner is not None and (base is None or base == inner):
+            return inner
+        return None
+
+    def resolve_triples(self, triples: List[Dict]) -> Tuple[List[Dict], int]:
+        """改写三元组的 head / tail 为规范名，返回 (新三元组列表, 改写的实体数)。"""
+        resolved, rewritten = [], 0
+        for t in triples:
+            head = self.resolve(t["head"], t["type"])
+            tail = self.resolve(t["tail"], t["tail_type"])
+            rewritten += (head != t["head"]) + (tail != t["tail"])
+            resolved.append({**t, "head": head, "tail": tail})
+        return resolved, rewritten
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {**self._stats, "indexed": sum(len(i.exact) for i in self._indexes.values())}
+
+
+def load_aliases(path: Optional[str]) -> Dict[str, Dict[str, List[str]]]:
+    """读取别名表 {标签: {规范名: [别名, ...]}}，文件不存在时返回空表。"""
+    if not path:
+        return {}
+    p = Path(path)
+    if not p.is_absolute():
+        p = get_project_root() / p
+    if not p.exists():
+        logger.warning(f"别名表不存在: {p}")
+        return {}
+    with open(p, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def create_entity_resolver(driver=None, labels: Iterable[str] = ()) -> Optional[EntityResolver]:
+    """按 config.yaml 中的 kg_construction.entity_resolution 创建消歧器；关闭时返回 None。driver 不为空时加载图谱中已有的实体。"""
+    conf = (config.get("kg_construction", {}) or {}).get("entity_resolution", {}) or {}
+    if not conf.get("enabled", True):
+        return None
+    resolver = EntityResolver(
+        similarity_threshold=conf.get("similarity_threshold", 0.85),
+        aliases=load_aliases(conf.get("alias_file", "data/entity_aliases.json")),
+    )
+    if driver is not None:
+        try:
+            resolver.load_from_neo4j(driver, labels)
+        except Exception as e:
+            logger.warning(f"加载图谱已有实体失败，实体消歧只使用别名表与本次导入的实体: {e}")
+    return resolver
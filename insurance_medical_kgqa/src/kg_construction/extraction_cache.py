@@ -0,0 +1,95 @@
+# 条款抽取缓存：分块的三元组按「分块文本 + Prompt 版本 + 模型名」的哈希存储（内容寻址），
+# 并记录每个文档上次导入时的分块与三元组清单，重新导入时只抽取新增 / 修改的分块，并撤回已删除内容的三元组
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from src.utils.config_loader import get_project_root
+from src.utils.logger import logger
+
+
+def chunk_key(text: str, prompt_version: str, model: str, title: Optional[str] = None) -> str:
+    """分块的缓存 key：Prompt 中的文档标题也会影响抽取结果，一并计入。"""
+    payload = json.dumps(
+        {"text": text, "prompt_version": prompt_version, "model": model, "title": title or ""},
+        ensure_ascii=False,
+        sort_keys=True,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ExtractionCache:
+    """SQLite 存储：chunks 表保存各分块的三元组，documents 表保存每个文档的导入清单（manifest）。"""
+
+    def __init__(self, path: str):
+        p = Path(path)
+        if not p.is_absolute():
+            p = get_project_root() / p
+        p.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(p), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "key TEXT PRIMARY KEY, triples TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "doc_id TEXT PRIMARY KEY, chunk_keys TEXT NOT NULL, triples TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+        logger.info(f"抽取缓存使用 SQLite: {p}")
+
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        with self._lock:
+            row = self._conn.execute("SELECT triples FROM chunks WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put(self, key: str, triples: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunks (key, triples, created_at) VALUES (?, ?, ?)",
+                (key, json.dumps(triples, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def get_manifest(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """上次导入的清单：{"chunk_keys": [...], "triples": [...], "updated_at"}；从未导入过返回 None。"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT chunk_keys, triples, updated_at FROM documents WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {"chunk_keys": json.loads(row[0]), "triples": json.loads(row[1]), "updated_at": row[2]}
+
+    def save_manifest(self, doc_id: str, chunk_keys: List[str], triples: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, chunk_keys, triples, updated_at) VALUES (?, ?, ?, ?)",
+                (doc_id, json.dumps(chunk_keys), json.dumps(triples, ensure_ascii=False), time.time()),
+            )
+            self._conn.commit()
+
+    def delete_manifest(self, doc_id: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+            self._conn.commit()
+
+    def prune(self) -> int:
+        """删除不再被任何文档清单引用的分块，返回删除的数量。"""
+        with self._lock:
+            referenced = set()
+            for (keys,) in self._conn.execute("SELECT chunk_keys FROM documents"):
+                referenced.update(json.loads(keys))
+            stale = [k for (k,) in self._conn.execute("SELECT key FROM chunks") if k not in referenced]
+            self._conn.executemany("DELETE FROM chunks WHERE key = ?", [(k,) for k in stale])
+            self._conn.commit()
+        return len(stale)
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,380 @@
+# 条款文档批量导入流水线：扫描（或持续监视）目录 → SQLite 持久化队列 → 多个抽取 worker 并发抽取
+# → 单个写入线程把多个文档的三元组合并成批写入 Neo4j → 撤回旧三元组、更新文档状态
+#
+# 运行：
+#   python -m src.kg_construction.ingestion_pipeline [目录]            # 扫描一次，处理完队列后退出
+#   python -m src.kg_construction.ingestion_pipeline [目录] --watch    # 持续监视目录，新增 / 修改的文件自动入队
+#   python -m src.kg_construction.ingestion_pipeline --status          # 查看各状态文档数与最近的失败
+#
+# 进程中断后重新运行即可续跑：处于 processing 状态的文档会重新入队；已抽取的分块命中抽取缓存，不会重复调用 LLM。
+import argparse
+import hashlib
+import json
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.kg_construction.text_graph_builder import TextGraphBuilder, TripleWriteError
+from src.utils.config_loader import config, get_project_root
+from src.utils.logger import logger
+
+_STATUSES = ("pending", "processing", "done", "failed")
+
+
+def _resolve(path: str) -> Path:
+    p = Path(path)
+    return p if p.is_absolute() else get_project_root() / p
+
+
+def doc_id_for(path: Path) -> str:
+    """文档 ID：项目目录内的文件用相对路径（与 text_graph_builder 命令行导入一致），否则用绝对路径。"""
+    try:
+        return path.resolve().relative_to(get_project_root().resolve()).as_posix()
+    except ValueError:
+        return path.resolve().as_posix()
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class IngestionQueue:
+    """
+    文档队列（SQLite）：每个文档一行，记录内容哈希、状态（pending / processing / done / failed）、
+    尝试次数、错误信息与导入结果。文件内容变化后重新入队。
+    """
+
+    def __init__(self, path: str):
+        p = _resolve(path)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(p), check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS documents ("
+            "doc_id TEXT PRIMARY KEY, path TEXT NOT NULL, content_hash TEXT NOT NULL, status TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, error TEXT, report TEXT, "
+            "enqueued_at REAL NOT NULL, started_at REAL, finished_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_status ON documents(status, enqueued_at)")
+        self._conn.commit()
+
+    def enqueue(self, doc_id: str, path: str, digest: str) -> bool:
+        """
+        新文件或内容变化的文件入队（状态置为 pending、尝试次数清零），返回是否入队。
+        正在处理的文档只更新内容哈希、不改状态（否则会被另一个 worker 重复领取），由 mark_done 发现哈希不一致后重新入队。
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT content_hash, status FROM documents WHERE doc_id = ?", (doc_id,)).fetchone()
+            if row is not None and row[0] == digest:
+                return False
+            if row is not None and row[1] == "processing":
+                self._conn.execute(
+                    "UPDATE documents SET path = ?, content_hash = ? WHERE doc_id = ?", (path, digest, doc_id)
+                )
+                self._conn.commit()
+                return True
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, path, content_hash, status, attempts, enqueued_at) "
+                "VALUES (?, ?, ?, 'pending', 0, ?)",
+                (doc_id, path, digest, time.time()),
+            )
+            self._conn.commit()
+            return True
+
+    def recover(self) -> int:
+        """上次运行中断时仍处于 processing 的文档重新入队，返回数量。"""
+        with self._lock:
+            cur = self._conn.execute("UPDATE documents SET status = 'pending' WHERE status = 'processing'")
+            self._conn.commit()
+            return cur.rowcount
+
+    def claim(self, limit: int) -> List[Tuple[str, str]]:
+        """按入队顺序取出最多 limit 个 pending 文档并标记为 processing，返回 [(doc_id, path), ...]。"""
+        if limit <= 0:
+            return []
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, path FROM documents WHERE status = 'pending' ORDER BY enqueued_at LIMIT ?", (limit,)
+            ).fetchall()
+            now = time.time()
+            self._conn.executemany(
+                "UPDATE documents SET status = 'processing', attempts = attempts + 1, started_at = ? WHERE doc_id = ?",
+                [(now, doc_id) for doc_id, _ in rows],
+            )
+            self._conn.commit()
+        return rows
+
+    def mark_done(self, doc_id: str, digest: str, report: Dict[str, Any]) -> None:
+        """导入完成；处理期间文件又被修改（哈希不一致）时保持 pending，等待重新处理。"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE documents SET status = CASE WHEN content_hash = ? THEN 'done' ELSE 'pending' END, "
+                "error = NULL, report = ?, finished_at = ? WHERE doc_id = ?",
+                (digest, json.dumps(report, ensure_ascii=False), time.time(), doc_id),
+            )
+            self._conn.commit()
+
+    def mark_failed(self, doc_id: str, error: str, max_attempts: int) -> None:
+        """失败：尝试次数未用完时重新入队，否则标记为 failed。"""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE documents SET status = CASE WHEN attempts < ? THEN 'pending' ELSE 'failed' END, "
+                "error = ?, finished_at = ? WHERE doc_id = ?",
+                (max_attempts, error[:2000], time.time(), doc_id),
+            )
+            self._conn.commit()
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM documents GROUP BY status").fetchall()
+        counts = {s: 0 for s in _STATUSES}
+        counts.update(dict(rows))
+        return counts
+
+    def failures(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT doc_id, attempts, error FROM documents WHERE error IS NOT NULL "
+                "ORDER BY finished_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [{"doc_id": d, "attempts": a, "error": e} for d, a, e in rows]
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class IngestionPipeline:
+    """
+    workers 个抽取 worker 各处理一个文档（文档内的分块再按 text_extraction.max_workers 并发），
+    抽取结果交给唯一的写入线程：攒够 writer_batch_triples 个三元组或等待超过 writer_flush_seconds 秒后，
+    一次性按 (头标签, 关系, 尾标签) 分组写入，再逐个文档撤回旧三元组、标记完成。
+    """
+
+    def __init__(self, root: Optional[str] = None, builder=None, ingestion_queue: Optional[IngestionQueue] = None):
+        conf = (config.get("kg_construction", {}) or {}).get("ingestion", {}) or {}
+        self.root = _resolve(root or conf.get("root", "data/raw_text"))
+        self.extensions = {e.lower() for e in conf.get("extensions", [".txt", ".md"])}
+        self.workers = max(int(conf.get("workers", 4)), 1)
+        self.writer_batch_triples = max(int(conf.get("writer_batch_triples", 5000)), 1)
+        self.writer_flush_seconds = float(conf.get("writer_flush_seconds", 5))
+        self.max_attempts = max(int(conf.get("max_attempts", 3)), 1)
+        self.scan_interval = float(conf.get("scan_interval_seconds", 30))
+        self.report_interval = float(conf.get("report_interval_seconds", 30))
+
+        self.builder = builder if builder is not None else TextGraphBuilder()
+        self.queue = ingestion_queue or IngestionQueue(conf.get("queue_path", "data/cache/ingestion_queue.sqlite"))
+
+        self._results: "queue.Queue" = queue.Queue()
+        # 正在抽取的文档数，以及已领取但尚未完成写入的文档数（写入积压过多时暂停领取）
+        self._extracting = 0
+        self._unwritten = 0
+        self._count_lock = threading.Lock()
+        self._totals = {"documents": 0, "failed": 0, "chunks": 0, "cached_chunks": 0, "triples": 0, "written": 0, "retracted": 0}
+        self._started = time.monotonic()
+
+    # === 扫描 ===
+    def scan(self) -> int:
+        """扫描目录，新文件和内容有变化的文件入队，返回入队数量。"""
+        if not self.root.exists():
+            logger.error(f"导入目录不存在: {self.root}")
+            return 0
+        enqueued = 0
+        for path in sorted(self.root.rglob("*")):
+            if not path.is_file() or path.suffix.lower() not in self.extensions:
+                continue
+            try:
+                digest = content_hash(path.read_bytes())
+            except OSError as e:
+                logger.warning(f"读取文件失败，跳过: {path}: {e}")
+                continue
+            if self.queue.enqueue(doc_id_for(path), str(path), digest):
+                enqueued += 1
+        if enqueued:
+            logger.info(f"扫描 {self.root}：{enqueued} 个新增 / 修改的文档入队")
+        return enqueued
+
+    # === 抽取 worker ===
+    def _extract(self, doc_id: str, path: str) -> None:
+        try:
+            data = Path(path).read_bytes()
+            extraction = self.builder.extract_incremental(data.decode("utf-8"), doc_id)
+            self._results.put((doc_id, content_hash(data), extraction, None))
+        except Exception as e:
+            logger.error(f"抽取失败 {doc_id}: {e}")
+            self._results.put((doc_id, None, None, f"{type(e).__name__}: {e}"))
+        finally:
+            with self._count_lock:
+                self._extracting -= 1
+
+    # === 写入线程 ===
+    def _writer(self, stop: threading.Event) -> None:
+        batch: List[tuple] = []
+        batch_triples = 0
+        oldest = None
+        while True:
+            # 有待写入的批次时最多等到批次超时，否则每 0.5 秒检查一次是否该退出
+            wait = 0.5 if oldest is None else max(self.writer_flush_seconds - (time.monotonic() - oldest), 0.01)
+            try:
+                item = self._results.get(timeout=wait)
+            except queue.Empty:
+                item = None
+            if item is not None:
+                doc_id, digest, extraction, error = item
+                if error is not None:
+                    self._finish_failed(doc_id, error)
+                else:
+                    batch.append(item)
+                    batch_triples += len(extraction["triples"])
+                    oldest = oldest or time.monotonic()
+            due = oldest is not None and time.monotonic() - oldest >= self.writer_flush_seconds
+            if batch and (batch_triples >= self.writer_batch_triples or due or (stop.is_set() and self._results.empty())):
+                self._flush(batch)
+                batch, batch_triples, oldest = [], 0, None
+            if stop.is_set() and self._results.empty() and not batch:
+                return
+
+    def _flush(self, batch: List[tuple]) -> None:
+        triples = [{**t, "source": doc_id} for doc_id, _, extraction, _ in batch for t in extraction["triples"]]
+        # 部分批次写入失败时，涉及的文档不撤回、不更新清单，标记失败后重试；其余文档照常完成
+        write_failed, write_error = set(), None
+        try:
+            written = self.builder.save_to_neo4j(triples)
+        except TripleWriteError as e:
+            written, write_failed, write_error = e.written, e.failed_sources, e
+        except Exception as e:
+            for doc_id, _, _, _ in batch:
+                self._finish_failed(doc_id, f"写入失败: {e}")
+            return
+        changed = written > 0
+        for doc_id, digest, extraction, _ in batch:
+            if doc_id in write_failed:
+                self._finish_failed(doc_id, f"写入失败: {write_error}")
+                continue
+            try:
+                retracted = self.builder.commit_document(doc_id, extraction)
+            except Exception as e:
+                if isinstance(e, TripleWriteError) and e.written:
+                    changed = True
+                self._finish_failed(doc_id, f"撤回旧三元组失败: {e}")
+                continue
+            changed = changed or retracted > 0
+            if extraction["failed"]:
+                self._finish_failed(doc_id, f"{extraction['failed']} 个分块抽取失败")
+                continue
+            report = {k: v for k, v in extraction.items() if k not in ("keys", "triples")}
+            report.update(triples=len(extraction["triples"]), retracted=retracted)
+            self.queue.mark_done(doc_id, digest, report)
+            self._finish_ok(report)
+        # 整批只更新一次图谱版本号，预计算回答、/stats 等缓存随之失效
+        if changed:
+            self.builder.bump_graph_version()
+        self._totals["written"] += written
+        logger.info(f"批量写入 {len(batch)} 个文档的 {len(triples)} 个三元组")
+
+    def _finish_ok(self, report: Dict[str, Any]) -> None:
+        self._totals["documents"] += 1
+        self._totals["chunks"] += report["chunks"]
+        self._totals["cached_chunks"] += report["cached"]
+        self._totals["triples"] += report["triples"]
+        self._totals["retracted"] += report["retracted"]
+        with self._count_lock:
+            self._unwritten -= 1
+
+    def _finish_failed(self, doc_id: str, error: str) -> None:
+        self.queue.mark_failed(doc_id, error, self.max_attempts)
+        self._totals["failed"] += 1
+        with self._count_lock:
+            self._unwritten -= 1
+
+    # === 主循环 ===
+    def throughput(self) -> Dict[str, Any]:
+        elapsed = max(time.monotonic() - self._started, 1e-6)
+        return {
+            **self._totals,
+            "elapsed_s": round(elapsed, 1),
+            "documents_per_min": round(self._totals["documents"] / elapsed * 60, 2),
+            "triples_per_s": round(self._totals["triples"] / elapsed, 2),
+            "queue": self.queue.counts(),
+        }
+
+    def run(self, watch: bool = False) -> Dict[str, Any]:
+        """处理队列直到为空（watch=True 时持续监视目录，Ctrl+C 退出），返回吞吐量统计。"""
+        recovered = self.queue.recover()
+        if recovered:
+            logger.info(f"续跑：{recovered} 个上次未完成的文档重新入队")
+        self._started = time.monotonic()
+        self.scan()
+        last_scan = last_report = time.monotonic()
+
+        stop = threading.Event()
+        writer = threading.Thread(target=self._writer, args=(stop,), name="ingest-writer", daemon=True)
+        writer.start()
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest") as pool:
+                while True:
+                    with self._count_lock:
+                        backlog = self._unwritten - self._extracting
+                        free = self.workers - self._extracting if backlog < self.workers * 4 else 0
+                    claimed = self.queue.claim(free)
+                    with self._count_lock:
+                        self._extracting += len(claimed)
+                        self._unwritten += len(claimed)
+                    for doc_id, path in claimed:
+                        pool.submit(self._extract, doc_id, path)
+
+                    now = time.monotonic()
+                    if now - last_report >= self.report_interval:
+                        logger.info(f"导入进度: {self.throughput()}")
+                        last_report = now
+                    if watch and now - last_scan >= self.scan_interval:
+                        self.scan()
+                        last_scan = now
+                    with self._count_lock:
+                        idle = self._unwritten == 0
+                    if not watch and idle and not claimed and self.queue.counts()["pending"] == 0:
+                        break
+                    time.sleep(0.2 if not claimed else 0)
+        except KeyboardInterrupt:
+            logger.info("收到中断，等待写入线程完成已抽取的文档...")
+        finally:
+            stop.set()
+            writer.join()
+
+        report = self.throughput()
+        logger.info(f"导入结束: {report}")
+        return report
+
+    def close(self) -> None:
+        self.queue.close()
+        self.builder.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="条款文档批量导入")
+    parser.add_argument("root", nargs="?", default=None, help="导入目录，默认 kg_construction.ingestion.root")
+    parser.add_argument("--watch", action="store_true", help="持续监视目录，新增 / 修改的文件自动导入")
+    parser.add_argument("--status", action="store_true", help="只查看队列状态与最近的失败")
+    args = parser.parse_args()
+
+    if args.status:
+        conf = (config.get("kg_construction", {}) or {}).get("ingestion", {}) or {}
+        q = IngestionQueue(conf.get("queue_path", "data/cache/ingestion_queue.sqlite"))
+        print(json.dumps({"counts": q.counts(), "failures": q.failures()}, ensure_ascii=False, indent=2))
+        q.close()
+        return
+
+    pipeline = IngestionPipeline(args.root)
+    try:
+        report = pipeline.run(watch=args.watch)
+    finally:
+        pipeline.close()
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
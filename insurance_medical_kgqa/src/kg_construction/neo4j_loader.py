@@ -1,13 +1,52 @@
 import json
 import csv
 import logging
+import re
+import time
+from collections import defaultdict
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Optional
 from neo4j import GraphDatabase
 
+from src.kg_construction.data_collection import create_data_collector
+from src.kg_construction.entity_extraction import RecordSchema, get_compiled_schema
 from src.utils.config_loader import config, get_project_root
+from src.utils.graph_version import write_graph_version
 from src.utils.logger import logger
 
+# === 数据源 Schema：新增数据源只需声明 schema 与节点属性映射，交给 load_records 导入 ===
+# 关系：字段 → [(头类型, 关系, 尾类型)]，列表字段的每个元素生成一条关系
+DISEASE_SCHEMA: RecordSchema = {
+    "symptom": [("Disease", "HAS_SYMPTOM", "Symptom")],
+    "cure_dept": [("Disease", "BELONGS_TO_DEPT", "Department")],
+    "drug": [("Disease", "TREATED_BY", "Drug")],
+    "neopathy": [("Disease", "HAS_COMPLICATION", "Disease")],
+}
+# 节点属性：属性名 → 记录字段
+DISEASE_PROPERTIES = {
+    "name": "name", "icd_code": "icd_code", "intro": "intro", "get_prob": "get_prob",
+    "easy_get": "easy_get", "get_way": "get_way", "cause": "cause", "prevent": "prevent",
+    "nursing": "nursing", "treat_detail": "treat_detail",
+}
+DRUG_PROPERTIES = {
+    "name": "name", "category_code": "category_code", "subcategory_name": "subcategory_name",
+    "dosage": "dosage", "reimbursement_category": "reimbursement_category",
+}
+NURSING_HOME_PROPERTIES = {
+    "name": "名称", "city": "城市", "nature": "性质", "beds": "床位",
+    "price": "价格(元/月)", "address": "地址", "services": "特色服务",
+}
+
+# 标签与关系类型会拼进 Cypher，只允许标识符
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _check_identifier(name: str) -> str:
+    if not _IDENTIFIER.match(name or ""):
+        raise ValueError(f"非法的标签或关系类型: {name!r}")
+    return name
+
+
 class Neo4jLoader:
     def __init__(self):
         self.uri = config.get("neo4j", {}).get("uri", "bolt://localhost:7687")
@@ -23,6 +62,9 @@ class Neo4jLoader:
             logger.error("Please check your Neo4j credentials in config.yaml or environment variables.")
             raise
 
+        # 数据文件通过 DataCollector 加载：并行读取，命中解析快照时跳过 JSON / CSV 解析
+        self.collector = create_data_collector()
+
     def clear_database(self):
         """清空数据库中的所有节点和关系（慎用）"""
         logger.warning("Clearing entire database...")
@@ -71,10 +113,21 @@ class Neo4jLoader:
             logger.error(f"Data directory not found: {data_cleaned_dir}")
             return
 
-        self._load_diseases(data_cleaned_dir / "Diseases" / "diseases.json")
-        self._load_drugs(data_cleaned_dir / "Drugs" / "medicine.json")
-        self._load_nursing_homes(data_cleaned_dir / "NursingHomes" / "nursing_homes.csv")
-        self._load_insurances(data_cleaned_dir / "Insurance" / "insurance_info.json")
+        sources = [
+            data_cleaned_dir / "Diseases" / "diseases.json",
+            data_cleaned_dir / "Drugs" / "medicine.json",
+            data_cleaned_dir / "NursingHomes" / "nursing_homes.csv",
+            data_cleaned_dir / "Insurance" / "insurance_info.json",
+        ]
+        # 先并行加载全部文件（结果留在 DataCollector 的进程内缓存中），再依次写入
+        self.collector.load_files(p for p in sources if p.exists())
+
+        self._load_diseases(sources[0])
+        self._load_drugs(sources[1])
+        self._load_nursing_homes(sources[2])
+        self._load_insurances(sources[3])
+        # 导入完成后更新图谱版本号，依赖图谱内容的缓存（预计算回答等）随之失效
+        write_graph_version(self.driver)
 
     def _load_diseases(self, file_path: Path):
         if not file_path.exists():
@@ -82,72 +135,10 @@ class Neo4jLoader:
             return
 
         logger.info(f"Loading diseases from {file_path}...")
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = self.collector.load_file(file_path)
 
-        # 预处理数据
-        processed_data = []
-        for item in data:
-            # 提取主要属性
-            props = {
-                "name": item.get("name"),
-                "icd_code": item.get("icd_code"),
-                "intro": item.get("intro"),
-                "get_prob": item.get("get_prob"),
-                "easy_get": item.get("easy_get"),
-                "get_way": item.get("get_way"),
-                "cause": item.get("cause"),
-                "prevent": item.get("prevent"),
-                "nursing": item.get("nursing"),
-                "treat_detail": item.get("treat_detail")
-            }
-            
-            # 提取关系数据
-            symptoms = item.get("symptom", [])
-            drugs = item.get("drug", [])
-            neopathy = item.get("neopathy", [])
-            dept = item.get("cure_dept", "").strip()
-            
-            processed_data.append({
-                "props": props,
-                "symptoms": symptoms,
-                "drugs": drugs,
-                "neopathy": neopathy,
-                "dept": dept
-            })
-
-        # 批量写入
-        query = """
-        UNWIND $batch AS row
-        MERGE (d:Disease {name: row.props.name})
-        SET d += row.props
-        
-        // Disease -> Symptom
-        FOREACH (s_name IN row.symptoms | 
-            MERGE (s:Symptom {name: s_name})
-            MERGE (d)-[:HAS_SYMPTOM]->(s)
-        )
-        
-        // Disease -> Department
-        FOREACH (ignore IN CASE WHEN row.dept <> "" THEN [1] ELSE [] END |
-            MERGE (dept:Department {name: row.dept})
-            MERGE (d)-[:BELONGS_TO_DEPT]->(dept)
-        )
-        
-        // Disease -> Drug (TREATED_BY)
-        FOREACH (d_name IN row.drugs |
-            MERGE (dg:Drug {name: d_name})
-            MERGE (d)-[:TREATED_BY]->(dg)
-        )
-        
-        // Disease -> Disease (Complication)
-        FOREACH (n_name IN row.neopathy |
-            MERGE (nd:Disease {name: n_name})
-            MERGE (d)-[:HAS_COMPLICATION]->(nd)
-        )
-        """
-        
-        self._batch_run(query, processed_data, "Diseases")
+        # Disease 节点属性 + 症状 / 科室 / 药品 / 并发症关系，按 DISEASE_SCHEMA 生成
+        self.load_records(data, "Disease", DISEASE_SCHEMA, DISEASE_PROPERTIES)
 
     def _load_drugs(self, file_path: Path):
         if not file_path.exists():
@@ -155,30 +146,11 @@ class Neo4jLoader:
             return
 
         logger.info(f"Loading medicines from {file_path}...")
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = self.collector.load_file(file_path)
 
-        processed_data = []
         # medicine.json 结构： {"西药部分": {"medicines": [...]}, ...}
-        for category_name, content in data.items():
-            medicines = content.get("medicines", [])
-            for med in medicines:
-                props = {
-                    "name": med.get("name"),
-                    "category_code": med.get("category_code"),
-                    "subcategory_name": med.get("subcategory_name"),
-                    "dosage": med.get("dosage"),
-                    "reimbursement_category": med.get("reimbursement_category")
-                }
-                processed_data.append(props)
-
-        query = """
-        UNWIND $batch AS row
-        MERGE (d:Drug {name: row.name})
-        SET d += row
-        """
-        
-        self._batch_run(query, processed_data, "Drugs")
+        medicines = (med for content in data.values() for med in content.get("medicines", []))
+        self.load_records(medicines, "Drug", properties=DRUG_PROPERTIES)
 
     def _load_nursing_homes(self, file_path: Path):
         if not file_path.exists():
@@ -186,33 +158,9 @@ class Neo4jLoader:
             return
 
         logger.info(f"Loading nursing homes from {file_path}...")
-        processed_data = []
-        with open(file_path, 'r', encoding='utf-8') as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                name = row.get("名称")
-                if not name or not name.strip():
-                    continue
-
-                # 映射 CSV 列名到英文属性
-                props = {
-                    "name": name.strip(),
-                    "city": row.get("城市"),
-                    "nature": row.get("性质"),
-                    "beds": row.get("床位"),
-                    "price": row.get("价格(元/月)"),
-                    "address": row.get("地址"),
-                    "services": row.get("特色服务")
-                }
-                processed_data.append(props)
-
-        query = """
-        UNWIND $batch AS row
-        MERGE (n:NursingHome {name: row.name})
-        SET n += row
-        """
-        
-        self._batch_run(query, processed_data, "NursingHomes")
+        # 映射 CSV 列名到英文属性（DataCollector 按 utf-8-sig 读取，首列“城市”不会带 BOM）
+        rows = self.collector.load_file(file_path)
+        self.load_records(rows, "NursingHome", properties=NURSING_HOME_PROPERTIES, head_field="名称")
 
     def _load_insurances(self, file_path: Path):
         if not file_path.exists():
@@ -220,8 +168,7 @@ class Neo4jLoader:
             return
 
         logger.info(f"Loading insurance info from {file_path}...")
-        with open(file_path, 'r', encoding='utf-8') as f:
-            data = json.load(f)
+        data = self.collector.load_file(file_path)
 
         processed_data = []
         for item in data:
@@ -268,6 +215,84 @@ class Neo4jLoader:
         
         self._batch_run(query, processed_data, "Insurances")
 
+    def load_records(
+        self,
+        records: Iterable[Dict[str, Any]],
+        label: str,
+        schema: Optional[RecordSchema] = None,
+        properties: Optional[Dict[str, str]] = None,
+        head_field: str = "name",
+        batch_size: int = 1000,
+    ) -> Dict[str, int]:
+        """
+        通用导入：每条记录生成一个 label 节点（name 取自 head_field，属性按 properties {属性名: 字段} 映射），
+        并按 schema 生成关系（尾节点不存在时创建）。记录逐条流式处理，节点和每组 (头类型, 关系, 尾类型)
+        的关系各攒够 batch_size 条用一条 UNWIND 语句写入。返回 {"nodes", "relationships"}。
+        """
+        _check_identifier(label)
+        schema = schema or {}
+        for specs in schema.values():
+            for head_type, relation, tail_type in specs:
+                _check_identifier(head_type), _check_identifier(relation), _check_identifier(tail_type)
+        prop_items = list((properties or {"name": head_field}).items())
+        extract = get_compiled_schema(schema, head_field, typed=True)
+
+        node_query = f"""
+        UNWIND $batch AS row
+        MERGE (n:{label} {{name: row.name}})
+        SET n += row
+        """
+        counts = {"nodes": 0, "relationships": 0}
+        node_rows: List[Dict[str, Any]] = []
+        rel_rows: Dict[tuple, List[Dict[str, str]]] = defaultdict(list)
+        start = time.monotonic()
+
+        with self.driver.session() as session:
+            def write(query, rows, kind):
+                try:
+                    session.run(query, batch=rows).consume()
+                    counts[kind] += len(rows)
+                except Exception as e:
+                    logger.error(f"Error importing {len(rows)} {kind} for {label}: {e}")
+
+            def flush_relationships(key):
+                head_type, relation, tail_type = key
+                query = f"""
+                UNWIND $batch AS row
+                MERGE (h:{head_type} {{name: row.head}})
+                MERGE (t:{tail_type} {{name: row.tail}})
+                MERGE (h)-[:{relation}]->(t)
+                """
+                write(query, rel_rows.pop(key), "relationships")
+
+            def nodes(rows):
+                # 节点属性在遍历记录的同时收集，记录只读一遍
+                for record in rows:
+                    name = record.get(head_field)
+                    name = str(name).strip() if name is not None else ""
+                    if name:
+                        node_rows.append({**{prop: record.get(field) for prop, field in prop_items}, "name": name})
+                        if len(node_rows) >= batch_size:
+                            write(node_query, node_rows[:], "nodes")
+                            node_rows.clear()
+                    yield record
+
+            for head_type, relation, tail_type, head, tail in extract(nodes(records)):
+                rows = rel_rows[(head_type, relation, tail_type)]
+                rows.append({"head": head, "tail": tail})
+                if len(rows) >= batch_size:
+                    flush_relationships((head_type, relation, tail_type))
+            if node_rows:
+                write(node_query, node_rows, "nodes")
+            for key in list(rel_rows):
+                flush_relationships(key)
+
+        logger.info(
+            f"Finished importing {label}: {counts['nodes']} nodes, {counts['relationships']} relationships "
+            f"in {time.monotonic() - start:.1f}s"
+        )
+        return counts
+
     def _batch_run(self, query, data, label, batch_size=1000):
         total = len(data)
         logger.info(f"Starting import for {label}. Total records: {total}")
@@ -289,3 +314,9 @@ if __name__ == "__main__":
         loader.load_all()
     finally:
         loader.close()
+
+    # 导入后预热高频问题的回答
+    answer_store_conf = (config.get("rag", {}) or {}).get("answer_store", {}) or {}
+    if answer_store_conf.get("enabled", False) and answer_store_conf.get("warm_up_after_load", True):
+        from src.graph_rag.answer_warmup import run_warm_up
+        run_warm_up()
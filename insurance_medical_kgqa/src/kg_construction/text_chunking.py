@@ -0,0 +1,117 @@
+# 条款文本分块：按条款边界（"第X条"、"一、"、"（一）"、"1."、空行）切分，超长条款再按句切分，
+# 相邻分块之间保留若干完整条款 / 句子的重叠，避免跨块的关系丢失。
+# 分块边界由条款内容决定（内容哈希选出断点），增删一个条款只影响它所在的分块，其余分块的缓存 key 不变
+import hashlib
+import re
+from dataclasses import dataclass
+from typing import List
+
+# 条款标题：第一条 / 第1条 / 一、 / （一） / (1) / 1. / 1、
+_CLAUSE_HEADING = re.compile(
+    r"^\s*(第[一二三四五六七八九十百零〇\d]+[条章节款]|[一二三四五六七八九十]+、|[（(][一二三四五六七八九十\d]+[)）]|\d+[.、．](?!\d))"
+)
+# 计算断点哈希时取单元开头的字数
+_BREAKPOINT_HEAD_CHARS = 32
+# 句末标点（保留在句子末尾）
+_SENTENCE_END = re.compile(r"(?<=[。！？；;!?])")
+
+
+@dataclass
+class TextChunk:
+    index: int
+    text: str
+    start: int  # 在原文中的起始字符位置
+    end: int
+
+
+def split_clauses(text: str) -> List[tuple]:
+    """按条款边界切分，返回 [(start, end), ...]：遇到条款标题或空行时开始新条款。"""
+    spans = []
+    start = None
+    pos = 0
+    for line in text.splitlines(keepends=True):
+        line_start, pos = pos, pos + len(line)
+        if not line.strip():
+            if start is not None:
+                spans.append((start, line_start))
+                start = None
+            continue
+        if start is None:
+            start = line_start
+        elif _CLAUSE_HEADING.match(line):
+            spans.append((start, line_start))
+            start = line_start
+    if start is not None:
+        spans.append((start, pos))
+    return spans
+
+
+def _split_long(text: str, start: int, end: int, max_chars: int) -> List[tuple]:
+    """超过 max_chars 的条款按句切分；单句仍超长时按长度硬切。"""
+    if end - start <= max_chars:
+        return [(start, end)]
+    spans = []
+    offset = start
+    for sentence in _SENTENCE_END.split(text[start:end]):
+        if not sentence:
+            continue
+        s_start, s_end = offset, offset + len(sentence)
+        offset = s_end
+        while s_end - s_start > max_chars:
+            spans.append((s_start, s_start + max_chars))
+            s_start += max_chars
+        if s_end > s_start:
+            spans.append((s_start, s_end))
+    return spans
+
+
+def _is_breakpoint(unit_text: str, target_chars: int) -> bool:
+    """
+    单元之后是否断开：只取决于单元自身（开头一行的哈希值与长度），与它在文档中的位置无关；
+    哈希只取开头一行（通常是条款标题），修改条款正文一般不会改变断点。
+    断开概率与单元长度成正比，分块平均约 target_chars 字。
+    """
+    head = unit_text.strip().split("\n", 1)[0][:_BREAKPOINT_HEAD_CHARS]
+    digest = hashlib.blake2b(head.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") / 2 ** 64 < len(unit_text) / target_chars
+
+
+def chunk_text(text: str, max_chars: int = 1500, overlap_chars: int = 200) -> List[TextChunk]:
+    """
+    把文本切成不超过 max_chars 的分块（按条款 / 句子整段装箱，不在句中截断）。
+    分块在内容哈希选中的单元之后断开（平均约 max_chars 的 2/5），再装不下时才按长度断开，
+    因此增删或修改一个条款只改变包含它的分块，其余分块内容不变、命中抽取缓存。
+    每个分块开头重复上一块末尾不超过 overlap_chars 的若干完整单元。
+    """
+    max_chars = max(int(max_chars), 1)
+    overlap_chars = max(min(int(overlap_chars), max_chars // 2), 0)
+    # 平均分块取上限的 2/5：按长度强制断开的情况很少，强制断开造成的边界偏移到下一个内容断点即恢复
+    target_chars = max(max_chars * 2 // 5, 1)
+    units = []
+    for start, end in split_clauses(text):
+        units.extend(_split_long(text, start, end, max_chars))
+    if not units:
+        return []
+
+    chunks: List[TextChunk] = []
+    current: List[tuple] = []
+    cut = False  # 上一个单元是内容断点
+    for unit in units:
+        if current and (cut or unit[1] - current[0][0] > max_chars):
+            chunks.append(_make_chunk(text, len(chunks), current))
+            # 从上一块末尾取重叠单元（加上新单元后不能超过 max_chars；不含上一块的第一个单元，否则上一块被整个包含）
+            overlap: List[tuple] = []
+            for prev in reversed(current[1:]):
+                if unit[1] - prev[0] > max_chars or current[-1][1] - prev[0] > overlap_chars:
+                    break
+                overlap.insert(0, prev)
+            current = overlap
+        current.append(unit)
+        cut = _is_breakpoint(text[unit[0]:unit[1]], target_chars)
+    chunks.append(_make_chunk(text, len(chunks), current))
+    return chunks
+
+
+def _make_chunk(text: str, index: int, units: List[tuple]) -> TextChunk:
+    start, end = units[0][0], units[-1][1]
+    return TextChunk(index=index, text=text[start:end].strip(), start=start, end=end)
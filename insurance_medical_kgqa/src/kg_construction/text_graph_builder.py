@@ -1,10 +1,43 @@
 import os
+import sys
 import json
 import re
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from neo4j import GraphDatabase
 from src.utils.logger import logger
 from src.graph_rag.llm_integration import LLMIntegration
+from src.kg_construction.entity_resolution import create_entity_resolver
+from src.kg_construction.extraction_cache import ExtractionCache, chunk_key
+from src.kg_construction.text_chunking import chunk_text
 from src.utils.config_loader import config
+from src.utils.graph_version import write_graph_version
+
+# 抽取 Prompt 的版本号：修改 Prompt 后递增，抽取缓存中旧版本的结果随之失效
+EXTRACTION_PROMPT_VERSION = "1"
+
+# 三元组必须包含的字段
+TRIPLE_FIELDS = ("head", "type", "relation", "tail", "tail_type")
+
+# 允许写入图谱的节点标签与关系类型（与抽取 Prompt 中的 Schema 一致）。
+# 标签和关系类型无法参数化，只能拼进 Cypher，因此必须先按白名单校验
+ALLOWED_LABELS = {"Insurance", "Disease", "AgeRange", "Exclusion"}
+ALLOWED_RELATIONS = {"COVERS", "EXCLUDES", "ALLOWS_AGE", "REFUSES_DISEASE"}
+# 导入脚本（neo4j_loader）没有为这些标签建唯一约束，MERGE 前补建 name 索引
+_INDEXED_LABELS = ("AgeRange", "Exclusion")
+
+class TripleWriteError(Exception):
+    """
+    写入 / 撤回三元组时有批次失败（其余批次已完成）。
+    written 为成功写入（或删除）的数量，failed_sources 为失败批次涉及的来源文档 ID。
+    """
+
+    def __init__(self, message, written=0, failed_sources=()):
+        super().__init__(message)
+        self.written = written
+        self.failed_sources = set(failed_sources)
 
 class TextGraphBuilder:
     def __init__(self):
@@ -17,14 +50,58 @@ class TextGraphBuilder:
         # 2. 初始化 LLM
         self.llm = LLMIntegration()
 
+        # 3. 长文档分块抽取：按条款边界分块（带重叠），多个分块并发调用 LLM
+        extract_conf = (config.get("kg_construction", {}) or {}).get("text_extraction", {}) or {}
+        self.chunk_max_chars = int(extract_conf.get("chunk_max_chars", 1500))
+        self.chunk_overlap_chars = int(extract_conf.get("chunk_overlap_chars", 200))
+        self.max_workers = max(int(extract_conf.get("max_workers", 4)), 1)
+
+        # 4. 抽取缓存：重新导入时只抽取新增 / 修改的分块（cache_path 为空则关闭）
+        cache_path = extract_conf.get("cache_path", "data/cache/extraction_cache.sqlite")
+        self.cache = ExtractionCache(cache_path) if cache_path else None
+
+        # 5. 实体消歧：首次写入前从图谱加载已有实体建索引（延迟创建，只读工具不需要连接图谱）
+        self._resolver = None
+        self._resolver_lock = threading.Lock()
+
     def close(self):
         self.driver.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    @property
+    def resolver(self):
+        """实体消歧器（kg_construction.entity_resolution.enabled 为 false 时为 None）。"""
+        with self._resolver_lock:
+            if self._resolver is None:
+                self._resolver = create_entity_resolver(self.driver, sorted(ALLOWED_LABELS)) or False
+        return self._resolver or None
 
-    def extract_triples(self, text):
+    def resolve_entities(self, triples):
+        """把三元组的实体名对齐到图谱中已有的同标签节点（不在 Schema 内的三元组原样保留，写入时再拒绝），返回 (三元组, 改写数)。"""
+        resolver = self.resolver
+        if resolver is None:
+            return triples, 0
+        valid = [t for t in triples if t["type"] in ALLOWED_LABELS and t["tail_type"] in ALLOWED_LABELS]
+        resolved, rewritten = resolver.resolve_triples(valid)
+        others = [t for t in triples if not (t["type"] in ALLOWED_LABELS and t["tail_type"] in ALLOWED_LABELS)]
+        # 改写后不同的变体可能变成同一个三元组，再去重一次
+        return self.merge_triples([resolved, others]), rewritten
+
+    def extract_triples(self, text, title=None):
         """
-        利用 LLM 从文本中提取三元组
+        利用 LLM 从文本中提取三元组，失败时返回空列表
+        title 为文档标题（通常是产品名）：分块抽取时条款正文里往往不出现产品名，用它补全 head
         """
+        try:
+            return self._extract(text, title)
+        except Exception:
+            return []
+
+    def _extract(self, text, title=None):
+        """同 extract_triples，但调用或解析失败时抛出异常（用于区分「没有三元组」和「抽取失败」）。"""
         logger.info("正在调用 LLM 进行信息抽取...")
+        title_hint = f"【文档标题】: {title}（条款中的“本产品”即指该产品）\n" if title else ""
         
         # === 核心 Prompt：定义 Schema ===
         prompt = f"""
@@ -42,6 +119,7 @@ class TextGraphBuilder:
         - ALLOWS_AGE (投保年龄)
         - REFUSES_DISEASE (拒保疾病)
 
+        {title_hint}
         【保险条款文本】:
         {text}
 
@@ -54,45 +132,281 @@ class TextGraphBuilder:
         ]
         """
         
+        response = ""
         try:
             # 调用大模型
-            response = self.llm.generate(prompt, temperature=0.1) # 低温度保证格式稳定
+            response = self.llm.generate(prompt, temperature=0.1, use_cache=True, caller="extract") # 低温度保证格式稳定，相同文本复用缓存
             
             # 清理可能的 Markdown 格式
             cleaned_response = response.replace("```json", "").replace("```", "").strip()
             triples = json.loads(cleaned_response)
+            if not isinstance(triples, list):
+                raise ValueError("LLM 输出不是 JSON 列表")
             logger.info(f"成功提取 {len(triples)} 个三元组")
             return triples
         except Exception as e:
             logger.error(f"提取失败: {e}")
             logger.error(f"LLM 原始返回: {response}")
+            raise
+
+    @staticmethod
+    def merge_triples(triple_lists):
+        """合并各分块的抽取结果：丢弃字段不全的三元组，按 (head, type, relation, tail, tail_type) 去重，保持首次出现的顺序。"""
+        merged = {}
+        for triples in triple_lists:
+            for item in triples or []:
+                if not isinstance(item, dict) or not all(str(item.get(k) or "").strip() for k in TRIPLE_FIELDS):
+                    continue
+                key = tuple(re.sub(r"\s+", "", str(item[k])) for k in TRIPLE_FIELDS)
+                merged.setdefault(key, {k: str(item[k]).strip() for k in TRIPLE_FIELDS})
+        return list(merged.values())
+
+    def extract_document(self, text, title=None, max_workers=None):
+        """
+        长文档抽取：按条款边界分块，最多 max_workers 个分块并发调用 LLM，合并去重后返回三元组。
+        title 缺省时取文档第一行非空文本。
+        """
+        if title is None:
+            title = next((line.strip() for line in text.splitlines() if line.strip()), None)
+        chunks = chunk_text(text, self.chunk_max_chars, self.chunk_overlap_chars)
+        if not chunks:
             return []
+        workers = min(max_workers or self.max_workers, len(chunks))
+        logger.info(f"文档共 {len(text)} 字，切分为 {len(chunks)} 个分块，{workers} 个并发")
+
+        start = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract") as pool:
+            results = list(pool.map(lambda chunk: self.extract_triples(chunk.text, title), chunks))
+        triples = self.merge_triples(results)
+        logger.info(
+            f"分块抽取完成：{sum(len(r) for r in results)} 个三元组，去重后 {len(triples)} 个，"
+            f"耗时 {time.monotonic() - start:.1f}s"
+        )
+        return triples
 
-    def save_to_neo4j(self, triples):
+    def ingest_document(self, text, doc_id, title=None, max_workers=None):
         """
-        将三元组写入 Neo4j
+        增量导入一个文档：分块后先查抽取缓存，只有新增 / 修改的分块调用 LLM；
+        写入本次的三元组，并撤回上次导入有、本次没有的三元组（对应的条款已删除或修改）。
+        有分块抽取失败时只写入、不撤回，也不更新清单，下次导入会重试失败的分块。
+        有写入或撤回时更新图谱版本号。写入或撤回有批次失败时抛出 TripleWriteError，不更新清单，下次导入重试。
+        Returns:
+            {"chunks", "cached", "extracted", "failed", "triples", "written", "retracted", "elapsed_s"}
         """
-        if not triples:
-            return
+        start = time.monotonic()
+        extraction = self.extract_incremental(text, doc_id, title, max_workers)
+        written = 0
+        try:
+            written = self.save_to_neo4j(extraction["triples"], source=doc_id)
+            retracted = self.commit_document(doc_id, extraction)
+        except TripleWriteError as e:
+            if written or e.written:
+                self.bump_graph_version()
+            raise
+        if written or retracted:
+            self.bump_graph_version()
 
-        with self.driver.session() as session:
-            for item in triples:
+        report = {
+            **{k: v for k, v in extraction.items() if k not in ("keys", "triples")},
+            "triples": len(extraction["triples"]),
+            "written": written,
+            "retracted": retracted,
+            "elapsed_s": round(time.monotonic() - start, 2),
+        }
+        logger.info(f"{doc_id} 导入完成: {report}")
+        return report
+
+    def extract_incremental(self, text, doc_id, title=None, max_workers=None):
+        """
+        导入的抽取阶段（不写图谱）：分块、查抽取缓存、并发抽取未命中的分块并写回缓存。
+        合并后的三元组经过实体消歧（缓存中保存的是消歧前的原始抽取结果，文档清单中是消歧后的）。
+        Returns:
+            {"keys": 分块缓存 key 列表, "triples": 合并去重后的三元组, "chunks", "cached", "extracted", "failed", "resolved"}
+        """
+        if title is None:
+            title = next((line.strip() for line in text.splitlines() if line.strip()), None)
+        chunks = chunk_text(text, self.chunk_max_chars, self.chunk_overlap_chars)
+        keys = [chunk_key(c.text, EXTRACTION_PROMPT_VERSION, self.llm.model_name, title) for c in chunks]
+
+        results = [self.cache.get(k) if self.cache is not None else None for k in keys]
+        pending = [i for i, r in enumerate(results) if r is None]
+        cached = len(chunks) - len(pending)
+        failed = 0
+        if pending:
+            workers = min(max_workers or self.max_workers, len(pending))
+            logger.info(f"{doc_id}: {len(chunks)} 个分块，缓存命中 {cached} 个，{len(pending)} 个需要抽取（{workers} 个并发）")
+
+            def _run(i):
                 try:
-                    # 动态构建 Cypher (MERGE 防止重复)
-                    # 注意：这里为了简化，我们假设 head 都是 Insurance 类型，实际可根据 item['type'] 动态调整
-                    cypher = f"""
-                    MERGE (h:{item['type']} {{name: $head_name}})
-                    MERGE (t:{item['tail_type']} {{name: $tail_name}})
-                    MERGE (h)-[:{item['relation']}]->(t)
+                    return i, self._extract(chunks[i].text, title)
+                except Exception:
+                    return i, None
+
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="extract") as pool:
+                for i, triples in pool.map(_run, pending):
+                    if triples is None:
+                        failed += 1
+                        continue
+                    results[i] = triples
+                    if self.cache is not None:
+                        self.cache.put(keys[i], triples)
+
+        triples, resolved = self.resolve_entities(self.merge_triples(r for r in results if r is not None))
+        return {
+            "keys": keys,
+            "triples": triples,
+            "chunks": len(chunks),
+            "cached": cached,
+            "extracted": len(pending) - failed,
+            "failed": failed,
+            "resolved": resolved,
+        }
+
+    def commit_document(self, doc_id, extraction):
+        """
+        导入的收尾阶段（三元组写入之后调用）：撤回上次导入有、本次没有的三元组，并更新文档清单。
+        有分块抽取失败时跳过。返回删除的关系数量。
+        """
+        if extraction["failed"]:
+            logger.warning(f"{doc_id}: {extraction['failed']} 个分块抽取失败，本次不撤回旧三元组，下次导入时重试")
+            return 0
+        if self.cache is None:
+            return 0
+        retracted = 0
+        manifest = self.cache.get_manifest(doc_id)
+        if manifest is not None:
+            current = {tuple(t[k] for k in TRIPLE_FIELDS) for t in extraction["triples"]}
+            stale = [t for t in manifest["triples"] if tuple(t[k] for k in TRIPLE_FIELDS) not in current]
+            retracted = self.retract_triples(stale, source=doc_id)
+        self.cache.save_manifest(doc_id, extraction["keys"], extraction["triples"])
+        return retracted
+
+    def bump_graph_version(self):
+        """图谱有写入或撤回后更新版本号，使预计算回答、/stats 等依赖图谱内容的缓存失效；更新失败只记录警告。"""
+        try:
+            return write_graph_version(self.driver)
+        except Exception as e:
+            logger.warning(f"更新图谱版本号失败，依赖图谱的缓存可能返回旧数据: {e}")
+            return None
+
+    @staticmethod
+    def group_triples(triples):
+        """
+        按 (头标签, 关系, 尾标签) 分组，返回 ({(head_label, relation, tail_label): [{"head", "tail", "source"}, ...]}, 被拒绝的数量)。
+        标签或关系类型不在白名单内、或缺少实体名的三元组被拒绝。三元组可带 source 字段（来源文档 ID）。
+        """
+        groups = defaultdict(dict)
+        rejected = 0
+        for item in triples or []:
+            head_label, relation, tail_label = item.get("type"), item.get("relation"), item.get("tail_type")
+            head, tail = str(item.get("head") or "").strip(), str(item.get("tail") or "").strip()
+            if (head_label not in ALLOWED_LABELS or tail_label not in ALLOWED_LABELS
+                    or relation not in ALLOWED_RELATIONS or not head or not tail):
+                rejected += 1
+                logger.debug(f"三元组不符合 Schema，已跳过: {item}")
+                continue
+            source = item.get("source")
+            groups[(head_label, relation, tail_label)][(head, tail, source)] = {"head": head, "tail": tail, "source": source}
+        return {key: list(rows.values()) for key, rows in groups.items()}, rejected
+
+    def _ensure_indexes(self, session):
+        for label in _INDEXED_LABELS:
+            session.run(f"CREATE INDEX IF NOT EXISTS FOR (n:{label}) ON (n.name)")
+
+    def save_to_neo4j(self, triples, batch_size=1000, source=None):
+        """
+        将三元组写入 Neo4j：按 (头标签, 关系, 尾标签) 分组，每组每 batch_size 条用一条参数化的
+        UNWIND 语句在一个显式写事务中完成（MERGE 防止重复）。返回写入的三元组数量。
+        source 为来源文档 ID（三元组自带的 source 字段优先），记录在关系的 sources 属性中，撤回时只移除该文档的来源。
+        多个文档的三元组可以合并在一次调用中写入。
+        有批次写入失败时，其余批次照常写入，最后抛出 TripleWriteError（failed_sources 为失败批次涉及的文档）。
+        """
+        if source is not None:
+            triples = [{**t, "source": t.get("source") or source} for t in triples]
+        groups, rejected = self.group_triples(triples)
+        if rejected:
+            logger.warning(f"{rejected} 个三元组的标签或关系类型不在允许的 Schema 内，已跳过")
+        if not groups:
+            return 0
+
+        start = time.monotonic()
+        written = 0
+        failed, failed_sources = 0, set()
+        with self.driver.session() as session:
+            self._ensure_indexes(session)
+            for (head_label, relation, tail_label), rows in groups.items():
+                cypher = f"""
+                UNWIND $rows AS row
+                MERGE (h:{head_label} {{name: row.head}})
+                MERGE (t:{tail_label} {{name: row.tail}})
+                MERGE (h)-[r:{relation}]->(t)
+                SET r.sources = CASE
+                    WHEN row.source IS NULL OR row.source IN coalesce(r.sources, []) THEN r.sources
+                    ELSE coalesce(r.sources, []) + row.source END
+                """
+                for i in range(0, len(rows), batch_size):
+                    batch = rows[i:i + batch_size]
+                    try:
+                        session.execute_write(lambda tx: tx.run(cypher, rows=batch).consume())
+                        written += len(batch)
+                    except Exception as e:
+                        logger.error(f"写入 Neo4j 失败 ({head_label})-[{relation}]->({tail_label}): {e}")
+                        failed += len(batch)
+                        failed_sources.update(row["source"] for row in batch)
+        logger.info(f"写入图谱：{written} 个三元组，{len(groups)} 组，耗时 {time.monotonic() - start:.2f}s")
+        if failed:
+            raise TripleWriteError(f"{failed} 个三元组写入 Neo4j 失败", written, failed_sources)
+        return written
+
+    def retract_triples(self, triples, source, batch_size=1000):
+        """
+        撤回来源文档 source 的三元组：从关系的 sources 中移除该文档，没有其他来源时删除关系；
+        没有 sources 属性的关系（结构化数据导入的）不受影响。
+        仅由条款抽取产生的孤立节点（AgeRange / Exclusion）一并删除。返回删除的关系数量。
+        有批次失败时抛出 TripleWriteError（调用方不应更新文档清单，下次导入重试撤回）。
+        """
+        groups, _ = self.group_triples(triples)
+        if not groups:
+            return 0
+
+        deleted = 0
+        failed = 0
+        with self.driver.session() as session:
+            for (head_label, relation, tail_label), rows in groups.items():
+                cypher = f"""
+                UNWIND $rows AS row
+                MATCH (h:{head_label} {{name: row.head}})-[r:{relation}]->(t:{tail_label} {{name: row.tail}})
+                WHERE r.sources IS NOT NULL
+                SET r.sources = [s IN r.sources WHERE s <> $source]
+                WITH r WHERE size(r.sources) = 0
+                DELETE r
+                RETURN count(r) AS deleted
+                """
+                for i in range(0, len(rows), batch_size):
+                    batch = rows[i:i + batch_size]
+                    try:
+                        deleted += session.execute_write(
+                            lambda tx: tx.run(cypher, rows=batch, source=source).single()["deleted"]
+                        )
+                    except Exception as e:
+                        logger.error(f"撤回三元组失败 ({head_label})-[{relation}]->({tail_label}): {e}")
+                        failed += len(batch)
+                if tail_label in _INDEXED_LABELS:
+                    orphans = f"""
+                    UNWIND $names AS name
+                    MATCH (t:{tail_label} {{name: name}}) WHERE NOT (t)--()
+                    DELETE t
                     """
-                    session.run(cypher, head_name=item['head'], tail_name=item['tail'])
-                    logger.info(f"写入图谱: ({item['head']}) -[{item['relation']}]-> ({item['tail']})")
-                except Exception as e:
-                    logger.error(f"写入 Neo4j 失败: {e}")
+                    names = list({row["tail"] for row in rows})
+                    session.execute_write(lambda tx: tx.run(orphans, names=names).consume())
+        logger.info(f"撤回 {source} 的 {len(triples)} 个三元组，删除关系 {deleted} 条")
+        if failed:
+            raise TripleWriteError(f"{source}: {failed} 个三元组撤回失败", deleted, {source})
+        return deleted
 
 def main():
-    # 读取文本文件
-    file_path = "data/raw_text/sample_policy.txt"
+    # 读取文本文件（可通过命令行参数指定）：python -m src.kg_construction.text_graph_builder [path]
+    file_path = sys.argv[1] if len(sys.argv) > 1 else "data/raw_text/sample_policy.txt"
     if not os.path.exists(file_path):
         logger.error(f"找不到文件: {file_path}")
         return
@@ -102,10 +416,8 @@ def main():
 
     builder = TextGraphBuilder()
     try:
-        # 1. 提取
-        triples = builder.extract_triples(text_content)
-        # 2. 写入
-        builder.save_to_neo4j(triples)
+        # 分块并发抽取（命中抽取缓存的分块跳过 LLM）→ 写入 → 撤回已删除条款的三元组
+        builder.ingest_document(text_content, doc_id=file_path)
         logger.info("=== 全部处理完成 ===")
     finally:
         builder.close()
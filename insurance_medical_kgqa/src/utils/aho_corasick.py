@@ -0,0 +1,106 @@
+# Aho-Corasick 多模式串匹配：词表编译成自动机后，一次扫描文本即可找出所有词，耗时与文本长度线性相关（与词表大小无关）
+from collections import deque
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+def _is_word_char(ch: str) -> bool:
+    return ch.isascii() and ch.isalnum()
+
+
+class AhoCorasick:
+    """
+    用法：add() 加入全部词 → build() → find_all() / find_longest()。
+    同一个词重复加入时保留第一次的 value。build() 之后再 add() 需要重新 build()。
+    """
+
+    def __init__(self):
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # 在该状态结束的词：(词长, value)，没有则为 None
+        self._own: List[Optional[Tuple[int, Any]]] = [None]
+        # 每个状态结束的所有词（含 fail 链上的），按词长降序：((词长, value), ...)，build() 时生成
+        self._out: List[Tuple[Tuple[int, Any], ...]] = [()]
+        self._size = 0
+        self._built = True
+
+    def __len__(self) -> int:
+        return self._size
+
+    def add(self, word: str, value: Any = None) -> bool:
+        """加入一个词，已存在时返回 False。"""
+        if not word:
+            return False
+        state = 0
+        for ch in word:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._own.append(None)
+            state = nxt
+        if self._own[state] is not None:
+            return False
+        self._own[state] = (len(word), value)
+        self._size += 1
+        self._built = False
+        return True
+
+    def build(self) -> None:
+        """按 BFS 计算 fail 指针，并把 fail 链上的输出合并到各状态。"""
+        goto, fail = self._goto, self._fail
+        own = [(o,) if o is not None else () for o in self._own]
+        out = [()] * len(goto)
+        queue = deque()
+        for nxt in goto[0].values():
+            fail[nxt] = 0
+            out[nxt] = own[nxt]
+            queue.append(nxt)
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in goto[state].items():
+                f = fail[state]
+                while f and ch not in goto[f]:
+                    f = fail[f]
+                fail[nxt] = goto[f].get(ch, 0)
+                out[nxt] = own[nxt] + out[fail[nxt]]
+                queue.append(nxt)
+        self._out = out
+        self._built = True
+
+    def find_all(self, text: str) -> Iterator[Tuple[int, int, Any]]:
+        """逐个产出所有匹配（可能重叠）：(start, end, value)，按 end 递增。"""
+        if not self._built:
+            self.build()
+        goto, fail, outs = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, value in outs[state]:
+                yield i + 1 - length, i + 1, value
+
+    def find_longest(self, text: str, word_boundary: bool = False) -> List[Tuple[int, int, Any]]:
+        """
+        不重叠的匹配：从左到右，每个位置取最长的词（与逐位置最长匹配的结果一致），返回 [(start, end, value), ...]。
+        word_boundary 为 True 时，以英文字母 / 数字开头或结尾的词两侧不能紧挨英文字母 / 数字（避免 "CT" 匹配 "ACTH"）。
+        """
+        longest: Dict[int, Tuple[int, Any]] = {}
+        for start, end, value in self.find_all(text):
+            if word_boundary and (
+                (start > 0 and _is_word_char(text[start]) and _is_word_char(text[start - 1]))
+                or (end < len(text) and _is_word_char(text[end - 1]) and _is_word_char(text[end]))
+            ):
+                continue
+            if end - start > longest.get(start, (0, None))[0]:
+                longest[start] = (end - start, value)
+        found = []
+        cursor = 0
+        for start in sorted(longest):
+            if start >= cursor:
+                length, value = longest[start]
+                found.append((start, start + length, value))
+                cursor = start + length
+        return found
@@ -0,0 +1,48 @@
+# 请求截止时间：由准入控制在请求入口设置，LLM 调用与 Cypher 查询的超时都不超过剩余时间
+#
+# 用法：
+#   with deadline_scope(time.monotonic() + 30):
+#       timeout = bounded_timeout(30.0)   # 剩余时间不足 30s 时返回剩余时间，已超时抛出 DeadlineExceeded
+#
+# 基于 contextvars：推测检索、对冲请求等通过 copy_context 提交到线程池的任务会继承截止时间。
+import contextvars
+import time
+from contextlib import contextmanager
+from typing import Iterator, Optional
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("request_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """请求的截止时间已过。"""
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[float]) -> Iterator[None]:
+    """在当前上下文中设置截止时间（time.monotonic() 的绝对值）；None 表示不限时。"""
+    token = _deadline.set(deadline)
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining() -> Optional[float]:
+    """距截止时间的剩余秒数（可能为负）；未设置截止时间时返回 None。"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def expired() -> bool:
+    rem = remaining()
+    return rem is not None and rem <= 0
+
+
+def bounded_timeout(timeout: float) -> float:
+    """把单次调用的超时限制在剩余时间内；已超时则抛出 DeadlineExceeded。"""
+    rem = remaining()
+    if rem is None:
+        return timeout
+    if rem <= 0:
+        raise DeadlineExceeded("请求已超过截止时间")
+    return min(timeout, rem)
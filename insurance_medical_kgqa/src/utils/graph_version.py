@@ -0,0 +1,39 @@
+# 图谱版本号：每次导入数据后写入 (:GraphMeta {id: 'graph'}) 节点，依赖图谱内容的缓存按版本号失效
+import time
+import uuid
+from typing import Optional
+
+from src.utils.logger import logger
+
+# 旧图谱（没有 GraphMeta 节点）统一视为这个版本
+UNVERSIONED = "unversioned"
+
+_READ_VERSION = "MATCH (m:GraphMeta {id: 'graph'}) RETURN m.version AS version"
+_WRITE_VERSION = """
+MERGE (m:GraphMeta {id: 'graph'})
+SET m.version = $version, m.updated_at = datetime()
+"""
+
+
+def new_graph_version() -> str:
+    return f"{time.strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:8]}"
+
+
+def read_graph_version(driver) -> str:
+    """读取当前图谱版本号；读取失败或未写入过时返回 UNVERSIONED。"""
+    try:
+        with driver.session() as session:
+            record = session.run(_READ_VERSION).single()
+    except Exception as e:
+        logger.warning(f"读取图谱版本号失败: {e}")
+        return UNVERSIONED
+    return (record["version"] if record else None) or UNVERSIONED
+
+
+def write_graph_version(driver, version: Optional[str] = None) -> str:
+    """写入新的图谱版本号（数据导入或增量写入完成后调用），返回写入的版本号。"""
+    version = version or new_graph_version()
+    with driver.session() as session:
+        session.run(_WRITE_VERSION, version=version)
+    logger.info(f"图谱版本号已更新: {version}")
+    return version
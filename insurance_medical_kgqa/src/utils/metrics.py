@@ -0,0 +1,216 @@
+# Prometheus 指标：进程内的计数器 / 直方图 / 仪表盘，由 /metrics 以 Prometheus 文本格式导出
+#
+# 用法：
+#   REQUESTS = counter("kgqa_http_requests_total", "HTTP 请求数", ["endpoint", "status"])
+#   REQUESTS.inc(endpoint="/chat", status="200")
+#   LATENCY = histogram("kgqa_http_request_duration_seconds", "HTTP 请求耗时", ["endpoint"])
+#   LATENCY.observe(0.42, endpoint="/chat")
+#   register_collector(fn)   # 抓取时才计算的指标（缓存命中率、连接池占用等），fn 返回 [(name, type, help, labels, value)]
+#
+# 不依赖 prometheus_client，格式遵循 text exposition format 0.0.4。
+import math
+import threading
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from src.utils.logger import logger
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 默认耗时桶（秒）：覆盖 Cypher（毫秒级）到 LLM 生成（数十秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# 抓取时计算的指标：(name, type, help, labels, value)
+Sample = Tuple[str, str, str, Dict[str, str], float]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    type = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(n, "")) for n in self.label_names)
+
+    def _labels(self, key: Tuple[str, ...]) -> Dict[str, str]:
+        return dict(zip(self.label_names, key))
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def __init__(self, name, help_text, label_names=()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(k))} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(_Metric):
+    type = "gauge"
+
+    def __init__(self, name, help_text, label_names=()):
+        super().__init__(name, help_text, label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self._labels(k))} {_format_value(v)}" for k, v in items]
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help_text, label_names=(), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [各桶计数（非累计，最后一个为 +Inf）, sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        idx = len(self.buckets)
+        for i, upper in enumerate(self.buckets):
+            if value <= upper:
+                idx = i
+                break
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][idx] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = [(k, (list(v[0]), v[1], v[2])) for k, v in self._values.items()]
+        lines = []
+        for key, (counts, total, count) in items:
+            labels = self._labels(key)
+            cumulative = 0
+            for upper, n in zip(self.buckets + (math.inf,), counts):
+                cumulative += n
+                le = "+Inf" if math.isinf(upper) else _format_value(upper)
+                lines.append(f"{self.name}_bucket{_format_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+_registry: Dict[str, _Metric] = {}
+_collectors: List[Callable[[], Iterable[Sample]]] = []
+_registry_lock = threading.Lock()
+
+
+def _register(cls, name: str, help_text: str, label_names: Sequence[str], **kwargs):
+    """同名指标只创建一次（模块被重复导入、多个实例共用同一指标时返回已有对象）。"""
+    with _registry_lock:
+        metric = _registry.get(name)
+        if metric is None:
+            metric = _registry[name] = cls(name, help_text, label_names, **kwargs)
+        return metric
+
+
+def counter(name: str, help_text: str, label_names: Sequence[str] = ()) -> Counter:
+    return _register(Counter, name, help_text, label_names)
+
+
+def gauge(name: str, help_text: str, label_names: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge, name, help_text, label_names)
+
+
+def histogram(name: str, help_text: str, label_names: Sequence[str] = (),
+              buckets: Optional[Sequence[float]] = None) -> Histogram:
+    return _register(Histogram, name, help_text, label_names, buckets=buckets or DEFAULT_BUCKETS)
+
+
+def register_collector(fn: Callable[[], Iterable[Sample]]) -> None:
+    with _registry_lock:
+        _collectors.append(fn)
+
+
+def render() -> str:
+    """导出全部指标（Prometheus 文本格式）。"""
+    with _registry_lock:
+        metrics = list(_registry.values())
+        collectors = list(_collectors)
+
+    lines: List[str] = []
+    for metric in metrics:
+        lines.extend(metric.header())
+        lines.extend(metric.render())
+
+    # 同名指标的样本必须连续输出，先按名称归组（保持首次出现的顺序）
+    grouped: Dict[str, Tuple[str, str, List[str]]] = {}
+    for fn in collectors:
+        try:
+            samples = list(fn())
+        except Exception as e:
+            logger.warning(f"指标采集失败 {getattr(fn, '__name__', fn)}: {e}")
+            continue
+        for name, metric_type, help_text, labels, value in samples:
+            if value is None:
+                continue
+            entry = grouped.setdefault(name, (metric_type, help_text, []))
+            entry[2].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+    for name, (metric_type, help_text, sample_lines) in grouped.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        lines.extend(sample_lines)
+    return "\n".join(lines) + "\n"
+
+
+# === 各模块共用的指标 ===
+LLM_CALL_SECONDS = histogram(
+    "kgqa_llm_call_duration_seconds", "LLM 调用耗时（含重试；缓存命中不计入）", ["caller", "outcome"]
+)
+LLM_CALLS = counter("kgqa_llm_calls_total", "LLM 调用次数", ["caller", "outcome", "source"])
+LLM_TOKENS = counter("kgqa_llm_tokens_total", "LLM 消耗的 token 数", ["caller", "kind"])
+CYPHER_SECONDS = histogram("kgqa_cypher_query_duration_seconds", "Cypher 查询耗时（按查询模板）", ["template"])
+CYPHER_ERRORS = counter("kgqa_cypher_query_errors_total", "Cypher 查询失败次数（按查询模板）", ["template"])
+NEO4J_SESSIONS_ACTIVE = gauge("kgqa_neo4j_sessions_active", "正在使用的 Neo4j 会话数（每个会话占用一个连接池连接）")
+NEO4J_SESSIONS_ACTIVE.set(0)
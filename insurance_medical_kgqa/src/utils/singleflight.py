@@ -0,0 +1,69 @@
+# Single-flight：相同 key 的并发调用合并为一次执行，其余调用方共享同一个 Future
+import copy
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+class SingleFlight:
+    """
+    同一时刻相同 key 只执行一次 fn，其他并发调用方阻塞等待并共享结果（或异常）。
+    调用结束后 key 即被移除，之后的调用会重新执行（缓存由调用方自己负责）。
+    """
+
+    def __init__(self, name: str = "singleflight", copy_results: bool = True):
+        """
+        Args:
+            name: 名称，仅用于统计展示。
+            copy_results: 是否给等待方返回结果的深拷贝，防止调用方之间互相修改同一个 dict。
+        """
+        self.name = name
+        self.copy_results = copy_results
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, Future] = {}
+        self._stats = {"executed": 0, "shared": 0}
+
+    def do(self, key: Hashable, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Any:
+        """执行 fn(*args, **kwargs)；若相同 key 的调用正在进行，则等待其结果。"""
+        return self.execute(key, fn, *args, **kwargs)[0]
+
+    def execute(self, key: Hashable, fn: Callable[..., Any], /, *args: Any, **kwargs: Any) -> Tuple[Any, bool]:
+        """同 do，但额外返回 shared：True 表示结果来自其他调用方发起的执行。"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self._stats["executed"] += 1
+            else:
+                self._stats["shared"] += 1
+
+        if not leader:
+            result = future.result()
+            return (copy.deepcopy(result) if self.copy_results else result), True
+
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._calls.pop(key, None)
+        future.set_result(result)
+        # Future 中保存原始结果，领头调用方同样拿拷贝，避免它修改结果时影响仍在拷贝的等待方
+        return (copy.deepcopy(result) if self.copy_results else result), False
+
+    def in_flight(self) -> int:
+        """当前正在执行的 key 数量。"""
+        with self._lock:
+            return len(self._calls)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["in_flight"] = len(self._calls)
+        stats["name"] = self.name
+        return stats
@@ -0,0 +1,165 @@
+# 轻量级链路追踪：基于 contextvars 的嵌套 span，记录各阶段 / Cypher 查询 / LLM 调用的耗时
+#
+# 用法：
+#   with trace("rag.chat") as root:        # 一次请求的根 span，结束时输出一行耗时汇总日志
+#       with span("retrieve"):             # 嵌套阶段，自动挂到当前 span 下
+#           ...
+#   root.to_dict()                          # 完整的 span 树，可返回给前端调试
+#
+# 安装了 opentelemetry-api 且 tracing.opentelemetry 为 true 时，每个 span 同时上报到 OpenTelemetry。
+import contextvars
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+from src.utils.config_loader import config
+from src.utils.logger import logger
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # 可选依赖
+    otel_trace = None
+
+_tracing_conf = config.get("tracing", {}) or {}
+TRACING_ENABLED = bool(_tracing_conf.get("enabled", True))
+LOG_SPANS = bool(_tracing_conf.get("log_spans", True))
+# 只输出总耗时不低于该值的请求（毫秒），0 表示全部输出
+SLOW_REQUEST_MS = float(_tracing_conf.get("slow_request_ms", 0))
+
+_otel_tracer = None
+if _tracing_conf.get("opentelemetry", False):
+    if otel_trace is None:
+        logger.warning("tracing.opentelemetry 已开启，但未安装 opentelemetry-api，仅输出到日志")
+    else:
+        _otel_tracer = otel_trace.get_tracer("insurance_medical_kgqa")
+
+_current_span: contextvars.ContextVar[Optional["Span"]] = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """一个计时区间；子 span 可能来自其他线程（如推测检索），追加时加锁。"""
+
+    def __init__(self, name: str, parent: Optional["Span"] = None, **attributes: Any):
+        self.name = name
+        self.parent = parent
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.children: List["Span"] = []
+        self.error: Optional[str] = None
+        self.start = time.monotonic()
+        self.end: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def _add_child(self, child: "Span") -> None:
+        with self._lock:
+            self.children.append(child)
+
+    @property
+    def duration_ms(self) -> Optional[float]:
+        return None if self.end is None else (self.end - self.start) * 1000
+
+    def to_dict(self, _origin: Optional[float] = None) -> Dict[str, Any]:
+        """span 树；offset_ms 为相对根 span 开始的偏移，未结束的 span duration_ms 为 None。"""
+        origin = self.start if _origin is None else _origin
+        with self._lock:
+            children = list(self.children)
+        data: Dict[str, Any] = {
+            "name": self.name,
+            "offset_ms": round((self.start - origin) * 1000, 1),
+            "duration_ms": None if self.duration_ms is None else round(self.duration_ms, 1),
+        }
+        if self.attributes:
+            data["attributes"] = dict(self.attributes)
+        if self.error:
+            data["error"] = self.error
+        if children:
+            data["children"] = [c.to_dict(origin) for c in children]
+        return data
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """按名称汇总所有后代 span：{name: {"count", "total_ms"}}。"""
+        totals: Dict[str, Dict[str, float]] = {}
+        queue = [self]
+        for node in queue:  # 广度优先，保持各阶段的先后顺序
+            with node._lock:
+                children = list(node.children)
+            for child in children:
+                entry = totals.setdefault(child.name, {"count": 0, "total_ms": 0.0})
+                entry["count"] += 1
+                entry["total_ms"] = round(entry["total_ms"] + (child.duration_ms or 0.0), 1)
+                queue.append(child)
+        return totals
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def _activate(s: Span) -> Iterator[Span]:
+    """把 s 设为当前 span（挂到父 span 下），退出时记录结束时间与异常。"""
+    if s.parent is not None:
+        s.parent._add_child(s)
+    token = _current_span.set(s)
+    with ExitStack() as stack:
+        otel_span = stack.enter_context(_otel_tracer.start_as_current_span(s.name)) if _otel_tracer else None
+        try:
+            yield s
+        except BaseException as e:
+            s.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            s.end = time.monotonic()
+            _current_span.reset(token)
+            if otel_span is not None:
+                for key, value in s.attributes.items():
+                    if value is None:
+                        continue
+                    otel_span.set_attribute(key, value if isinstance(value, (str, bool, int, float)) else str(value))
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Optional[Span]]:
+    """
+    在当前 span 下创建子 span。没有进行中的 trace 且未接入 OpenTelemetry 时不做任何记录，返回 None。
+    """
+    parent = _current_span.get()
+    if not TRACING_ENABLED or (parent is None and _otel_tracer is None):
+        yield None
+        return
+    with _activate(Span(name, parent, **attributes)) as s:
+        yield s
+
+
+@contextmanager
+def trace(name: str, **attributes: Any) -> Iterator[Span]:
+    """
+    一次请求的根 span：总会返回 Span 对象（未开启追踪时只记录总耗时），
+    结束时按配置输出一行汇总日志。
+    """
+    root = Span(name, **attributes)
+    if not TRACING_ENABLED:
+        try:
+            yield root
+        finally:
+            root.end = time.monotonic()
+        return
+    try:
+        with _activate(root):
+            yield root
+    finally:
+        if LOG_SPANS and root.duration_ms is not None and root.duration_ms >= SLOW_REQUEST_MS:
+            logger.info(f"⏱️ {format_summary(root)}")
+
+
+def format_summary(root: Span) -> str:
+    """一行汇总：总耗时 + 各 span 名称的次数与累计耗时。"""
+    parts = [
+        f"{name}{'×%d' % entry['count'] if entry['count'] > 1 else ''} {entry['total_ms']:.0f}ms"
+        for name, entry in root.summary().items()
+    ]
+    total = root.duration_ms or 0.0
+    return f"{root.name} {total:.0f}ms" + (f" | {', '.join(parts)}" if parts else "")
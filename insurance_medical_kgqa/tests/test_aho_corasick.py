@@ -0,0 +1,68 @@
+# Aho-Corasick 自动机的单元测试
+import random
+
+from src.utils.aho_corasick import AhoCorasick
+
+
+def _automaton(words):
+    ac = AhoCorasick()
+    for word, value in words.items():
+        ac.add(word, value)
+    ac.build()
+    return ac
+
+
+def _naive_longest(text, words):
+    """逐位置取最长词的朴素实现，作为对照。"""
+    found, i = [], 0
+    while i < len(text):
+        match = max((w for w in words if text.startswith(w, i)), key=len, default=None)
+        if match:
+            found.append((i, i + len(match), words[match]))
+            i += len(match)
+        else:
+            i += 1
+    return found
+
+
+def test_find_all_reports_overlapping_matches():
+    ac = _automaton({"he": 1, "she": 2, "his": 3, "hers": 4})
+    assert sorted(ac.find_all("ushers")) == [(1, 4, 2), (2, 4, 1), (2, 6, 4)]
+
+
+def test_find_longest_prefers_longest_at_each_position():
+    ac = _automaton({"高血压": "Disease", "老年人高血压": "Disease", "血压计": "Device", "阿司匹林": "Drug"})
+    text = "老年人高血压可以吃阿司匹林吗，血压计怎么用"
+    assert ac.find_longest(text) == [(0, 6, "Disease"), (9, 13, "Drug"), (15, 18, "Device")]
+
+
+def test_duplicate_word_keeps_first_value():
+    ac = AhoCorasick()
+    assert ac.add("糖尿病", "Disease")
+    assert not ac.add("糖尿病", "Symptom")
+    assert len(ac) == 1
+    assert ac.find_longest("糖尿病") == [(0, 3, "Disease")]
+
+
+def test_word_boundary_for_ascii_words():
+    ac = _automaton({"CT": "Check", "ACTH": "Hormone"})
+    assert ac.find_longest("做CT检查", word_boundary=True) == [(1, 3, "Check")]
+    assert ac.find_longest("ACTHX偏高", word_boundary=True) == []
+    assert ac.find_longest("ACTH偏高", word_boundary=True) == [(0, 4, "Hormone")]
+
+
+def test_add_after_build_rebuilds():
+    ac = _automaton({"头痛": 1})
+    ac.add("头痛欲裂", 2)
+    assert ac.find_longest("头痛欲裂") == [(0, 4, 2)]
+
+
+def test_matches_naive_longest_on_random_text():
+    rng = random.Random(7)
+    alphabet = "abcd"
+    words = {"".join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))): i for i in range(30)}
+    ac = _automaton(words)
+    for _ in range(200):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        expected = [(s, e, words[text[s:e]]) for s, e, _ in _naive_longest(text, words)]
+        assert ac.find_longest(text) == expected
@@ -0,0 +1,35 @@
+# 预计算回答库（PrecomputedAnswerStore）的单元测试
+from src.graph_rag.answer_store import PrecomputedAnswerStore, answer_key, normalize_question
+
+
+def _intent(question, **fields):
+    return {"intent": "disease_info", "disease": "高血压", "raw_query": question, **fields}
+
+
+def test_normalize_question_ignores_punctuation_and_width():
+    assert normalize_question(" 高血压吃什么药？") == normalize_question("高血压吃什么药")
+    assert normalize_question("ＣＯＰＤ怎么治") == normalize_question("copd怎么治")
+
+
+def test_same_intent_different_question_has_different_key():
+    assert answer_key(_intent("高血压吃什么药"), "v1") != answer_key(_intent("高血压有什么症状"), "v1")
+
+
+def test_key_depends_on_graph_version():
+    assert answer_key(_intent("高血压吃什么药"), "v1") != answer_key(_intent("高血压吃什么药"), "v2")
+
+
+def test_only_matching_question_hits():
+    store = PrecomputedAnswerStore(disk_path=None)
+    assert store.put("高血压吃什么药", _intent("高血压吃什么药"), "v1", "可以服用降压药", "ctx")
+    assert store.get(_intent("高血压吃什么药？"), "v1")["answer"] == "可以服用降压药"
+    assert store.get(_intent("高血压有什么症状"), "v1") is None
+    assert store.get(_intent("高血压吃什么药"), "v2") is None
+    stats = store.stats()
+    assert stats["lookups"] == 3 and stats["hits"] == 1
+
+
+def test_general_qa_and_empty_question_not_cacheable():
+    store = PrecomputedAnswerStore(disk_path=None)
+    assert not store.put("你好", {"intent": "general_qa", "raw_query": "你好"}, "v1", "你好", "")
+    assert not store.put("", _intent(""), "v1", "答", "ctx")
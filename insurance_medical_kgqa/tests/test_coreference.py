@@ -0,0 +1,95 @@
+# 本地指代消解（CoreferenceResolver）的单元测试
+import pytest
+
+from src.graph_rag.coreference import CoreferenceResolver
+from src.graph_rag.intent_rules import Gazetteer
+
+GAZETTEER = Gazetteer({
+    "city": ["北京", "上海", "重庆"],
+    "disease": ["高血压", "糖尿病"],
+    "drug": ["阿莫西林"],
+})
+
+NURSING_HISTORY = [
+    {"role": "user", "content": "北京有哪些养老院？"},
+    {"role": "assistant", "content": "1. **北京朝阳区福祐养老院**\n2. **北京海淀区颐养中心**"},
+]
+
+
+@pytest.fixture
+def resolver():
+    return CoreferenceResolver(gazetteer=GAZETTEER)
+
+
+def test_no_history_returns_query(resolver):
+    assert resolver.resolve("北京有哪些养老院", []) == "北京有哪些养老院"
+
+
+def test_ordinal_reference(resolver):
+    assert resolver.resolve("第一家的价格多少？", NURSING_HISTORY) == "北京朝阳区福祐养老院的价格多少？"
+
+
+def test_ordinal_out_of_range_falls_back(resolver):
+    assert resolver.resolve("第三家怎么样", NURSING_HISTORY) is None
+
+
+def test_ambiguous_singular_falls_back(resolver):
+    # 上一轮列出了两家，「这家」有歧义
+    assert resolver.resolve("这家离地铁近吗", NURSING_HISTORY) is None
+
+
+def test_swap_ellipsis(resolver):
+    assert resolver.resolve("那上海呢？", NURSING_HISTORY) == "上海有哪些养老院？"
+
+
+def test_complete_question_unchanged(resolver):
+    assert resolver.resolve("高血压吃什么药", NURSING_HISTORY) == "高血压吃什么药"
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("价格多少？", "北京养老院的价格多少？"),
+    ("地址在哪", "北京养老院的地址在哪"),
+    ("5000以下的有哪些？", "北京养老院中5000以下的有哪些？"),
+    ("70岁能入住吗", "北京养老院70岁能入住吗"),
+])
+def test_whitelisted_ellipsis_fills_topic(resolver, query, expected):
+    assert resolver.resolve(query, NURSING_HISTORY) == expected
+
+
+@pytest.mark.parametrize("query", ["谢谢", "你们是谁", "怎么申请理赔？", "能报销吗", "好的，明白了"])
+def test_greetings_and_topic_switches_fall_back_to_llm(resolver, query):
+    assert resolver.resolve(query, NURSING_HISTORY) is None
+
+
+SWAPPED_HISTORY = NURSING_HISTORY + [
+    {"role": "user", "content": "那上海呢？"},
+    {"role": "assistant", "content": "1. **上海徐汇区康乐养老院**\n2. **上海浦东颐养院**"},
+]
+
+
+def test_swap_turn_updates_topic(resolver):
+    # 历史中的「那上海呢？」按上一个问题补全后更新话题，不能沿用北京
+    assert resolver.resolve("价格多少？", SWAPPED_HISTORY) == "上海养老院的价格多少？"
+    assert resolver.resolve("那重庆呢", SWAPPED_HISTORY) == "重庆有哪些养老院？"
+
+
+def test_unresolved_swap_turn_drops_stale_topic(resolver):
+    history = [
+        {"role": "user", "content": "高血压吃什么药"},
+        {"role": "assistant", "content": "常用的降压药有……"},
+        {"role": "user", "content": "那上海呢？"},
+        {"role": "assistant", "content": "请问您想了解上海的什么信息？"},
+    ]
+    assert resolver.resolve("价格多少？", history) is None
+
+
+def test_last_intent_sets_topic_after_swap(resolver):
+    last_intent = {"intent": "nursing_home_search", "city": "上海", "raw_query": "上海有哪些养老院？"}
+    assert resolver.resolve("价格多少？", SWAPPED_HISTORY, last_intent) == "上海养老院的价格多少？"
+    assert resolver.resolve("那重庆呢", SWAPPED_HISTORY, last_intent) == "重庆有哪些养老院？"
+
+
+def test_last_intent_supplies_profile(resolver):
+    history = [{"role": "user", "content": "我妈妈身体不太好"}, {"role": "assistant", "content": "请问有什么疾病？"}]
+    last_intent = {"intent": "insurance_query", "age": 70, "disease": ["糖尿病"], "raw_query": "我妈妈身体不太好"}
+    assert resolver.resolve("她适合买什么保险", history, last_intent) == "70岁、患有糖尿病的老人适合买什么保险"
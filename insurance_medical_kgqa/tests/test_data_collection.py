@@ -0,0 +1,94 @@
+# 数据收集（DataCollector）解析快照与失效的单元测试
+import json
+import os
+
+import pytest
+
+from src.kg_construction import data_collection
+from src.kg_construction.data_collection import DataCollector, find_case_insensitive, parse_file
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "Data" / "diseases.json"
+    path.parent.mkdir()
+    path.write_text(json.dumps([{"name": "高血压"}], ensure_ascii=False), encoding="utf-8")
+    return path
+
+
+@pytest.fixture
+def parse_calls(monkeypatch):
+    calls = []
+
+    def counting_parse(path):
+        calls.append(path)
+        return parse_file(path)
+
+    monkeypatch.setattr(data_collection, "parse_file", counting_parse)
+    return calls
+
+
+def _collector(tmp_path):
+    return DataCollector(snapshot_dir=str(tmp_path / "snapshots"))
+
+
+def test_snapshot_reused_across_collectors(tmp_path, data_file, parse_calls):
+    assert _collector(tmp_path).load_file(str(data_file)) == [{"name": "高血压"}]
+    # 新实例（相当于新进程）命中磁盘快照，不再解析
+    assert _collector(tmp_path).load_file(str(data_file)) == [{"name": "高血压"}]
+    assert len(parse_calls) == 1
+
+
+def test_modified_file_invalidates_snapshot_and_memo(tmp_path, data_file, parse_calls):
+    collector = _collector(tmp_path)
+    collector.load_file(str(data_file))
+    data_file.write_text(json.dumps([{"name": "糖尿病"}, {"name": "冠心病"}], ensure_ascii=False), encoding="utf-8")
+    stat = data_file.stat()
+    os.utime(data_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    assert collector.load_file(str(data_file)) == [{"name": "糖尿病"}, {"name": "冠心病"}]
+    assert _collector(tmp_path).load_file(str(data_file)) == [{"name": "糖尿病"}, {"name": "冠心病"}]
+    assert len(parse_calls) == 2
+
+
+def test_snapshot_version_change_invalidates(tmp_path, data_file, parse_calls, monkeypatch):
+    _collector(tmp_path).load_file(str(data_file))
+    monkeypatch.setattr(data_collection, "SNAPSHOT_VERSION", data_collection.SNAPSHOT_VERSION + 1)
+    _collector(tmp_path).load_file(str(data_file))
+    assert len(parse_calls) == 2
+
+
+def test_corrupt_snapshot_falls_back_to_parsing(tmp_path, data_file, parse_calls):
+    collector = _collector(tmp_path)
+    collector.load_file(str(data_file))
+    collector._snapshot_path(data_file).write_bytes(b"not a pickle")
+    assert _collector(tmp_path).load_file(str(data_file)) == [{"name": "高血压"}]
+    assert len(parse_calls) == 2
+
+
+def test_csv_bom_and_case_insensitive_path(tmp_path):
+    path = tmp_path / "NursingHomes" / "homes.csv"
+    path.parent.mkdir()
+    path.write_text("名称,城市\n福祐养老院,北京\n", encoding="utf-8-sig")
+    assert find_case_insensitive(tmp_path / "nursinghomes" / "HOMES.csv") == path
+    collector = DataCollector(config={"nursing": ["nursinghomes/homes.csv"]})
+    collector.set_base_path(str(tmp_path))
+    assert collector.load_all() == {"nursing": {"homes": [{"名称": "福祐养老院", "城市": "北京"}]}}
+
+
+def test_returned_data_is_a_copy(tmp_path, data_file):
+    collector = _collector(tmp_path)
+    collector.load_file(str(data_file)).append({"name": "调用方修改"})
+    collector.load_files([str(data_file)])[str(data_file)][0]["name"] = "调用方修改"
+    assert collector.load_file(str(data_file)) == [{"name": "高血压"}]
+
+
+def test_load_files_parses_misses_in_process_pool(tmp_path, data_file):
+    other = data_file.parent / "drugs.json"
+    other.write_text(json.dumps([{"name": "阿莫西林"}], ensure_ascii=False), encoding="utf-8")
+    paths = [str(data_file), str(tmp_path / "missing.json"), str(other)]
+    collector = DataCollector(snapshot_dir=str(tmp_path / "snapshots"), max_workers=2)
+    expected = {str(data_file): [{"name": "高血压"}], str(other): [{"name": "阿莫西林"}]}
+    assert collector.load_files(paths) == expected
+    # 子进程的解析结果同样写入快照
+    assert collector._snapshot_path(other).exists()
+    assert _collector(tmp_path).load_files(paths) == expected
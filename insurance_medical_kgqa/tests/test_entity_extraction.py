@@ -0,0 +1,60 @@
+# 记录 schema 编译（compile_record_schema）与词典实体抽取（EntityExtractor）的单元测试
+import types
+
+from src.kg_construction.entity_extraction import EntityExtractor, compile_record_schema, get_compiled_schema
+
+SCHEMA = {
+    "symptom": [("Disease", "HAS_SYMPTOM", "Symptom")],
+    "drug": [("Disease", "TREATED_BY", "Drug")],
+    "cure_dept": [("Disease", "BELONGS_TO_DEPT", "Department")],
+}
+
+RECORDS = [
+    {"name": "高血压", "symptom": ["头痛", "", None, " 头晕 "], "drug": ["硝苯地平"], "cure_dept": "心内科"},
+    {"name": "  ", "symptom": ["发热"]},
+    {"name": "便秘", "symptom": [], "cure_dept": None},
+    {"symptom": ["咳嗽"]},
+]
+
+
+def test_compiled_schema_yields_triples_lazily():
+    extract = compile_record_schema(SCHEMA)
+    result = extract(iter(RECORDS))
+    assert isinstance(result, types.GeneratorType)
+    assert list(result) == [
+        ("高血压", "HAS_SYMPTOM", "头痛"),
+        ("高血压", "HAS_SYMPTOM", "头晕"),
+        ("高血压", "TREATED_BY", "硝苯地平"),
+        ("高血压", "BELONGS_TO_DEPT", "心内科"),
+    ]
+
+
+def test_typed_triples_and_head_field():
+    extract = compile_record_schema({"city": [("NursingHome", "LOCATED_IN", "City")]}, head_field="名称", typed=True)
+    assert list(extract([{"名称": "福祐养老院", "city": "北京"}])) == [
+        ("NursingHome", "LOCATED_IN", "City", "福祐养老院", "北京"),
+    ]
+
+
+def test_empty_schema_is_still_a_generator():
+    extract = compile_record_schema({})
+    assert list(extract(RECORDS)) == []
+
+
+def test_compiled_schema_is_cached():
+    assert get_compiled_schema(SCHEMA) is get_compiled_schema(dict(SCHEMA))
+    assert get_compiled_schema(SCHEMA) is not get_compiled_schema(SCHEMA, typed=True)
+
+
+def test_extract_triples_from_records_matches_compiled():
+    extractor = EntityExtractor(entries={})
+    assert list(extractor.extract_triples_from_records(RECORDS, SCHEMA)) == list(compile_record_schema(SCHEMA)(RECORDS))
+
+
+def test_extract_entities_and_co_occurrence():
+    extractor = EntityExtractor(entries={"Disease": ["高血压"], "Drug": ["硝苯地平"], "Symptom": ["头痛", "痛"]})
+    entities = extractor.extract_entities("高血压患者头痛时可服用硝苯地平")
+    assert [(e["type"], e["name"], e["span"]) for e in entities] == [
+        ("Disease", "高血压", (0, 3)), ("Symptom", "头痛", (5, 7)), ("Drug", "硝苯地平", (11, 15)),
+    ]
+    assert extractor.extract_triples_from_text("高血压患者头痛。可服用硝苯地平") == [("高血压", "HAS_SYMPTOM", "头痛")]
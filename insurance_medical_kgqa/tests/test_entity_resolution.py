@@ -0,0 +1,66 @@
+# 实体消歧（EntityResolver）的单元测试
+import pytest
+
+from src.kg_construction.entity_resolution import EntityResolver, normalize_name
+
+
+@pytest.fixture
+def resolver():
+    # 别名取自 data/entity_aliases.json
+    r = EntityResolver(similarity_threshold=0.85, aliases={"Disease": {
+        "恶性肿瘤": ["癌症", "癌"],
+        "慢性阻塞性肺疾病": ["慢阻肺", "COPD"],
+    }})
+    r.add_names("Disease", ["恶性肿瘤", "高血压", "1型糖尿病", "慢性阻塞性肺疾病"])
+    r.add_names("AgeRange", ["0-65岁"])
+    r.add_names("Insurance", ["泰康乐享重疾险"])
+    return r
+
+
+def test_normalize_name():
+    assert normalize_name("《恶性肿瘤》 ") == normalize_name("恶性肿瘤")
+    assert normalize_name("ＣＯＰＤ") == "copd"
+    assert normalize_name("0至65周岁", "AgeRange") == "0-65岁"
+
+
+def test_exact_and_alias(resolver):
+    assert resolver.resolve("恶性肿瘤。", "Disease") == "恶性肿瘤"
+    assert resolver.resolve("癌症", "Disease") == "恶性肿瘤"
+    assert resolver.resolve("copd", "Disease") == "慢性阻塞性肺疾病"
+    assert resolver.resolve("慢阻肺", "Disease") == "慢性阻塞性肺疾病"
+    assert resolver.resolve("0~65周岁", "AgeRange") == "0-65岁"
+
+
+def test_bracket_alias_only_when_inner_is_known(resolver):
+    assert resolver.resolve("恶性肿瘤（癌症）", "Disease") == "恶性肿瘤"
+    # 括号内是限定语，不合并
+    assert resolver.resolve("高血压（III级）", "Disease") == "高血压（III级）"
+
+
+def test_fuzzy_match_respects_threshold_and_digits(resolver):
+    assert resolver.resolve("慢性阻塞性肺疾患", "Disease") == "慢性阻塞性肺疾病"
+    # 多插入一个字后 Dice 相似度低于阈值，不合并
+    assert resolver.resolve("慢性阻塞性肺部疾病", "Disease") == "慢性阻塞性肺部疾病"
+    assert resolver.resolve("2型糖尿病", "Disease") == "2型糖尿病"
+    assert resolver.resolve("0-60岁", "AgeRange") == "0-60岁"
+
+
+def test_labels_are_separate(resolver):
+    assert resolver.resolve("癌症", "Exclusion") == "癌症"
+
+
+def test_new_entity_becomes_canonical(resolver):
+    assert resolver.resolve("帕金森病", "Disease") == "帕金森病"
+    assert resolver.resolve("帕金森病 ", "Disease") == "帕金森病"
+    assert resolver.stats()["new"] == 1
+
+
+def test_resolve_triples(resolver):
+    triples = [
+        {"head": "《泰康乐享重疾险》", "type": "Insurance", "relation": "ALLOWS_AGE", "tail": "0至65周岁", "tail_type": "AgeRange"},
+        {"head": "泰康乐享重疾险", "type": "Insurance", "relation": "COVERS", "tail": "癌症", "tail_type": "Disease"},
+    ]
+    resolved, rewritten = resolver.resolve_triples(triples)
+    assert rewritten == 3
+    assert [(t["head"], t["tail"]) for t in resolved] == [("泰康乐享重疾险", "0-65岁"), ("泰康乐享重疾险", "恶性肿瘤")]
+    assert triples[1]["tail"] == "癌症"
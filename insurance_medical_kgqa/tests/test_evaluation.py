@@ -0,0 +1,47 @@
+# 融合 / 分步模式评测与模拟 LLM 脚本的单元测试
+import json
+
+import pytest
+
+from src.api.mock_llm_server import MockScript
+from src.graph_rag.evaluation import compare_rewrite_parse_modes, normalize_intent
+
+
+class _FakeParser:
+    def parse(self, query):
+        return {"intent": "nursing_home_search", "city": "上海"} if "上海" in query else {"intent": "general_qa"}
+
+
+class _FakeEngine:
+    parser = _FakeParser()
+
+    def _llm_rewrite(self, query, history):
+        return "上海有哪些养老院"
+
+    def _rewrite_and_parse(self, query, history):
+        return "上海有哪些养老院", {"intent": "nursing_home_search", "city": "上海", "parse_path": "fused"}
+
+
+def test_separate_baseline_calls_llm_rewrite_directly():
+    cases = [{"id": 1, "history": [{"role": "user", "content": "北京有哪些养老院"}], "query": "那上海呢"}]
+    report = compare_rewrite_parse_modes(_FakeEngine(), cases)
+    assert report["total"] == 1 and report["matched"] == 1
+
+
+@pytest.mark.parametrize("question", [
+    "北京3000元以下的养老院", "上海有哪些养老院", "65岁有高血压能买什么保险", "重疾险怎么买", "糖尿病吃什么药", "谢谢",
+])
+def test_mock_rewrite_parse_agrees_with_intent_rules(question):
+    script = MockScript.from_file("data/mock_llm/default_script.yaml")
+    history = "用户: 北京有哪些养老院\nAI助手: 1. **北京朝阳区福祐养老院**\n"
+    fused = script.respond([
+        {"role": "system", "content": "你是一个对话理解助手。"},
+        {"role": "user", "content": f"\n        【对话历史】\n        {history}\n        【用户最新问题】\n        {question}\n        "},
+    ])
+    separate = script.respond([
+        {"role": "system", "content": "你是一个智能意图识别助手。"},
+        {"role": "user", "content": question},
+    ])
+    fused_intent = json.loads(fused["content"])
+    assert fused_intent.pop("rewritten_query") == question
+    assert normalize_intent(fused_intent) == normalize_intent(json.loads(separate["content"]))
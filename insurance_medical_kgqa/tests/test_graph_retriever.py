@@ -0,0 +1,70 @@
+# 图谱检索器（GraphRetriever）检索条件规整与批量分组的单元测试
+import pytest
+
+from src.graph_rag.graph_retriever import GraphRetriever
+
+
+@pytest.mark.parametrize("parsed, expected", [
+    ({"intent": "nursing_home_search", "city": "北京", "price_max": 5000}, ("北京", 5000)),
+    ({"intent": "nursing_home_search", "city": ["上海", "北京"]}, ("上海", None)),
+    ({"intent": "nursing_home_search", "city": [], "price_max": "3000"}, (None, 3000)),
+    ({"intent": "nursing_home_search", "city": " 重庆 ", "price_max": 4500.0}, ("重庆", 4500)),
+    ({"intent": "nursing_home_search", "price_max": "不限"}, (None, None)),
+    ({"intent": "general_qa", "city": ["杭州"]}, ("杭州", None)),
+])
+def test_nursing_filter_is_hashable_and_normalized(parsed, expected):
+    nh_filter = GraphRetriever._nursing_filter(parsed)
+    assert nh_filter == expected
+    hash(nh_filter)
+
+
+def test_nursing_filter_not_needed():
+    assert GraphRetriever._nursing_filter({"intent": "medical_query", "disease": ["高血压"]}) is None
+
+
+class _Record(dict):
+    pass
+
+
+class _FakeSession:
+    def __init__(self):
+        self.filters = None
+
+    def run(self, cypher, **params):
+        self.filters = params.get("filters")
+        return [_Record(idx=f["idx"], name=f"{f['city']}养老院", price=3000, address="", services="", beds=None, nature=None)
+                for f in self.filters or []]
+
+
+def test_fetch_accepts_list_valued_city():
+    retriever = GraphRetriever.__new__(GraphRetriever)
+    session = _FakeSession()
+    queries = [
+        {"intent": "nursing_home_search", "city": ["北京"], "price_max": "5000"},
+        {"intent": "nursing_home_search", "city": "北京", "price_max": 5000},
+    ]
+    data = retriever._fetch(session, queries)
+    # 两个问题规整后条件相同，只检索一次
+    assert session.filters == [{"idx": 0, "city": "北京", "price_max": 5000}]
+    assert "北京养老院" in retriever._format_context(queries[0], data)
+
+
+class _RecordingSession:
+    def __init__(self):
+        self.calls = []
+
+    def run(self, cypher, **params):
+        self.calls.append((cypher, params))
+        if "Population" in cypher:
+            return [_Record(ins_name="老年防癌险", age_limit="60-80岁", desc="")]
+        return []
+
+
+def test_fetch_accepts_string_typed_age_and_disease():
+    retriever = GraphRetriever.__new__(GraphRetriever)
+    session = _RecordingSession()
+    query = {"intent": "insurance_query", "age": "65", "disease": "高血压", "raw_query": "65岁高血压能买什么保险"}
+    data = retriever._fetch(session, [query])
+    # 字符串疾病按整体查询，不逐字拆开；字符串年龄也能触发适老保险检索
+    assert {tuple(p["names"]) for _, p in session.calls if "names" in p} == {("高血压",)}
+    assert "【适老保险】适合 65 岁人群" in retriever._format_context(query, data)
@@ -0,0 +1,96 @@
+# 导入队列（IngestionQueue）状态转换与写入线程批量提交的单元测试
+import pytest
+
+from src.kg_construction.ingestion_pipeline import IngestionPipeline, IngestionQueue
+from src.kg_construction.text_graph_builder import TripleWriteError
+
+
+@pytest.fixture
+def queue(tmp_path):
+    q = IngestionQueue(str(tmp_path / "queue.sqlite"))
+    yield q
+    q.close()
+
+
+def _status(queue):
+    return {s: n for s, n in queue.counts().items() if n}
+
+
+def test_enqueue_skips_unchanged_content(queue):
+    assert queue.enqueue("a.txt", "/data/a.txt", "h1")
+    assert not queue.enqueue("a.txt", "/data/a.txt", "h1")
+    assert queue.enqueue("a.txt", "/data/a.txt", "h2")
+    assert _status(queue) == {"pending": 1}
+
+
+def test_claim_then_done(queue):
+    queue.enqueue("a.txt", "/data/a.txt", "h1")
+    assert queue.claim(10) == [("a.txt", "/data/a.txt")]
+    assert queue.claim(10) == []
+    queue.mark_done("a.txt", "h1", {"triples": 3})
+    assert _status(queue) == {"done": 1}
+
+
+def test_modified_while_processing_is_not_claimed_twice(queue):
+    queue.enqueue("a.txt", "/data/a.txt", "h1")
+    assert queue.claim(10) == [("a.txt", "/data/a.txt")]
+    # 处理期间文件被修改：不能变回 pending 被另一个 worker 领取
+    assert queue.enqueue("a.txt", "/data/a.txt", "h2")
+    assert _status(queue) == {"processing": 1}
+    assert queue.claim(10) == []
+    # 用旧内容完成时发现哈希不一致，重新入队
+    queue.mark_done("a.txt", "h1", {"triples": 3})
+    assert _status(queue) == {"pending": 1}
+    assert queue.claim(10) == [("a.txt", "/data/a.txt")]
+    queue.mark_done("a.txt", "h2", {"triples": 4})
+    assert _status(queue) == {"done": 1}
+
+
+def test_failed_retries_until_max_attempts(queue):
+    queue.enqueue("a.txt", "/data/a.txt", "h1")
+    for _ in range(2):
+        assert queue.claim(10)
+        queue.mark_failed("a.txt", "boom", max_attempts=2)
+    assert _status(queue) == {"failed": 1}
+    assert queue.failures() == [{"doc_id": "a.txt", "attempts": 2, "error": "boom"}]
+
+
+def test_recover_requeues_processing(queue):
+    queue.enqueue("a.txt", "/data/a.txt", "h1")
+    queue.claim(10)
+    assert queue.recover() == 1
+    assert _status(queue) == {"pending": 1}
+
+
+class _FlakyBuilder:
+    """d2 的三元组所在批次写入失败，其余写入成功。"""
+
+    def __init__(self):
+        self.committed = []
+        self.version_bumps = 0
+
+    def save_to_neo4j(self, triples):
+        raise TripleWriteError("1 个三元组写入 Neo4j 失败", len(triples) - 1, {"d2"})
+
+    def commit_document(self, doc_id, extraction):
+        self.committed.append(doc_id)
+        return 0
+
+    def bump_graph_version(self):
+        self.version_bumps += 1
+
+
+def test_flush_fails_documents_whose_triples_were_not_written(queue, tmp_path):
+    builder = _FlakyBuilder()
+    pipeline = IngestionPipeline(root=str(tmp_path), builder=builder, ingestion_queue=queue)
+    extraction = {"keys": [], "triples": [{"head": "a"}], "chunks": 1, "cached": 0, "extracted": 1, "failed": 0}
+    for doc_id in ("d1", "d2"):
+        queue.enqueue(doc_id, f"/data/{doc_id}", "h1")
+    queue.claim(10)
+    pipeline._unwritten = 2
+    pipeline._flush([("d1", "h1", extraction, None), ("d2", "h1", extraction, None)])
+    # d2 未提交清单，重新入队等待重试；d1 正常完成
+    assert builder.committed == ["d1"]
+    assert builder.version_bumps == 1
+    assert _status(queue) == {"done": 1, "pending": 1}
+    assert queue.failures()[0]["doc_id"] == "d2"
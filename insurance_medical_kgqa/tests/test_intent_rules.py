@@ -0,0 +1,60 @@
+# 规则意图识别（RuleIntentClassifier）的单元测试
+import pytest
+
+from src.graph_rag.intent_rules import Gazetteer, RuleIntentClassifier, parse_cn_number
+
+GAZETTEER = Gazetteer({
+    "city": ["北京", "上海"],
+    "disease": ["高血压", "糖尿病"],
+    "drug": ["阿司匹林"],
+})
+
+
+@pytest.fixture
+def classifier():
+    return RuleIntentClassifier(gazetteer=GAZETTEER)
+
+
+@pytest.mark.parametrize("text, expected", [("70", 70), ("七十", 70), ("六十五", 65), ("十", 10), ("一百", 100)])
+def test_parse_cn_number(text, expected):
+    assert parse_cn_number(text) == expected
+
+
+def test_nursing_home_with_city_and_price(classifier):
+    result, confidence = classifier.classify("北京5000元以下的养老院有哪些")
+    assert result == {"intent": "nursing_home_search", "city": "北京", "price_max": 5000}
+    assert confidence == 0.95
+
+
+def test_price_units(classifier):
+    assert classifier.classify("上海预算1万的养老院")[0]["price_max"] == 10000
+    assert classifier.classify("上海3千以内的养老院")[0]["price_max"] == 3000
+
+
+def test_insurance_with_age_and_disease(classifier):
+    result, confidence = classifier.classify("七十岁有高血压能买什么保险")
+    assert result == {"intent": "insurance_query", "age": 70, "disease": ["高血压"]}
+    assert confidence == 0.9
+
+
+def test_entity_only_question_is_medical(classifier):
+    result, confidence = classifier.classify("介绍一下阿司匹林")
+    assert result == {"intent": "medical_query", "drug": ["阿司匹林"]}
+    assert confidence == 0.8
+
+
+def test_multiple_intents_prefer_insurance_with_low_confidence(classifier):
+    result, confidence = classifier.classify("糖尿病的症状和保险")
+    assert result["intent"] == "insurance_query"
+    assert confidence == 0.5
+
+
+def test_anaphora_caps_confidence(classifier):
+    _, confidence = classifier.classify("第一家养老院多少钱")
+    assert confidence <= 0.4
+
+
+def test_unrecognized_question_is_general_low_confidence(classifier):
+    result, confidence = classifier.classify("今天天气怎么样")
+    assert result == {"intent": "general_qa"}
+    assert confidence == 0.3
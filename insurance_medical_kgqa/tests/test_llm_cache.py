@@ -0,0 +1,48 @@
+# LLM 响应缓存（LLMResponseCache）的单元测试
+import time
+
+from src.graph_rag.llm_cache import LLMResponseCache, make_cache_key
+
+
+def test_cache_key_is_stable_and_param_sensitive():
+    messages = [{"role": "user", "content": "高血压吃什么药"}]
+    assert make_cache_key("m", messages, temperature=0.1, max_tokens=100) == \
+        make_cache_key("m", messages, max_tokens=100, temperature=0.1)
+    assert make_cache_key("m", messages, temperature=0.1) != make_cache_key("m", messages, temperature=0.2)
+    assert make_cache_key("m", messages) != make_cache_key("other", messages)
+
+
+def test_memory_lru_eviction():
+    cache = LLMResponseCache(memory_max_entries=2)
+    cache.set("a", "1")
+    cache.set("b", "2")
+    assert cache.get("a") == "1"  # a 变为最近使用
+    cache.set("c", "3")
+    assert cache.get("b") is None
+    assert cache.get("a") == "1" and cache.get("c") == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def test_ttl_expiry():
+    cache = LLMResponseCache(ttl_seconds=0.05)
+    cache.set("a", "1")
+    assert cache.get("a") == "1"
+    time.sleep(0.06)
+    assert cache.get("a") is None
+    assert cache.stats()["expired"] == 1
+
+
+def test_disk_layer_survives_restart(tmp_path):
+    path = str(tmp_path / "llm_cache.sqlite")
+    cache = LLMResponseCache(disk_path=path)
+    cache.set("a", "回答")
+    cache.close()
+
+    reopened = LLMResponseCache(disk_path=path)
+    assert reopened.get("a") == "回答"
+    assert reopened.get("a") == "回答"
+    stats = reopened.stats()
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1
+    reopened.clear()
+    assert reopened.get("a") is None
+    reopened.close()
@@ -0,0 +1,97 @@
+# 熔断器（CircuitBreaker）状态转换与 ResilientCaller 截止时间处理的单元测试
+import time
+
+import pytest
+
+from src.graph_rag.llm_resilience import CircuitBreaker, CircuitOpenError, LLMCallError, ResilientCaller
+from src.utils.deadline import DeadlineExceeded, deadline_scope
+
+
+def _open(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+
+def test_opens_after_threshold():
+    breaker = CircuitBreaker(failure_threshold=2, recovery_timeout=60)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_half_open_allows_single_probe():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+    _open(breaker)
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+
+def test_probe_success_closes():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+    _open(breaker)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+def test_probe_failure_reopens():
+    breaker = CircuitBreaker(failure_threshold=3, recovery_timeout=0.05)
+    _open(breaker)
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+
+
+def test_release_probe_allows_next_probe():
+    breaker = CircuitBreaker(failure_threshold=1, recovery_timeout=0)
+    _open(breaker)
+    assert breaker.allow()
+    breaker.release_probe()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_deadline_exceeded_probe_does_not_wedge_breaker():
+    caller = ResilientCaller(timeout_seconds=5, max_retries=0, circuit_failure_threshold=1, circuit_recovery_seconds=0)
+    _open(caller.breaker)
+
+    def slow(timeout):
+        time.sleep(timeout)
+        raise TimeoutError("timed out")
+
+    # 半开状态下的探测请求因截止时间失败
+    with deadline_scope(time.monotonic() + 0.05):
+        with pytest.raises(LLMCallError) as info:
+            caller.call(slow)
+    assert isinstance(info.value.__cause__, DeadlineExceeded)
+    assert caller.stats()["deadline_exceeded"] == 1
+
+    # 之后的调用仍能作为探测请求放行，成功后熔断器关闭
+    result, outcome = caller.call(lambda timeout: "ok")
+    assert result == "ok" and outcome.outcome == "success"
+    assert caller.breaker.state == "closed"
+
+
+def test_open_breaker_rejects_calls():
+    caller = ResilientCaller(max_retries=0, circuit_failure_threshold=1, circuit_recovery_seconds=60)
+    _open(caller.breaker)
+    with pytest.raises(CircuitOpenError):
+        caller.call(lambda timeout: "ok")
+
+
+def test_non_retryable_error_does_not_retry():
+    caller = ResilientCaller(max_retries=3, backoff_base_seconds=0)
+    calls = []
+
+    def bad(timeout):
+        calls.append(timeout)
+        raise ValueError("bad request")
+
+    with pytest.raises(LLMCallError):
+        caller.call(bad)
+    assert len(calls) == 1
+    assert caller.breaker.state == "closed"
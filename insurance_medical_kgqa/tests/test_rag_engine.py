@@ -0,0 +1,57 @@
+# RAGEngine 多轮追问流程（回溯型追问沿用上轮检索结果）的单元测试
+from src.graph_rag.coreference import CoreferenceResolver
+from src.graph_rag.intent_rules import Gazetteer
+from src.graph_rag.rag_engine import RECALL_NOTICE, RAGEngine
+
+HISTORY = [
+    {"role": "user", "content": "有哪些重疾险"},
+    {"role": "assistant", "content": "1. **泰康乐享重疾险**\n2. **泰康悦享医疗险**"},
+]
+LAST_CONTEXT = "【保险产品库】泰康乐享重疾险 (投保年龄: 18-60周岁)"
+
+
+class _FakeParser:
+    def parse(self, query):
+        return {"intent": "insurance_query", "age": 70}
+
+
+class _FakeRetriever:
+    def __init__(self):
+        self.calls = 0
+
+    def retrieve(self, parsed_intent):
+        self.calls += 1
+        return "【保险产品库】新检索到的产品"
+
+
+class _FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def generate(self, prompt, **kwargs):
+        self.prompts.append(prompt)
+        return "上述产品均不适用"
+
+
+def _engine():
+    engine = RAGEngine.__new__(RAGEngine)
+    engine.parser, engine.retriever, engine.llm = _FakeParser(), _FakeRetriever(), _FakeLLM()
+    engine.coreference = CoreferenceResolver(gazetteer=Gazetteer({}))
+    engine.cache_answers = engine.fused_rewrite_parse = False
+    engine._speculation_pool = engine.answer_store = None
+    return engine
+
+
+def test_recall_follow_up_reuses_last_context():
+    engine = _engine()
+    result = engine.chat("上面的哪个适合70岁的人", HISTORY, last_context=LAST_CONTEXT)
+    assert engine.retriever.calls == 0
+    assert result["context"] == LAST_CONTEXT
+    assert LAST_CONTEXT in engine.llm.prompts[-1]
+
+
+def test_recall_follow_up_without_last_context_masks_retrieval():
+    engine = _engine()
+    result = engine.chat("上面的哪个适合70岁的人", HISTORY)
+    assert result["context"] == RECALL_NOTICE
+    assert "新检索到的产品" not in engine.llm.prompts[-1]
@@ -0,0 +1,34 @@
+# 会话存储的单元测试
+from src.api.session_store import ConversationSession, InMemorySessionStore, SQLiteSessionStore
+
+
+def test_memory_store_returns_copies():
+    store = InMemorySessionStore()
+    store.save(ConversationSession(session_id="s1"))
+    session = store.get("s1")
+    session.add_exchange("你好", "您好", max_turns=20)
+    session.last_intent = {"intent": "general_qa"}
+    # 未 save 的修改不影响存储中的会话，也不影响其他请求取到的副本
+    assert store.get("s1").turns == []
+    store.save(session)
+    saved = store.get("s1")
+    assert len(saved.turns) == 2 and saved.last_intent == {"intent": "general_qa"}
+    assert saved is not store.get("s1")
+
+
+def test_from_dict_ignores_unknown_fields():
+    session = ConversationSession.from_dict({"session_id": "s1", "turns": [], "unknown_field": "x"})
+    assert session.session_id == "s1"
+
+
+def test_sqlite_store_round_trip(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite"))
+    session = ConversationSession(session_id="s1", last_intent={"intent": "nursing_home_search", "city": "北京"})
+    session.add_exchange("北京有哪些养老院", "……", max_turns=20)
+    session.last_context = "【养老机构推荐】北京朝阳区福祐养老院"
+    store.save(session)
+    loaded = store.get("s1")
+    assert loaded.turns == session.turns and loaded.last_intent == session.last_intent
+    assert loaded.last_context == session.last_context
+    assert store.delete("s1") and store.get("s1") is None
+    store.close()
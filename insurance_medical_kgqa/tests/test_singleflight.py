@@ -0,0 +1,50 @@
+# SingleFlight 并发合并的单元测试
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from src.utils.singleflight import SingleFlight
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(2)
+        return {"answer": 42}
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        leader = pool.submit(flight.execute, "k", slow)
+        started.wait(2)
+        followers = [pool.submit(flight.execute, "k", slow) for _ in range(3)]
+        # 等待方都已挂在同一个 Future 上
+        while flight.stats()["shared"] < 3:
+            threading.Event().wait(0.005)
+        release.set()
+        results = [leader.result()] + [f.result() for f in followers]
+
+    assert len(calls) == 1
+    assert [shared for _, shared in results] == [False, True, True, True]
+    # 每个调用方拿到的是独立的拷贝
+    values = [value for value, _ in results]
+    assert all(v == {"answer": 42} for v in values)
+    assert len({id(v) for v in values}) == 4
+    assert flight.in_flight() == 0
+
+
+def test_exception_propagates_and_key_is_released():
+    flight = SingleFlight()
+
+    def boom():
+        raise ValueError("bad")
+
+    with pytest.raises(ValueError):
+        flight.do("k", boom)
+    assert flight.in_flight() == 0
+    assert flight.do("k", lambda: "ok") == "ok"
+    assert flight.stats()["executed"] == 2
@@ -0,0 +1,89 @@
+# 条款文本分块（chunk_text）的单元测试
+from src.kg_construction.extraction_cache import chunk_key
+from src.kg_construction.text_chunking import chunk_text, split_clauses
+
+POLICY = (
+    "第一条 保险责任\n被保险人确诊重大疾病的，本公司按基本保额给付保险金。\n"
+    "第二条 责任免除\n因下列情形导致的保险事故，本公司不承担给付责任：\n"
+    "（一）投保人对被保险人的故意杀害；\n（二）被保险人故意自伤。\n"
+    "\n"
+    "第三条 投保年龄\n本合同接受的投保年龄为出生满28天至70周岁。\n"
+)
+
+
+def test_split_clauses_on_headings_and_blank_lines():
+    clauses = [POLICY[s:e].strip() for s, e in split_clauses(POLICY)]
+    assert [c.splitlines()[0] for c in clauses] == [
+        "第一条 保险责任", "第二条 责任免除", "（一）投保人对被保险人的故意杀害；", "（二）被保险人故意自伤。", "第三条 投保年龄",
+    ]
+
+
+def test_short_text_is_single_chunk():
+    chunks = chunk_text(POLICY, max_chars=1500)
+    assert len(chunks) == 1
+    assert chunks[0].text == POLICY.strip()
+
+
+def test_chunks_respect_max_chars_and_overlap():
+    chunks = chunk_text(POLICY, max_chars=60, overlap_chars=30)
+    assert len(chunks) > 1
+    assert all(len(c.text) <= 60 for c in chunks)
+    assert [c.index for c in chunks] == list(range(len(chunks)))
+    # 每个条款标题至少出现在一个分块中，分块按原文顺序排列
+    for heading in ("第一条", "第二条", "第三条"):
+        assert any(heading in c.text for c in chunks)
+    assert all(a.start < b.start for a, b in zip(chunks, chunks[1:]))
+    # 分块的 text 与原文区间一致
+    assert all(c.text == POLICY[c.start:c.end].strip() for c in chunks)
+
+
+def test_long_clause_splits_on_sentences():
+    text = "第一条 " + "本公司承担给付责任。" * 20
+    chunks = chunk_text(text, max_chars=50, overlap_chars=0)
+    assert all(len(c.text) <= 50 for c in chunks)
+    # 不在句中截断：每块都以句号结尾
+    assert all(c.text.endswith("。") for c in chunks)
+    assert "".join(c.text for c in chunks).replace(" ", "") == text.replace(" ", "")
+
+
+def test_empty_text():
+    assert chunk_text("") == []
+    assert chunk_text("\n\n  \n") == []
+
+
+def _clauses(n):
+    clauses = []
+    for i in range(1, n + 1):
+        body = "".join("保险责任被保险人本公司给付金额疾病医疗费用"[(i * 7 + j * 3) % 20] for j in range(60 + i * 37 % 140))
+        clauses.append(f"第{i}条 条款{i}\n{body}。\n")
+    return clauses
+
+
+def _keys(clauses):
+    chunks = chunk_text("".join(clauses), max_chars=1500, overlap_chars=200)
+    return chunks, [chunk_key(c.text, "v1", "model") for c in chunks]
+
+
+def test_editing_one_clause_keeps_other_chunk_keys():
+    clauses = _clauses(200)
+    _, base = _keys(clauses)
+    assert len(base) > 20
+    for i in (37, 100, 163):
+        edited = list(clauses)
+        edited[i] = edited[i].replace("。", "，另有约定的除外。")
+        chunks, keys = _keys(edited)
+        assert 1 <= sum(k not in base for k in keys) <= 2
+        # 不包含该条款的分块 key 全部不变
+        for chunk, key in zip(chunks, keys):
+            if f"第{i + 1}条" not in chunk.text:
+                assert key in base
+
+
+def test_inserting_or_deleting_a_clause_changes_few_chunks():
+    clauses = _clauses(200)
+    _, base = _keys(clauses)
+    for i in (37, 100, 163):
+        _, inserted = _keys(clauses[:i] + ["第999条 新增条款\n被保险人可申请保单贷款。\n"] + clauses[i:])
+        _, deleted = _keys(clauses[:i] + clauses[i + 1:])
+        assert sum(k not in base for k in inserted) <= 3
+        assert sum(k not in base for k in deleted) <= 3